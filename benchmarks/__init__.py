@@ -0,0 +1,10 @@
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        ALLOWED_HOSTS=['*'],
+        SECRET_KEY='not-a-valid-secret',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    django.setup()
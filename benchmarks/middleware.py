@@ -0,0 +1,65 @@
+"""
+Compare per-request overhead of UserAgentMiddleware for human and bot traffic
+with the previous implementation, which built the absolute url twice per bot
+request and before checking the user agent.
+
+Run with `python -m benchmarks.middleware`.
+"""
+import timeit
+
+import benchmarks  # noqa: configures django
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from django_ssr import helpers, middleware
+from django_ssr.backends import BackendBase
+
+HUMAN_UA = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.13; rv:61.0) Gecko/20100101 Firefox/61.0'
+BOT_UA = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+NUMBER = 20000
+RESPONSE = HttpResponse(b'<h1>Hello there!</h1>')
+
+
+class Backend(BackendBase):
+    def render(self, url):
+        return RESPONSE
+
+
+class LegacyUserAgentMiddleware(middleware.BaseMiddleware):
+    def __call__(self, request):
+        if self.must_render(request):
+            return self.backend.render(self.backend.build_absolute_url(request))
+        return self.get_response(request)
+
+    def must_render(self, request):
+        ua = request.META.get('HTTP_USER_AGENT', '')
+        url = self.backend.build_absolute_url(request)
+        return helpers.is_user_agent_match(ua) and helpers.must_render(url)
+
+
+def bench(mw, user_agent, strip_query_params):
+    mw.backend.strip_query_params = strip_query_params
+    factory = RequestFactory()
+    requests = [factory.get('/catalog/item-%d?page=2' % i, HTTP_USER_AGENT=user_agent) for i in range(100)]
+
+    def run():
+        for req in requests:
+            req.__dict__.pop('ssr_decision', None)
+            mw(req)
+
+    return timeit.timeit(run, number=NUMBER // len(requests)) / NUMBER * 1e6
+
+
+def main():
+    get_response = lambda request: RESPONSE  # noqa: E731
+    legacy = LegacyUserAgentMiddleware(get_response, backend=Backend)
+    current = middleware.UserAgentMiddleware(get_response, backend=Backend)
+
+    print('%6s %18s %12s %12s' % ('ua', 'strip_query_params', 'before, us', 'after, us'))
+    for name, ua in (('human', HUMAN_UA), ('bot', BOT_UA)):
+        for strip in (False, True):
+            print('%6s %18s %12.3f %12.3f' % (name, strip, bench(legacy, ua, strip), bench(current, ua, strip)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Measure time of each post-processing stage and size reduction on sample prerendered pages
+with bundled scripts, inline json state, comments and indentation.
+
+Run with `python -m benchmarks.postprocess`.
+"""
+import json
+import os
+
+import benchmarks  # noqa: configures django
+
+from django_ssr.postprocess import InjectHead, Pipeline, collapse_whitespace, strip_comments, strip_scripts
+
+ITEMS = (20, 200, 2000)
+NUMBER = 20
+
+
+def build_page(items):
+    state = {'items': [{'id': i, 'title': 'Item %d' % i, 'token': os.urandom(8).hex()} for i in range(items)]}
+    rows = ''.join(
+        '\n        <!-- item %d -->\n        <li class="item">\n          <a href="/catalog/%d">Item %d</a>\n'
+        '        </li>' % (i, i, i)
+        for i in range(items)
+    )
+    return (
+        '<!DOCTYPE html>\n<html>\n  <head>\n    <title>Catalog</title>\n'
+        '    <script src="/static/vendor.%s.js"></script>\n'
+        '    <script type="application/ld+json">{"@type": "ItemList"}</script>\n'
+        '  </head>\n  <body>\n    <div id="app">\n      <ul>%s\n      </ul>\n    </div>\n'
+        '    <script>window.__INITIAL_STATE__ = %s;</script>\n'
+        '    <script>%s</script>\n  </body>\n</html>\n'
+    ) % (os.urandom(4).hex(), rows, json.dumps(state), 'function f(){return 1}\n' * items)
+
+
+def main():
+    pipeline_stages = [strip_scripts, strip_comments, collapse_whitespace, InjectHead(meta={'robots': 'index'})]
+    print('%8s %10s %10s %10s %14s %14s %14s %14s' % (
+        'items', 'in, B', 'out, B', 'reduced', 'strip_scripts', 'strip_comments', 'whitespace', 'inject_head',
+    ))
+    for items in ITEMS:
+        body = build_page(items).encode()
+        pipeline = Pipeline(pipeline_stages)
+        for _ in range(NUMBER):
+            out = pipeline.process(body, 'http://example.com/catalog/')
+        stats = pipeline.stats()
+        timings = stats['stages']
+        print('%8d %10d %10d %9.1f%% %12.1fus %12.1fus %12.1fus %12.1fus' % (
+            items,
+            len(body),
+            len(out),
+            stats['reduction'] * 100,
+            *(timings[name]['total'] / timings[name]['count'] * 1e6 for name in (
+                'strip_scripts', 'strip_comments', 'collapse_whitespace', 'inject_head',
+            ))
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare size and encode/decode time of cached responses stored with pickle
+and with the snapshot format for 50KB-2MB prerendered pages.
+
+Decoding a snapshot includes building a new response, whose headers are validated by django,
+so it takes a few microseconds longer than unpickling a response.
+
+Run with `python -m benchmarks.snapshot`.
+"""
+import os
+import pickle
+import timeit
+
+import benchmarks  # noqa: configures django
+from django.http import HttpResponse
+
+from django_ssr.snapshot import Snapshot
+
+SIZES = (50 * 1024, 200 * 1024, 500 * 1024, 2 * 1024 * 1024)
+NUMBER = 200
+
+
+def build_response(size):
+    chunk = b'<div class="item"><a href="/catalog/%s">Item</a></div>\n'
+    body = b''.join(chunk % os.urandom(4).hex().encode() for _ in range(size // len(chunk) + 1))[:size]
+    r = HttpResponse(body, content_type='text/html; charset=utf-8')
+    r['Cache-Control'] = 'max-age=0'
+    r['Content-Length'] = len(body)
+    r['Date'] = 'Mon, 02 Jul 2018 10:00:00 GMT'
+    r['Etag'] = 'W/"%s"' % os.urandom(8).hex()
+    return r
+
+
+def bench(func):
+    return timeit.timeit(func, number=NUMBER) / NUMBER * 1e6
+
+
+def main():
+    print('%8s %12s %12s %12s %12s %12s %12s' % (
+        'page', 'pickle, B', 'snap, B', 'pickle enc', 'snap enc', 'pickle dec', 'snap dec',
+    ))
+    for size in SIZES:
+        resp = build_response(size)
+        pickled = pickle.dumps(resp)
+        snapped = Snapshot.from_response(resp).dumps()
+        print('%7dK %12d %12d %10.1fus %10.1fus %10.1fus %10.1fus' % (
+            size // 1024,
+            len(pickled),
+            len(snapped),
+            bench(lambda: pickle.dumps(resp)),
+            bench(lambda: Snapshot.from_response(resp).dumps()),
+            bench(lambda: pickle.loads(pickled)),
+            bench(lambda: Snapshot.loads(snapped).to_response()),
+        ))
+
+
+if __name__ == '__main__':
+    main()
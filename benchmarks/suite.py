@@ -0,0 +1,269 @@
+"""
+Measure per-request latency of UserAgentMiddleware on its hot paths:
+
+- human_passthrough: human user agents are passed to the view;
+- bot_ignored_extension: crawler requests of static files are passed to the view;
+- cache_hit_locmem, cache_hit_file: pages cached by CachingBackendMixin in locmem and file based caches;
+- cache_hit_pickle: pages cached as pickled responses, as they were stored before the snapshot format,
+  without cache policies, canonical urls and stale copies of CachingBackendMixin;
+- cache_miss_stub: pages rendered by PrerenderIOHosted with a local stub prerender server and stored.
+
+User agents are taken from `benchmarks/fixtures/user_agents.json`. Results are saved as JSON with `--output`,
+`--compare` prints changes of median latency against saved results and exits with status 1 on regressions.
+
+Run with `python -m benchmarks.suite`.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import benchmarks  # noqa: configures django
+import django
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory
+
+from django_ssr import middleware
+from django_ssr.backends import BackendBase, CachingBackendMixin, PrerenderIOHosted
+from django_ssr.testing import StubPrerenderServer
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+NUMBER = 5000
+MISS_NUMBER = 200
+PAGE = b''.join(
+    b'<div class="item"><a href="/catalog/item-%d">Item %d</a></div>\n' % (i, i) for i in range(400)
+)
+
+Scenario = Callable[[argparse.Namespace], List[float]]
+
+
+def load_user_agents() -> Dict[str, List[str]]:
+    with open(os.path.join(FIXTURES, 'user_agents.json')) as f:
+        return json.load(f)
+
+
+USER_AGENTS = load_user_agents()
+
+
+def view(request: HttpRequest) -> HttpResponse:
+    return HttpResponse(b'<h1>Hello there!</h1>')
+
+
+class Backend(BackendBase):
+    def render(self, url):
+        r = HttpResponse(PAGE, content_type='text/html; charset=utf-8')
+        r['Cache-Control'] = 'max-age=0'
+        return r
+
+
+class CachingBackend(CachingBackendMixin, Backend):
+    pass
+
+
+class PickleCachingBackend(Backend):
+    """
+    Store whole http responses in django's cache, which pickles them.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = caches['default']
+
+    def render(self, url):
+        r = self.cache.get(url)
+        if r is None:
+            r = super().render(url)
+            self.cache.set(url, r)
+        return r
+
+
+class StubCachingBackend(CachingBackendMixin, PrerenderIOHosted):
+    pass
+
+
+def build_requests(paths: List[str], user_agents: List[str]) -> List[HttpRequest]:
+    factory = RequestFactory()
+    return [factory.get(path, HTTP_USER_AGENT=user_agents[i % len(user_agents)]) for i, path in enumerate(paths)]
+
+
+def measure(mw: middleware.BaseMiddleware, requests: List[HttpRequest], number: int) -> List[float]:
+    """
+    Return seconds taken by middleware per request, requests are reused in turn.
+    """
+    times = []
+    clock = time.perf_counter
+    for i in range(number):
+        req = requests[i % len(requests)]
+        req.__dict__.pop('ssr_decision', None)
+        started = clock()
+        mw(req)
+        times.append(clock() - started)
+    return times
+
+
+def build_middleware(backend: BackendBase) -> middleware.UserAgentMiddleware:
+    mw = middleware.UserAgentMiddleware(view, backend=Backend)
+    mw.backend = backend
+    return mw
+
+
+def human_passthrough(args: argparse.Namespace) -> List[float]:
+    paths = ['/catalog/item-%d?page=2' % i for i in range(100)]
+    mw = build_middleware(Backend())
+    return measure(mw, build_requests(paths, USER_AGENTS['human']), args.number)
+
+
+def bot_ignored_extension(args: argparse.Namespace) -> List[float]:
+    paths = ['/static/js/chunk-%d.js' % i for i in range(100)]
+    mw = build_middleware(Backend())
+    return measure(mw, build_requests(paths, USER_AGENTS['bot']), args.number)
+
+
+def cache_hit(backend: BackendBase, args: argparse.Namespace) -> List[float]:
+    paths = ['/catalog/item-%d' % i for i in range(100)]
+    requests = build_requests(paths, USER_AGENTS['bot'])
+    mw = build_middleware(backend)
+    measure(mw, requests, len(requests))
+    return measure(mw, requests, args.number)
+
+
+def cache_hit_locmem(args: argparse.Namespace) -> List[float]:
+    caches['default'].clear()
+    return cache_hit(CachingBackend(cache_alias='default'), args)
+
+
+def cache_hit_file(args: argparse.Namespace) -> List[float]:
+    with tempfile.TemporaryDirectory() as path:
+        backend = CachingBackend(cache_alias='default')
+        backend.cache = FileBasedCache(path, {})
+        return cache_hit(backend, args)
+
+
+def cache_hit_pickle(args: argparse.Namespace) -> List[float]:
+    caches['default'].clear()
+    return cache_hit(PickleCachingBackend(), args)
+
+
+def cache_miss_stub(args: argparse.Namespace) -> List[float]:
+    caches['default'].clear()
+    paths = ['/catalog/item-%d' % i for i in range(args.miss_number)]
+    requests = build_requests(paths, USER_AGENTS['bot'])
+    with StubPrerenderServer(latency=args.latency) as server:
+        backend = StubCachingBackend(
+            cache_alias='default',
+            render_url='%s/render/' % server.url,
+            update_url='%s/update/' % server.url,
+        )
+        return measure(build_middleware(backend), requests, args.miss_number)
+
+
+SCENARIOS = (
+    ('human_passthrough', human_passthrough),
+    ('bot_ignored_extension', bot_ignored_extension),
+    ('cache_hit_locmem', cache_hit_locmem),
+    ('cache_hit_file', cache_hit_file),
+    ('cache_hit_pickle', cache_hit_pickle),
+    ('cache_miss_stub', cache_miss_stub),
+)  # type: Tuple[Tuple[str, Scenario], ...]
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    times = sorted(times)
+    us = 1e6
+    return {
+        'requests': len(times),
+        'mean_us': statistics.mean(times) * us,
+        'median_us': statistics.median(times) * us,
+        'p95_us': times[int(len(times) * 0.95) - 1] * us,
+        'p99_us': times[int(len(times) * 0.99) - 1] * us,
+        'ops': len(times) / sum(times),
+    }
+
+
+def revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> bool:
+    """
+    Print change of median latency per scenario, return `True` if any is slower by more than threshold.
+    """
+    regressed = False
+    print()
+    print('%24s %12s %12s %9s' % ('scenario', 'base, us', 'median, us', 'change'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median_us'], result['median_us']
+        change = after / before - 1
+        mark = ''
+        if change > threshold:
+            mark = ' regression'
+            regressed = True
+        print('%24s %12.1f %12.1f %+8.1f%%%s' % (name, before, after, change * 100, mark))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run, all by default')
+    parser.add_argument('--number', type=int, default=NUMBER, help='requests per scenario')
+    parser.add_argument('--miss-number', type=int, default=MISS_NUMBER, help='requests of cache miss scenario')
+    parser.add_argument('--latency', type=float, default=0, help='latency of stub prerender server, seconds')
+    parser.add_argument('--output', help='save results to JSON file')
+    parser.add_argument('--compare', help='compare with results saved to JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown reported as regression')
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - {name for name, _ in SCENARIOS}
+    if unknown:
+        parser.error('unknown scenarios: %s' % ', '.join(sorted(unknown)))
+
+    results = {}  # type: Dict[str, dict]
+    print('%24s %9s %12s %12s %12s %12s %10s' % (
+        'scenario', 'requests', 'mean, us', 'median, us', 'p95, us', 'p99, us', 'ops/s',
+    ))
+    for name, scenario in SCENARIOS:
+        if args.scenarios and name not in args.scenarios:
+            continue
+        result = results[name] = summarize(scenario(args))
+        print('%24s %9d %12.1f %12.1f %12.1f %12.1f %10.0f' % (
+            name, result['requests'], result['mean_us'], result['median_us'], result['p95_us'], result['p99_us'],
+            result['ops'],
+        ))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'environment': {
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'revision': revision(),
+                    'platform': platform.platform(),
+                },
+                'options': {'number': args.number, 'miss_number': args.miss_number, 'latency': args.latency},
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare user agent matching against 10, 100 and 1000 patterns.
+
+Run with `python -m benchmarks.user_agent`.
+"""
+import hashlib
+import re
+import timeit
+
+import benchmarks  # noqa: configures django
+from django_ssr import helpers
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/67.0.3396.99',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 11_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15F79',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.13; rv:61.0) Gecko/20100101 Firefox/61.0',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+]
+NUMBER = 20000
+
+
+def legacy_match(user_agent, patterns):
+    for r in patterns:
+        if r.match(user_agent):
+            return True
+    return False
+
+
+def build_patterns(count):
+    tokens = [hashlib.md5(str(i).encode()).hexdigest()[:8] for i in range(count - 1)]
+    patterns = [re.compile(r'.*%sbot' % token, re.I) for token in tokens]
+    patterns.append(re.compile(r'.*Googlebot', re.I))
+    return patterns
+
+
+def bench(func):
+    def run():
+        for ua in USER_AGENTS:
+            func(ua)
+    return timeit.timeit(run, number=NUMBER) / (NUMBER * len(USER_AGENTS)) * 1e6
+
+
+def main():
+    print('%8s %14s %14s %14s' % ('patterns', 'loop, us', 'combined, us', 'cached, us'))
+    for count in (10, 100, 1000):
+        patterns = build_patterns(count)
+        uncached = helpers.UserAgentMatcher(patterns)
+        cached = helpers.UserAgentMatcher(patterns, cache_size=1024)
+        print('%8d %14.3f %14.3f %14.3f' % (
+            count,
+            bench(lambda ua: legacy_match(ua, patterns)),
+            bench(uncached.match_uncached),
+            bench(cached.match),
+        ))
+
+
+if __name__ == '__main__':
+    main()
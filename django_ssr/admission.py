@@ -0,0 +1,202 @@
+"""
+Admission control of renders, so crawler bursts do not saturate workers and the render service.
+
+Renders are limited by number in flight per process, in total and per host of rendered urls, and optionally
+by rate across all processes sharing django's cache. Requests over the limits wait in a bounded queue, those
+which cannot be admitted overflow and are handled by the controller's overflow policy.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from django.core.cache import caches, BaseCache
+from django.test.signals import setting_changed
+
+from django_ssr import settings
+from django_ssr.metrics import Counters
+
+__all__ = [
+    'AdmissionController',
+    'CacheRateLimiter',
+    'build_admission_controller',
+    'admission_controller',
+]
+
+OVERFLOW_POLICIES = ('stale', 'origin', 'unavailable')
+
+
+class CacheRateLimiter:
+    """
+    Allow at most `rate` calls per second across processes sharing `cache`, with bursts of up to `burst` calls,
+    one second worth of calls by default.
+
+    Calls take tokens from a bucket which holds `burst` tokens and is refilled at `rate` tokens per second.
+    The bucket is stored in cache and updated under a lock taken with atomic `add`, as django's cache
+    cannot compare and swap. Calls which do not get the lock within `lock_timeout` seconds are not allowed.
+    """
+
+    def __init__(self, cache: BaseCache, key: str, rate: float, burst: float = None, lock_timeout: float = 0.1):
+        if rate <= 0:
+            raise ValueError('Rate must be positive')
+        self.cache = cache
+        self.key = key
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        if self.burst < 1:
+            raise ValueError('Burst must be at least 1')
+        self.lock_timeout = lock_timeout
+        # A bucket left alone for this long is full, so it does not need to be kept
+        self.timeout = int(self.burst / rate) + 1
+
+    def try_acquire(self) -> bool:
+        """
+        Take a token from the bucket, return `False` if it is empty.
+        """
+        lock_key = '%s:lock' % self.key
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.cache.add(lock_key, 1, timeout=1):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        try:
+            now = time.time()
+            tokens, updated = self.cache.get(self.key, (self.burst, now))
+            # Clocks of processes may differ slightly, the bucket is never drained by going back in time
+            tokens = min(tokens + max(now - updated, 0) * self.rate, self.burst)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.cache.set(self.key, (tokens, now), timeout=self.timeout)
+            return allowed
+        finally:
+            self.cache.delete(lock_key)
+
+
+class AdmissionController:
+    """
+    Admit at most `max_renders` renders in flight and at most `max_renders_per_host` per host,
+    `None` is unlimited. Up to `queue_size` requests wait for `queue_timeout` seconds to be admitted.
+
+    Requests which are not admitted are handled by `overflow` policy: 'stale' serves cached page if there is one,
+    including copies of expired pages kept by caching backends with `cache_stale_timeout`, otherwise django's view,
+    'origin' serves django's view and 'unavailable' responds with 503 and `retry_after` seconds in Retry-After.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_renders: Optional[int] = None,
+        max_renders_per_host: Optional[int] = None,
+        queue_size: int = 0,
+        queue_timeout: float = 0,
+        rate_limiter: Optional[CacheRateLimiter] = None,
+        overflow: str = 'origin',
+        retry_after: int = 10
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown admission overflow policy "%s"' % overflow)
+        self.overflow = overflow
+        self.retry_after = retry_after
+        self.max_renders = max_renders
+        self.max_renders_per_host = max_renders_per_host
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rate_limiter = rate_limiter
+        self.counters = Counters()
+        self.in_flight = 0
+        self.queue_depth = 0
+        self._hosts = {}  # type: Dict[str, int]
+        self._cond = threading.Condition()
+
+    def can_admit(self, host: str) -> bool:
+        if self.max_renders is not None and self.in_flight >= self.max_renders:
+            return False
+        return self.max_renders_per_host is None or self._hosts.get(host, 0) < self.max_renders_per_host
+
+    def acquire(self, host: str) -> Optional[str]:
+        """
+        Admit render for host waiting in queue if needed, return `None` if admitted or reason of rejection.
+
+        Admitted renders must be released.
+        """
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+            return self.reject('rate')
+
+        with self._cond:
+            if not self.can_admit(host):
+                if self.queue_depth >= self.queue_size:
+                    return self.reject('queue_full')
+                self.queue_depth += 1
+                self.counters.incr('queued')
+                try:
+                    admitted = self._cond.wait_for(lambda: self.can_admit(host), self.queue_timeout)
+                finally:
+                    self.queue_depth -= 1
+                if not admitted:
+                    return self.reject('queue_timeout')
+            self.in_flight += 1
+            self._hosts[host] = self._hosts.get(host, 0) + 1
+        self.counters.incr('admitted')
+        return None
+
+    def release(self, host: str):
+        with self._cond:
+            self.in_flight -= 1
+            count = self._hosts[host] - 1
+            if count:
+                self._hosts[host] = count
+            else:
+                del self._hosts[host]
+            self._cond.notify_all()
+
+    def reject(self, reason: str) -> str:
+        self.counters.incr('rejected')
+        self.counters.incr('rejected_%s' % reason)
+        return reason
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return renders in flight, requests waiting in queue and counters of admitted and rejected requests.
+        """
+        with self._cond:
+            stats = {'in_flight': self.in_flight, 'queue_depth': self.queue_depth}  # type: Dict[str, Any]
+        stats.update(self.counters.as_dict())
+        return stats
+
+
+def build_admission_controller() -> Optional[AdmissionController]:
+    """
+    Build controller from settings, return `None` if renders are not limited.
+    """
+    rate_limiter = None
+    if settings.ADMISSION_RATE is not None:
+        rate_limiter = CacheRateLimiter(
+            caches[settings.CACHE_ALIAS],
+            '%s:admission' % settings.CACHE_PREFIX,
+            settings.ADMISSION_RATE,
+            burst=settings.ADMISSION_BURST,
+        )
+    limits = (settings.ADMISSION_MAX_RENDERS, settings.ADMISSION_MAX_RENDERS_PER_HOST, rate_limiter)
+    if all(limit is None for limit in limits):
+        return None
+    return AdmissionController(
+        max_renders=settings.ADMISSION_MAX_RENDERS,
+        max_renders_per_host=settings.ADMISSION_MAX_RENDERS_PER_HOST,
+        queue_size=settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        rate_limiter=rate_limiter,
+        overflow=settings.ADMISSION_OVERFLOW,
+        retry_after=settings.ADMISSION_RETRY_AFTER,
+    )
+
+
+admission_controller = build_admission_controller()
+
+
+def reload_admission_controller(*args, **kwargs):
+    global admission_controller
+    if kwargs['setting'].replace('DJANGO_SSR_', '').startswith('ADMISSION_'):
+        admission_controller = build_admission_controller()
+
+
+setting_changed.connect(reload_admission_controller)
@@ -0,0 +1,402 @@
+"""
+Asynchronous backends, require `aiohttp` to be installed.
+
+Backends may be used by any asyncio code, calls of django's cache are run in the loop's default executor.
+There is no asynchronous middleware, as supported versions of Django cannot run it, so renders of
+asynchronous backends are not limited by admission control.
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from django.http import HttpRequest, HttpResponse
+
+from django_ssr import backends, instrumentation, settings
+from django_ssr.balancer import Endpoint, EndpointPool, render_urls
+from django_ssr.resilience import CircuitBreaker, backoff_delays, build_circuit_breaker
+from django_ssr.snapshot import Snapshot
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+__all__ = [
+    'AsyncBackendBase',
+    'AsyncCachingBackendMixin',
+    'AsyncPrerenderIOHosted',
+    'AsyncPrerenderIO',
+]
+
+logger = logging.getLogger(__name__)
+
+
+async def run_sync(func: Callable, *args) -> Any:
+    """
+    Run blocking function, e.g. a call of django's cache, in the loop's default executor.
+    """
+    return await asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+class AsyncBackendBase(backends.BackendBase):
+    """
+    Base class for asynchronous SSR's.
+    """
+
+    async def render(self, url: str) -> HttpResponse:
+        """
+        Return an HttpResponse, passing through all headers and the status code.
+        """
+        raise NotImplementedError
+
+    async def update(self, url: str) -> bool:
+        """
+        Force an update of the cache for a particular URL.
+        """
+        raise NotImplementedError
+
+    async def update_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        urls = list(OrderedDict.fromkeys(urls))
+        return OrderedDict(zip(urls, await self.dispatch_updates(self.update_uncached, urls)))
+
+    async def update_uncached(self, url: str) -> bool:
+        return await self.update(url)
+
+    async def dispatch_updates(self, update: Callable[[Any], Awaitable[bool]], items: List) -> List[bool]:
+        """
+        Await `update` for each item, up to `update_concurrency` at a time and at most `update_rate` per second.
+        """
+        semaphore = asyncio.Semaphore(max(self.update_concurrency, 1))
+
+        async def call(item) -> bool:
+            async with semaphore:
+                if self.update_limiter is not None:
+                    await asyncio.sleep(self.update_limiter.reserve())
+                try:
+                    return await update(item)
+                except Exception as e:
+                    logger.warning('Update of %s failed: %r' % (item, e))
+                    return False
+
+        return list(await asyncio.gather(*(call(item) for item in items)))
+
+
+class AsyncCachingBackendMixin(backends.CachingBackendMixin):
+    """
+    Store pages rendered by asynchronous backend in django's cache.
+
+    Concurrent misses and background refreshes are handled by the event loop instead of threads,
+    `refresh_queue_size` bounds the number of refreshes in progress.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._renders = {}  # type: Dict[str, asyncio.Future]
+        self._refreshes = set()  # type: Set[str]
+
+    async def render(self, url: str) -> HttpResponse:
+        policy = self.cache_policy(url)
+        if not policy.cacheable:
+            self.counters.incr('not_cacheable')
+            return await self.render_uncached(url)
+
+        snapshot = await run_sync(self.cache_retrieve_snapshot, url)
+        if snapshot is None:
+            return (await self.render_miss(url)).to_response()
+        return self.render_snapshot(url, snapshot, policy)
+
+    async def render_uncached(self, url: str) -> HttpResponse:
+        return await super(backends.CachingBackendMixin, self).render(self.canonicalizer.canonicalize(url))
+
+    async def render_not_modified(self, request: HttpRequest, url: str) -> Optional[HttpResponse]:
+        if 'HTTP_IF_NONE_MATCH' not in request.META and 'HTTP_IF_MODIFIED_SINCE' not in request.META:
+            return None
+        policy = self.cache_policy(url)
+        if not policy.cacheable:
+            return None
+        meta = await run_sync(self.cache_retrieve_meta, url)
+        return self.not_modified_response(request, url, meta, policy)
+
+    async def update(self, url: str) -> bool:
+        is_ok = await super(backends.CachingBackendMixin, self).update(url)
+        if is_ok:
+            await run_sync(self.cache_clear, url)
+        return is_ok
+
+    async def update_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        results = await super(backends.CachingBackendMixin, self).update_many(urls)
+        await run_sync(self.cache_clear_many, [url for url, is_ok in results.items() if is_ok])
+        return results
+
+    async def update_uncached(self, url: str) -> bool:
+        return await super(backends.CachingBackendMixin, self).update(url)
+
+    async def render_miss(self, url: str) -> Snapshot:
+        key = self.cache_build_key(url)
+        future = self._renders.get(key)
+        shared = future is not None
+        if not shared:
+            future = self._renders[key] = asyncio.ensure_future(self.render_coalesced(url))
+            future.add_done_callback(lambda f: self._renders.pop(key, None))
+
+        try:
+            if shared:
+                snapshot = await asyncio.wait_for(asyncio.shield(future), self.render_wait_timeout)
+            else:
+                snapshot = await future
+        except asyncio.TimeoutError as e:
+            self.counters.incr('render_wait_timeout')
+            if self.render_wait_fallback == 'origin':
+                raise backends.RenderError('Timed out waiting for %s' % url) from e
+            return await self.render_and_store(url)
+
+        if shared:
+            self.counters.incr('coalesced')
+        return snapshot
+
+    async def render_coalesced(self, url: str) -> Snapshot:
+        if not self.render_lock:
+            return await self.render_and_store(url)
+
+        lock_key = '%s:lock' % self.cache_build_key(url)
+        if await run_sync(functools.partial(self.cache.add, lock_key, 1, timeout=self.render_lock_timeout)):
+            try:
+                return await self.render_and_store(url)
+            finally:
+                await run_sync(self.cache.delete, lock_key)
+
+        deadline = time.monotonic() + self.render_wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.render_poll_interval)
+            snapshot = await run_sync(self.cache_retrieve_snapshot, url)
+            if snapshot is not None:
+                self.counters.incr('coalesced_remote')
+                return snapshot
+        raise asyncio.TimeoutError('Timed out waiting for render of %s in another process' % url)
+
+    async def render_and_store(self, url: str) -> Snapshot:
+        failures = await run_sync(self.render_check_backoff, url)
+        try:
+            resp = self.check_rendered_status(url, await self.render_uncached(url))
+        except Exception as e:
+            await run_sync(self.render_failed, url, failures)
+            if isinstance(e, backends.RenderError):
+                raise
+            raise backends.RenderError('Render of %s failed: %r' % (url, e)) from e
+        if failures is not None:
+            await run_sync(self.cache.delete, self.render_failures_key(url))
+        return await run_sync(self.cache_set, url, resp)
+
+    async def refresh(self, url: str):
+        key = self.cache_build_key(url)
+        try:
+            await self.render_and_store(url)
+            self.counters.incr('refreshed')
+        except Exception as e:
+            logger.error('Background refresh of %s failed: %s' % (url, e), exc_info=True)
+        finally:
+            self._refreshes.discard(key)
+
+    def schedule_refresh(self, url: str) -> bool:
+        key = self.cache_build_key(url)
+        if key in self._refreshes or len(self._refreshes) >= self.refresh_pool.max_queue:
+            self.counters.incr('refresh_skipped')
+            return False
+        self._refreshes.add(key)
+        asyncio.ensure_future(self.refresh(url))
+        self.counters.incr('refresh_scheduled')
+        return True
+
+
+class AsyncPrerenderIOHosted(AsyncBackendBase):
+    """
+    Render with self-hosted version of prerender.io using pooled `aiohttp` session.
+
+    The session is created on first use, so the backend can be instantiated outside of the event loop.
+    Renders are balanced across a list of render urls, retried and guarded by circuit breaker as by
+    `PrerenderIOHosted`, but all endpoints share the session whose connector pools connections per host.
+    """
+
+    def __init__(
+        self,
+        *,
+        render_url: Union[str, Iterable[str]] = '',
+        update_url: str = '',
+        connection_limit: int = None,
+        connection_limit_per_host: int = None,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        retries: int = None,
+        retry_backoff: float = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        balancing: str = None,
+        eject_failures: int = None,
+        eject_timeout: float = None,
+        **kwargs
+    ):
+        if aiohttp is None:
+            raise ImportError('aiohttp is required by %s' % self.__class__.__name__)
+        super().__init__(**kwargs)
+
+        urls = render_urls(render_url or settings.PRERENDER_IO_HOSTED_URL)
+        if not urls or not all(urls):
+            raise ValueError('Render url is missing or empty')
+        self.endpoints = EndpointPool(
+            [Endpoint(url) for url in urls],
+            strategy=balancing or settings.RENDER_BALANCING,
+            eject_failures=eject_failures if eject_failures is not None else settings.RENDER_EJECT_FAILURES,
+            eject_timeout=eject_timeout if eject_timeout is not None else settings.RENDER_EJECT_TIMEOUT,
+        )
+        self.render_url = urls[0]
+
+        self.update_url = update_url or settings.PRERENDER_IO_HOSTED_UPDATE_URL
+        if not self.update_url:
+            raise ValueError('Update url is missing or empty')
+
+        self.connection_limit = connection_limit if connection_limit is not None else settings.ASYNC_CONNECTION_LIMIT
+        self.connection_limit_per_host = (
+            connection_limit_per_host if connection_limit_per_host is not None
+            else settings.ASYNC_CONNECTION_LIMIT_PER_HOST
+        )
+        self.connect_timeout = connect_timeout if connect_timeout is not None else settings.RENDER_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout if read_timeout is not None else settings.RENDER_READ_TIMEOUT
+        self.retries = retries if retries is not None else settings.RENDER_RETRIES
+        self.retry_backoff = retry_backoff if retry_backoff is not None else settings.RENDER_RETRY_BACKOFF
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else build_circuit_breaker()
+        self.headers = {}  # type: Dict[str, str]
+        self._session = None
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.connection_limit,
+                    limit_per_host=self.connection_limit_per_host,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.connect_timeout,
+                    sock_read=self.read_timeout,
+                ),
+                headers=self.headers,
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def render(self, url: str) -> HttpResponse:
+        if self.circuit_breaker is None:
+            return await self.render_with_retries(url)
+        permit = self.circuit_breaker.allow()
+        if permit is None:
+            raise backends.RenderError('Circuit breaker is open, not rendering %s' % url)
+
+        is_ok = False
+        try:
+            response = await self.render_with_retries(url)
+            is_ok = True
+            return response
+        finally:
+            self.circuit_breaker.record(permit, is_ok)
+
+    async def render_with_retries(self, url: str) -> HttpResponse:
+        """
+        Render url, retrying failed attempts on other endpoints with backoff.
+        """
+        delays = backoff_delays(self.retries, self.retry_backoff)
+        tried = []  # type: List[Endpoint]
+        while True:
+            endpoint = self.endpoints.acquire(url, exclude=tried)
+            is_ok = False
+            started = time.monotonic()
+            try:
+                async with self.session.get('%s%s' % (endpoint.url, url), allow_redirects=False) as r:
+                    instrumentation.record('upstream_render', time.monotonic() - started)
+                    if r.status < 500:
+                        response = await self.aiohttp_response_to_django_response(r)
+                        is_ok = True
+                        return response
+                    error = 'status %d' % r.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            finally:
+                self.endpoints.release(endpoint, is_ok, time.monotonic() - started)
+            tried.append(endpoint)
+
+            delay = next(delays, None)
+            if delay is None:
+                raise backends.RenderError('Render of %s failed: %s' % (url, error))
+            logger.info('Render of %s by %s failed: %s, retrying in %.2fs' % (url, endpoint.url, error, delay))
+            await asyncio.sleep(delay)
+
+    async def update(self, url: str) -> bool:
+        return await self.post_update({'url': url})
+
+    async def post_update(self, data: dict) -> bool:
+        headers = {'Content-Type': 'application/json'}
+        try:
+            async with self.session.post(self.update_url, json=data, headers=headers) as r:
+                if r.status == 429:
+                    logger.warning('Update of %s is rate limited' % data)
+                    return False
+                return r.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning('Update of %s failed: %r' % (data, e))
+            return False
+
+    async def aiohttp_response_to_django_response(self, response: 'aiohttp.ClientResponse') -> HttpResponse:
+        """
+        Build django's response from aiohttp's response.
+        """
+        content = await response.read()
+        instrumentation.size('rendered', len(content))
+        r = HttpResponse(content, status=response.status)
+        for k, v in response.headers.items():
+            if k.lower() not in settings.REMOVE_HEADERS:
+                r[k] = v
+        r['content-length'] = len(content)
+        return r
+
+
+class AsyncPrerenderIO(AsyncPrerenderIOHosted):
+    """
+    Render with prerender.io using pooled `aiohttp` session.
+    """
+
+    UPDATE_BATCH_SIZE = backends.PrerenderIO.UPDATE_BATCH_SIZE
+
+    def __init__(
+        self,
+        *,
+        token: str = '',
+        **kwargs
+    ):
+        super().__init__(
+            render_url=kwargs.pop('render_url', backends.PrerenderIO.PRERENDER_IO_URL),
+            update_url=kwargs.pop('update_url', backends.PrerenderIO.PRERENDER_IO_UPDATE_URL),
+            **kwargs,
+        )
+
+        self.token = token or settings.PRERENDER_IO_TOKEN
+        if not self.token:
+            raise ValueError('prerender.io token is missing or empty')
+        self.headers[backends.PrerenderIO.PRERENDER_TOKEN_HEADER_NAME] = self.token
+
+    async def update(self, url: str) -> bool:
+        return await self.post_update({'prerenderToken': self.token, 'url': url})
+
+    async def update_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        urls = list(OrderedDict.fromkeys(urls))
+        size = self.UPDATE_BATCH_SIZE
+        batches = [urls[i:i + size] for i in range(0, len(urls), size)]
+        results = await self.dispatch_updates(self.update_batch, batches)
+        return OrderedDict((url, is_ok) for batch, is_ok in zip(batches, results) for url in batch)
+
+    async def update_batch(self, urls: List[str]) -> bool:
+        return await self.post_update({'prerenderToken': self.token, 'urls': urls})
@@ -1,17 +1,32 @@
 import hashlib
 import logging
-import pickle
-from typing import Callable, Optional
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse, ParseResult
 
 import requests
+from requests.adapters import HTTPAdapter
 from django.core.cache import caches, BaseCache
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from django.utils.encoding import force_bytes
+from django.utils.module_loading import import_string
 
-from django_ssr import settings
+from django_ssr import canonical, instrumentation, postprocess, rules, settings
+from django_ssr.balancer import Endpoint, EndpointPool, render_urls
+from django_ssr.compression import get_codec
+from django_ssr.lru import MemoryLRU
+from django_ssr.metrics import Counters
+from django_ssr.postprocess import build_pipeline
+from django_ssr.resilience import CircuitBreaker, backoff_delays, build_circuit_breaker
+from django_ssr.snapshot import CacheTee, ClosingIterator, Snapshot, SnapshotError, SnapshotMeta, SnapshotVersionError
+from django_ssr.workers import BackgroundPool, RateLimiter, SingleFlight
 
 __all__ = [
+    'RenderError',
+    'get_backend',
     'BackendBase',
     'PrerenderIOHosted',
     'PrerenderIO',
@@ -19,15 +34,50 @@ __all__ = [
 
 logger = logging.getLogger(__name__)
 SessionCreator = Callable[..., requests.Session]
+Backend = Union[str, Callable[..., 'BackendBase']]
+
+
+class RenderError(Exception):
+    """
+    Page cannot be rendered, request should be served by django's view.
+    """
+
+
+def get_backend(backend: Backend = None) -> 'BackendBase':
+    """
+    Instantiate backend from class, its dotted path or `settings.DJANGO_SSR_BACKEND`.
+    """
+    backend = backend if backend is not None else settings.BACKEND
+    if isinstance(backend, str):
+        backend = import_string(backend)
+    return backend()
 
 
 class BackendBase:
     """
     Base class for all SSR's.
+
+    Urls are brought to canonical form by `canonicalizer`, so their variants are rendered and cached once.
+    With `canonical_index_size` set, distinct raw urls of requests are counted per canonical url.
     """
 
-    def __init__(self, *, strip_query_params: bool = settings.STRIP_QUERY_PARAMS, **kwargs):
+    def __init__(
+        self,
+        *,
+        strip_query_params: bool = settings.STRIP_QUERY_PARAMS,
+        update_concurrency: int = None,
+        update_rate: float = None,
+        canonicalizer: canonical.UrlCanonicalizer = None,
+        canonical_index_size: int = None,
+        **kwargs
+    ):
         self.strip_query_params = strip_query_params
+        self.canonicalizer = canonicalizer if canonicalizer is not None else canonical.url_canonicalizer
+        index_size = canonical_index_size if canonical_index_size is not None else settings.CANONICAL_INDEX_SIZE
+        self.canonical_index = canonical.CanonicalIndex(index_size) if index_size else None
+        self.update_concurrency = update_concurrency if update_concurrency is not None else settings.UPDATE_CONCURRENCY
+        update_rate = update_rate if update_rate is not None else settings.UPDATE_RATE
+        self.update_limiter = RateLimiter(update_rate) if update_rate else None
 
     def build_absolute_url(self, request: HttpRequest) -> str:
         """
@@ -37,7 +87,10 @@ class BackendBase:
         if self.strip_query_params:
             parts = urlparse(url)  # type: ParseResult
             url = '%s://%s%s' % (parts.scheme, parts.netloc, parts.path)
-        return url
+        canonical_url = self.canonicalizer.canonicalize(url)
+        if self.canonical_index is not None:
+            self.canonical_index.record(url, canonical_url)
+        return canonical_url
 
     def render(self, url: str) -> HttpResponse:
         """
@@ -51,32 +104,145 @@ class BackendBase:
         """
         raise NotImplementedError
 
+    def update_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        """
+        Force an update of the cache for many URLs, return whether update of each URL succeeded.
+        """
+        urls = list(OrderedDict.fromkeys(urls))
+        return OrderedDict(zip(urls, self.dispatch_updates(self.update_uncached, urls)))
+
+    def update_uncached(self, url: str) -> bool:
+        """
+        Update URL leaving cached responses in place, caching backends clear them in `update` and `update_many`.
+        """
+        return self.update(url)
+
+    def dispatch_updates(self, update: Callable[[Any], bool], items: List) -> List[bool]:
+        """
+        Call `update` for each item by up to `update_concurrency` threads, at most `update_rate` calls per second.
+        """
+        def call(item) -> bool:
+            if self.update_limiter is not None:
+                self.update_limiter.acquire()
+            try:
+                return update(item)
+            except Exception as e:
+                logger.warning('Update of %s failed: %r' % (item, e))
+                return False
+
+        if self.update_concurrency <= 1 or len(items) <= 1:
+            return [call(item) for item in items]
+        with ThreadPoolExecutor(min(self.update_concurrency, len(items))) as executor:
+            return list(executor.map(call, items))
+
 
 class RequestsDjangoResponseBuilderMixin:
     def requests_response_to_django_response(self, response: requests.Response) -> HttpResponse:
         """
         Build django's response from request's response.
         """
-        r = HttpResponse(response.content)
+        with instrumentation.timer('response_build'):
+            r = HttpResponse(response.content)
+            for k, v in response.headers.items():
+                if k.lower() not in settings.REMOVE_HEADERS:
+                    r[k] = v
+            r['content-length'] = len(response.content)
+            r.status_code = response.status_code
+        instrumentation.size('rendered', len(response.content))
+        return r
+
+    def requests_response_to_streaming_response(
+        self,
+        response: requests.Response,
+        chunk_size: int
+    ) -> StreamingHttpResponse:
+        """
+        Build django's streaming response from request's response made with `stream=True`.
+
+        Content-length is only kept if content was not encoded, as requests decodes it while streaming.
+        """
+        # Upstream connection is released when the response is closed, even if its content is never read
+        r = StreamingHttpResponse(
+            ClosingIterator(self.iter_requests_response(response, chunk_size), response.close),
+            status=response.status_code,
+        )
         for k, v in response.headers.items():
             if k.lower() not in settings.REMOVE_HEADERS:
                 r[k] = v
-        r['content-length'] = len(response.content)
-        r.status_code = response.status_code
+        if 'content-encoding' in response.headers and 'content-length' in r:
+            del r['content-length']
         return r
 
+    @staticmethod
+    def iter_requests_response(response: requests.Response, chunk_size: int) -> Iterator[bytes]:
+        try:
+            yield from response.iter_content(chunk_size)
+        finally:
+            response.close()
+
 
 class CachingBackendMixin:
     """
     Store rendered pages in django's cache
+
+    Pages older than `cache_soft_timeout` are served stale while they are re-rendered in background.
+    With `cache_stale_timeout` set, a copy of each page is kept that many seconds past its timeout under
+    a separate key. `render_stale` serves it when a render cannot be afforded, e.g. when admission overflows.
+
+    Concurrent cache misses of the same page within a process wait for a single render. With `render_lock`
+    a lock in the cache makes workers of other processes poll the cache for its result too. If the result
+    is not ready within `render_wait_timeout`, `render_wait_fallback` decides whether to render the page
+    anyway ('render') or to raise `RenderError` so the page is served by django's view ('origin').
+
+    Streaming responses are stored once they are sent to client unless their content is larger than
+    `cache_max_size`, concurrent misses wait for that to happen.
+
+    With `l1_cache_size` set, loaded snapshots are also kept in an in-process LRU cache of that many bytes
+    for at most `l1_cache_timeout` seconds. Entries are invalidated by `cache_clear` of the same process only.
+
+    `cache_rules` override timeouts and cacheability per url path, `DJANGO_SSR_CACHE_RULES` are used by default.
+
+    404/410 and redirect responses are stored for `cache_not_found_timeout` and `cache_redirect_timeout`,
+    5xx responses fail the render. Once a render fails, renders of the url raise `RenderError` right away
+    for `render_failure_backoff` seconds, doubled after each consecutive failure up to `render_failure_max_backoff`,
+    so the page is served by django's view instead of hammering the renderer.
+
+    Html pages are transformed by `postprocess` pipeline before they are stored, a streaming response
+    is sent to its client as rendered though.
+
+    Stored pages get ETag and Last-Modified headers. Their metadata is stored under a separate key,
+    so conditional requests are answered with 304 responses without loading pages themselves.
     """
 
+    RENDER_WAIT_FALLBACKS = ('render', 'origin')
+
     def __init__(
         self,
         *,
         cache_alias: str = None,
         cache_prefix: str = None,
         cache_timeout: int = None,
+        compression: str = None,
+        compression_level: int = None,
+        compression_min_size: int = None,
+        cache_soft_timeout: int = None,
+        cache_stale_timeout: int = None,
+        cache_max_size: int = None,
+        refresh_workers: int = None,
+        refresh_queue_size: int = None,
+        render_lock: bool = None,
+        render_lock_timeout: int = None,
+        render_wait_timeout: float = None,
+        render_poll_interval: float = None,
+        render_wait_fallback: str = None,
+        l1_cache_size: int = None,
+        l1_cache_timeout: int = None,
+        cache_rules: rules.CacheRules = None,
+        cache_not_found_timeout: int = None,
+        cache_redirect_timeout: int = None,
+        render_failure_backoff: float = None,
+        render_failure_max_backoff: float = None,
+        postprocess: postprocess.Pipeline = None,
         **kwargs
     ):
         super().__init__(**kwargs)
@@ -84,16 +250,298 @@ class CachingBackendMixin:
         self.cache_prefix = cache_prefix if cache_prefix is not None else settings.CACHE_PREFIX
         self.cache_timeout = cache_timeout if cache_timeout is not None else settings.CACHE_TIMEOUT
 
+        compression = compression if compression is not None else settings.CACHE_COMPRESSION
+        self.compression = get_codec(compression) if compression else None
+        self.compression_level = (
+            compression_level if compression_level is not None else settings.CACHE_COMPRESSION_LEVEL
+        )
+        self.compression_min_size = (
+            compression_min_size if compression_min_size is not None else settings.CACHE_COMPRESSION_MIN_SIZE
+        )
+
+        self.cache_soft_timeout = cache_soft_timeout if cache_soft_timeout is not None else settings.CACHE_SOFT_TIMEOUT
+        self.cache_stale_timeout = (
+            cache_stale_timeout if cache_stale_timeout is not None else settings.CACHE_STALE_TIMEOUT
+        )
+        self.cache_max_size = cache_max_size if cache_max_size is not None else settings.CACHE_MAX_SIZE
+        self.refresh_pool = BackgroundPool(
+            refresh_workers if refresh_workers is not None else settings.REFRESH_WORKERS,
+            refresh_queue_size if refresh_queue_size is not None else settings.REFRESH_QUEUE_SIZE,
+        )
+        self.counters = Counters()
+
+        self.flights = SingleFlight()
+        self.streams = {}  # type: Dict[str, CacheTee]
+        self.render_lock = render_lock if render_lock is not None else settings.RENDER_LOCK
+        self.render_lock_timeout = (
+            render_lock_timeout if render_lock_timeout is not None else settings.RENDER_LOCK_TIMEOUT
+        )
+        self.render_wait_timeout = (
+            render_wait_timeout if render_wait_timeout is not None else settings.RENDER_WAIT_TIMEOUT
+        )
+        self.render_poll_interval = (
+            render_poll_interval if render_poll_interval is not None else settings.RENDER_POLL_INTERVAL
+        )
+        self.render_wait_fallback = render_wait_fallback or settings.RENDER_WAIT_FALLBACK
+        if self.render_wait_fallback not in self.RENDER_WAIT_FALLBACKS:
+            raise ValueError('Unknown render wait fallback "%s"' % self.render_wait_fallback)
+
+        l1_cache_size = l1_cache_size if l1_cache_size is not None else settings.L1_CACHE_SIZE
+        self.l1_cache = MemoryLRU(l1_cache_size) if l1_cache_size else None
+        self.l1_cache_timeout = l1_cache_timeout if l1_cache_timeout is not None else settings.L1_CACHE_TIMEOUT
+        self.cache_rules = cache_rules
+        self.cache_not_found_timeout = (
+            cache_not_found_timeout if cache_not_found_timeout is not None else settings.CACHE_NOT_FOUND_TIMEOUT
+        )
+        self.cache_redirect_timeout = (
+            cache_redirect_timeout if cache_redirect_timeout is not None else settings.CACHE_REDIRECT_TIMEOUT
+        )
+        self.render_failure_backoff = (
+            render_failure_backoff if render_failure_backoff is not None else settings.RENDER_FAILURE_BACKOFF
+        )
+        self.render_failure_max_backoff = (
+            render_failure_max_backoff if render_failure_max_backoff is not None
+            else settings.RENDER_FAILURE_MAX_BACKOFF
+        )
+        self.postprocess = postprocess if postprocess is not None else build_pipeline(settings.POSTPROCESS)
+
     def render(self, url: str) -> HttpResponse:
         """
         Return an HttpResponse, passing through all headers and the status code.
         """
-        resp = self.cache_retrieve(url)
-        if resp is None:
-            resp = super().render(url)
-            self.cache_set(url, resp)
+        policy = self.cache_policy(url)
+        if not policy.cacheable:
+            self.counters.incr('not_cacheable')
+            return self.render_uncached(url)
+
+        response = self.render_cached(url, policy)
+        return response if response is not None else self.render_miss(url)
+
+    def render_cached(self, url: str, policy: rules.CachePolicy = None) -> Optional[HttpResponse]:
+        """
+        Return cached page refreshing it in background if it is stale, or `None` if it is not cached.
+        """
+        policy = policy if policy is not None else self.cache_policy(url)
+        if not policy.cacheable:
+            return None
+        snapshot = self.cache_retrieve_snapshot(url)
+        return self.render_snapshot(url, snapshot, policy) if snapshot is not None else None
+
+    def render_snapshot(self, url: str, snapshot: Snapshot, policy: rules.CachePolicy) -> HttpResponse:
+        """
+        Build response from cached snapshot of url, refreshing it in background if it is stale.
+        """
+        if self.cache_is_stale(snapshot, policy):
+            self.counters.incr('stale_served')
+            instrumentation.incr('cache_stale')
+            self.schedule_refresh(url)
+        else:
+            instrumentation.incr('cache_hit')
+        instrumentation.size('cached', len(snapshot.body))
+        with instrumentation.timer('response_build'):
+            return snapshot.to_response()
+
+    def render_stale(self, url: str) -> Optional[HttpResponse]:
+        """
+        Return cached page or its copy kept past its timeout, or `None` if there is neither.
+        """
+        policy = self.cache_policy(url)
+        response = self.render_cached(url, policy)
+        if response is not None or self.cache_stale_timeout is None or not policy.cacheable:
+            return response
+        data = self.cache.get(self.cache_build_stale_key(self.cache_build_key(url)))
+        snapshot = self.cache_load_snapshot(data) if data is not None else None
+        if snapshot is None:
+            return None
+        self.counters.incr('expired_served')
+        return snapshot.to_response()
+
+    def render_not_modified(self, request: HttpRequest, url: str) -> Optional[HttpResponse]:
+        """
+        Return 304 response if cached page of url matches request's If-None-Match or If-Modified-Since.
+        """
+        if 'HTTP_IF_NONE_MATCH' not in request.META and 'HTTP_IF_MODIFIED_SINCE' not in request.META:
+            return None
+        policy = self.cache_policy(url)
+        if not policy.cacheable:
+            return None
+        return self.not_modified_response(request, url, self.cache_retrieve_meta(url), policy)
+
+    def not_modified_response(
+        self,
+        request: HttpRequest,
+        url: str,
+        meta: Optional[SnapshotMeta],
+        policy: rules.CachePolicy
+    ) -> Optional[HttpResponse]:
+        """
+        Return 304 response if metadata of cached page matches conditional request.
+        """
+        if meta is None or meta.status != 200:
+            return None
+
+        response = get_conditional_response(request, meta.etag, int(meta.created))
+        if response is None or response.status_code != 304:
+            return None
+        for k, v in meta.headers:
+            response[k] = v
+        self.counters.incr('not_modified')
+        if self.cache_is_stale(meta, policy):
+            self.counters.incr('stale_served')
+            self.schedule_refresh(url)
+        return response
+
+    def render_miss(self, url: str) -> HttpResponse:
+        """
+        Render page missing in cache, coalescing concurrent renders of it.
+        """
+        instrumentation.incr('cache_miss')
+        key = self.cache_build_key(url)
+        deadline = time.monotonic() + self.render_wait_timeout
+        try:
+            # A render being streamed to another client is coalesced until it is stored
+            result = self.streams.get(key)
+            shared = result is not None
+            if not shared:
+                result, shared = self.flights.do(key, self.render_coalesced, url, timeout=self.render_wait_timeout)
+            if isinstance(result, CacheTee):
+                if not shared:
+                    return result.response
+                result = result.wait(max(deadline - time.monotonic(), 0))
+                if result is None:
+                    raise TimeoutError('Streamed render of %s was not stored in time' % url)
+        except TimeoutError as e:
+            self.counters.incr('render_wait_timeout')
+            if self.render_wait_fallback == 'origin':
+                raise RenderError(str(e)) from e
+            result = self.render_and_store(url)
+            return result.response if isinstance(result, CacheTee) else result.to_response()
+
+        if shared:
+            self.counters.incr('coalesced')
+        return result.to_response()
+
+    def render_coalesced(self, url: str) -> Union[Snapshot, CacheTee]:
+        """
+        Render and store page unless a worker in another process holds the render lock,
+        wait for that worker's result otherwise.
+        """
+        if not self.render_lock:
+            return self.render_and_store(url)
+
+        lock_key = '%s:lock' % self.cache_build_key(url)
+        if self.cache.add(lock_key, 1, timeout=self.render_lock_timeout):
+            try:
+                return self.render_and_store(url)
+            finally:
+                self.cache.delete(lock_key)
+
+        deadline = time.monotonic() + self.render_wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.render_poll_interval)
+            snapshot = self.cache_retrieve_snapshot(url)
+            if snapshot is not None:
+                self.counters.incr('coalesced_remote')
+                return snapshot
+        raise TimeoutError('Timed out waiting for render of %s in another process' % url)
+
+    def render_uncached(self, url: str) -> HttpResponse:
+        """
+        Render page bypassing the cache, by canonical url as it is stored under it.
+        """
+        return super().render(self.canonicalizer.canonicalize(url))
+
+    def render_and_store(self, url: str) -> Union[Snapshot, CacheTee]:
+        """
+        Render page bypassing the cache and store the result.
+
+        Streaming responses are returned wrapped in `CacheTee`, they are stored once their content is read.
+        """
+        resp = self.render_checked(url)
+        if not resp.streaming:
+            return self.cache_set(url, resp)
+
+        key = self.cache_build_key(url)
+        tee = self.streams[key] = CacheTee(
+            resp,
+            self.cache_max_size,
+            on_complete=lambda snapshot: self.cache_set_snapshot(url, snapshot),
+            on_done=lambda: self.streams.pop(key, None),
+        )
+        return tee
+
+    def render_checked(self, url: str) -> HttpResponse:
+        """
+        Render page bypassing the cache, raise `RenderError` if it failed or its status is a server error.
+
+        Failures are remembered, so a failing url is not rendered again until its backoff is over.
+        """
+        failures = self.render_check_backoff(url)
+        try:
+            resp = self.check_rendered_status(url, self.render_uncached(url))
+        except Exception as e:
+            self.render_failed(url, failures)
+            if isinstance(e, RenderError):
+                raise
+            raise RenderError('Render of %s failed: %r' % (url, e)) from e
+        if failures is not None:
+            self.cache.delete(self.render_failures_key(url))
         return resp
 
+    def check_rendered_status(self, url: str, resp: HttpResponse) -> HttpResponse:
+        if resp.status_code >= 500:
+            resp.close()
+            raise RenderError('Render of %s failed with status %d' % (url, resp.status_code))
+        return resp
+
+    def render_failures_key(self, url: str) -> str:
+        return '%s:failures' % self.cache_build_key(url)
+
+    def render_check_backoff(self, url: str) -> Optional[Tuple[int, float]]:
+        """
+        Return number of consecutive render failures of url and time of next try,
+        raise `RenderError` if it is not time to try again yet.
+        """
+        if self.render_failure_backoff is None:
+            return None
+        failures = self.cache.get(self.render_failures_key(url))
+        if failures is not None and time.time() < failures[1]:
+            self.counters.incr('render_backoff')
+            raise RenderError('Render of %s failed %d times, not retrying for %.1fs' % (
+                url, failures[0], failures[1] - time.time(),
+            ))
+        return failures
+
+    def render_failed(self, url: str, failures: Optional[Tuple[int, float]]):
+        """
+        Remember render failure, so renders of url are not tried for exponentially growing time.
+        """
+        self.counters.incr('render_failed')
+        if self.render_failure_backoff is None:
+            return
+        count = failures[0] + 1 if failures is not None else 1
+        backoff = min(self.render_failure_backoff * 2 ** (count - 1), self.render_failure_max_backoff)
+        # Failures are remembered after backoff is over, so the next failure doubles it
+        timeout = int(backoff + self.render_failure_max_backoff) + 1
+        self.cache.set(self.render_failures_key(url), (count, time.time() + backoff), timeout=timeout)
+
+    def refresh(self, url: str):
+        """
+        Re-render page in background and store the result.
+        """
+        result = self.render_and_store(url)
+        if isinstance(result, CacheTee):
+            result.consume()
+        self.counters.incr('refreshed')
+
+    def schedule_refresh(self, url: str) -> bool:
+        """
+        Refresh page in background unless it is already scheduled or the queue is full.
+        """
+        scheduled = self.refresh_pool.submit(self.cache_build_key(url), self.refresh, url)
+        self.counters.incr('refresh_scheduled' if scheduled else 'refresh_skipped')
+        return scheduled
+
     def update(self, url: str) -> bool:
         """
         Force an update of the cache for a particular URL.
@@ -103,87 +551,464 @@ class CachingBackendMixin:
             self.cache_clear(url)
         return is_ok
 
+    def update_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        """
+        Force an update of the cache for many URLs and clear cached responses of updated ones at once.
+        """
+        results = super().update_many(urls)
+        self.cache_clear_many([url for url, is_ok in results.items() if is_ok])
+        return results
+
+    def update_uncached(self, url: str) -> bool:
+        return super().update(url)
+
+    def cache_policy(self, url: str) -> rules.CachePolicy:
+        """
+        Return caching policy of url, options not set by its rule are taken from backend.
+        """
+        cache_rules = self.cache_rules if self.cache_rules is not None else rules.cache_rules
+        policy = cache_rules.match(url) if cache_rules else None
+        if policy is None:
+            return rules.CachePolicy(self.cache_timeout, self.cache_soft_timeout, True, True)
+        return rules.CachePolicy(
+            policy.timeout if policy.timeout is not None else self.cache_timeout,
+            policy.soft_timeout if policy.soft_timeout is not None else self.cache_soft_timeout,
+            policy.cacheable if policy.cacheable is not None else True,
+            policy.cache_non_200 if policy.cache_non_200 is not None else True,
+        )
+
+    def cache_timeout_for(self, status: int, policy: rules.CachePolicy) -> Optional[int]:
+        """
+        Return timeout of response with status, 404/410 and redirects are stored for a shorter time.
+
+        `None` means the response is stored forever, as in django's cache.
+        """
+        if status in (404, 410):
+            timeout = self.cache_not_found_timeout
+        elif 300 <= status < 400:
+            timeout = self.cache_redirect_timeout
+        else:
+            return policy.timeout
+        if timeout is None or policy.timeout is None:
+            return policy.timeout if timeout is None else timeout
+        return min(timeout, policy.timeout)
+
     def cache_build_key(self, url: str) -> str:
         """
-        Return key under which response will be saved or retrieved.
+        Return key under which response will be saved or retrieved, it is the same for all variants of url.
         """
-        url_hash = hashlib.md5(force_bytes(url)).hexdigest()
+        url_hash = hashlib.md5(force_bytes(self.canonicalizer.canonicalize(url))).hexdigest()
         return '%s:%s' % (self.cache_prefix, url_hash)
 
-    def cache_set(self, url: str, resp: HttpResponse):
+    def cache_build_meta_key(self, key: str) -> str:
+        return '%s:meta' % key
+
+    def cache_build_stale_key(self, key: str) -> str:
+        return '%s:stale' % key
+
+    def cache_stale_timeout_for(self, timeout: Optional[int]) -> Optional[int]:
+        """
+        Return timeout of the copy of page stored for `timeout`, or `None` if no copy is kept.
+        """
+        if self.cache_stale_timeout is None or timeout is None:
+            return None
+        return timeout + self.cache_stale_timeout
+
+    def cache_set(self, url: str, resp: HttpResponse) -> Snapshot:
+        """
+        Save http response in cache, compressing it if enabled.
+
+        Return snapshot of response as it was before compression.
+        """
+        return self.cache_set_snapshot(url, Snapshot.from_response(resp))
+
+    def cache_set_snapshot(self, url: str, snapshot: Snapshot) -> Snapshot:
+        """
+        Save snapshot in cache unless its policy forbids it or its body is larger than `cache_max_size`.
+
+        Return snapshot transformed by `postprocess` pipeline.
+        """
+        snapshot = self.cache_process_snapshot(url, snapshot)
+        policy = self.cache_policy(url)
+        stored = self.cache_prepare_snapshot(snapshot, policy)
+        if stored is not None:
+            key = self.cache_build_key(url)
+            timeout = self.cache_timeout_for(snapshot.status, policy)
+            stale_timeout = self.cache_stale_timeout_for(timeout)
+            entries = self.cache_entries(key, stored)
+            with instrumentation.timer('cache_store'):
+                self.cache.set_many(entries, timeout=timeout)
+                if stale_timeout is not None:
+                    self.cache.set(self.cache_build_stale_key(key), entries[key], timeout=stale_timeout)
+            self.l1_cache_set(key, stored, timeout)
+        return snapshot
+
+    def cache_set_many(self, responses: Dict[str, HttpResponse]):
+        """
+        Save http responses keyed by url in cache with a call per timeout, streaming responses are read.
+        """
+        data = {}  # type: Dict[int, Dict[str, bytes]]
+        for url, resp in responses.items():
+            if resp.streaming:
+                try:
+                    snapshot = Snapshot.from_response(resp, body=b''.join(resp.streaming_content))
+                finally:
+                    resp.close()
+            else:
+                snapshot = Snapshot.from_response(resp)
+            snapshot = self.cache_process_snapshot(url, snapshot)
+            policy = self.cache_policy(url)
+            stored = self.cache_prepare_snapshot(snapshot, policy)
+            if stored is not None:
+                key = self.cache_build_key(url)
+                timeout = self.cache_timeout_for(snapshot.status, policy)
+                entries = self.cache_entries(key, stored)
+                data.setdefault(timeout, {}).update(entries)
+                stale_timeout = self.cache_stale_timeout_for(timeout)
+                if stale_timeout is not None:
+                    data.setdefault(stale_timeout, {})[self.cache_build_stale_key(key)] = entries[key]
+                self.l1_cache_set(key, stored, timeout)
+        with instrumentation.timer('cache_store'):
+            for timeout, values in data.items():
+                self.cache.set_many(values, timeout=timeout)
+
+    def cache_process_snapshot(self, url: str, snapshot: Snapshot) -> Snapshot:
+        """
+        Return snapshot with html body transformed by `postprocess` pipeline and with validators of the result.
+
+        The pipeline is given canonical url, as the page is stored under it and served to all variants of url.
+        """
+        if snapshot.encoding:
+            return snapshot
+        content_type = next((v for k, v in snapshot.headers if k.lower() == 'content-type'), '')
+        mime_type, _, params = content_type.partition(';')
+        if self.postprocess is not None and mime_type.strip().lower() in ('text/html', 'application/xhtml+xml'):
+            charset = 'utf-8'
+            for param in params.split(';'):
+                k, _, v = param.partition('=')
+                if k.strip().lower() == 'charset':
+                    charset = v.strip().strip('"') or charset
+            body = self.postprocess.process(snapshot.body, self.canonicalizer.canonicalize(url), charset)
+            snapshot = Snapshot(snapshot.status, snapshot.headers, body, snapshot.encoding, snapshot.created)
+        return snapshot.with_validators()
+
+    def cache_entries(self, key: str, stored: Snapshot) -> Dict[str, bytes]:
+        """
+        Return cache entries of snapshot: the snapshot itself and its metadata under a separate key.
+        """
+        return {key: stored.dumps(), self.cache_build_meta_key(key): stored.meta().dumps()}
+
+    def cache_prepare_snapshot(self, snapshot: Snapshot, policy: rules.CachePolicy) -> Optional[Snapshot]:
         """
-        Save http response in cache.
+        Return snapshot as it should be stored, compressed if enabled, or `None` if it must not be stored.
         """
-        self.cache.set(self.cache_build_key(url), pickle.dumps(resp), timeout=self.cache_timeout)
+        if not policy.cacheable or snapshot.status >= 500 or (snapshot.status != 200 and not policy.cache_non_200):
+            self.counters.incr('not_cacheable')
+            return None
+        if len(snapshot.body) > self.cache_max_size:
+            self.counters.incr('cache_too_large')
+            return None
+        if self.compression is not None and not snapshot.encoding and len(snapshot.body) >= self.compression_min_size:
+            return snapshot.compress(self.compression, self.compression_level)
+        return snapshot
+
+    def cache_is_stale(self, snapshot: Union[Snapshot, SnapshotMeta], policy: rules.CachePolicy = None) -> bool:
+        """
+        Check cached page is older than soft timeout of its policy or backend.
+        """
+        soft_timeout = policy.soft_timeout if policy is not None else self.cache_soft_timeout
+        return soft_timeout is not None and snapshot.age > soft_timeout
 
     def cache_retrieve(self, url: str) -> Optional[HttpResponse]:
         """
         Retrieve http response from cache.
         """
-        resp = self.cache.get(self.cache_build_key(url))
-        if resp is None:
+        snapshot = self.cache_retrieve_snapshot(url)
+        return snapshot.to_response() if snapshot is not None else None
+
+    def cache_retrieve_snapshot(self, url: str) -> Optional[Snapshot]:
+        """
+        Retrieve snapshot of http response from in-process cache or django's cache.
+        """
+        key = self.cache_build_key(url)
+        if self.l1_cache is not None:
+            snapshot = self.l1_cache.get(key)
+            if snapshot is not None:
+                self.counters.incr('l1_hits')
+                return snapshot
+            self.counters.incr('l1_misses')
+
+        with instrumentation.timer('cache_lookup'):
+            data = self.cache.get(key)
+        if data is None:
+            self.counters.incr('l2_misses')
             return None
+        self.counters.incr('l2_hits')
+
+        snapshot = self.cache_load_snapshot(data)
+        if snapshot is not None:
+            self.l1_cache_set(key, snapshot, self.cache_timeout_for(snapshot.status, self.cache_policy(url)))
+        return snapshot
 
+    def cache_load_snapshot(self, data: bytes) -> Optional[Snapshot]:
+        """
+        Load snapshot stored in django's cache, return `None` if it cannot be loaded.
+        """
         try:
-            resp = pickle.loads(resp)
-        except pickle.UnpicklingError as e:
-            logger.error('Cannot unpickle rendered http response from cache: %s' % e, exc_info=True)
-            return None
+            with instrumentation.timer('deserialize'):
+                return Snapshot.loads(data)
+        except SnapshotVersionError as e:
+            logger.debug('Skipping cached http response in another format: %s' % e)
+        except SnapshotError as e:
+            logger.error('Cannot load rendered http response from cache: %s' % e, exc_info=True)
+        return None
 
-        if not isinstance(resp, HttpResponse):
-            logger.error('Cached http response is not an instance of HttpResponse: %s' % type(resp))
+    def cache_retrieve_meta(self, url: str) -> Optional[SnapshotMeta]:
+        """
+        Retrieve metadata of cached snapshot without loading its body, unless the snapshot is in in-process cache.
+        """
+        key = self.cache_build_key(url)
+        if self.l1_cache is not None:
+            snapshot = self.l1_cache.get(key)
+            if snapshot is not None:
+                return snapshot.meta()
+
+        data = self.cache.get(self.cache_build_meta_key(key))
+        if data is None:
             return None
+        try:
+            return SnapshotMeta.loads(data)
+        except SnapshotVersionError as e:
+            logger.debug('Skipping cached metadata in another format: %s' % e)
+        except SnapshotError as e:
+            logger.error('Cannot load metadata of rendered http response from cache: %s' % e, exc_info=True)
+        return None
 
-        return resp
+    def l1_cache_set(self, key: str, snapshot: Snapshot, timeout: Optional[int] = None):
+        """
+        Keep snapshot in in-process cache, but not longer than it lives in django's cache.
+
+        `timeout` is the timeout of django's cache entry, `None` means it never expires.
+        """
+        if self.l1_cache is not None:
+            expires = time.time() + self.l1_cache_timeout
+            if timeout is not None:
+                expires = min(expires, snapshot.created + timeout)
+            self.l1_cache.set(key, snapshot, snapshot.size, expires)
+
+    def cache_stats(self) -> Dict[str, float]:
+        """
+        Return hit ratios of in-process (L1) and django's (L2) caches and memory used by L1.
+        """
+        c = self.counters.as_dict()
+        l1 = c.get('l1_hits', 0) + c.get('l1_misses', 0)
+        l2 = c.get('l2_hits', 0) + c.get('l2_misses', 0)
+        return {
+            'l1_hit_ratio': c.get('l1_hits', 0) / l1 if l1 else 0.0,
+            'l2_hit_ratio': c.get('l2_hits', 0) / l2 if l2 else 0.0,
+            'l1_entries': len(self.l1_cache) if self.l1_cache is not None else 0,
+            'l1_size': self.l1_cache.size if self.l1_cache is not None else 0,
+        }
 
     def cache_clear(self, url: str):
         """
         Clear cached http response
         """
-        self.cache.delete(self.cache_build_key(url))
+        self.cache_clear_many([url])
+
+    def cache_clear_many(self, urls: Iterable[str]):
+        """
+        Clear cached http responses with a single call.
+        """
+        keys = [self.cache_build_key(url) for url in urls]
+        if not keys:
+            return
+        entries = keys + [self.cache_build_meta_key(key) for key in keys]
+        if self.cache_stale_timeout is not None:
+            entries += [self.cache_build_stale_key(key) for key in keys]
+        self.cache.delete_many(entries)
+        if self.l1_cache is not None:
+            for key in keys:
+                self.l1_cache.delete(key)
 
 
 class PrerenderIOHosted(RequestsDjangoResponseBuilderMixin, BackendBase):
     """
     Render with self-hosted version of prerender.io https://github.com/prerender/prerender
+
+    Renders failed with connection error, timeout or 5xx status are retried with jittered backoff.
+    Once the circuit breaker opens, renders fail right away with `RenderError` until it lets a trial through.
+    Rate limited updates are retried after `Retry-After` seconds, capped by `MAX_RETRY_AFTER`.
+
+    `render_url` may be a list of render endpoints, each of them gets its own session. Renders are spread
+    across them by `balancing` strategy of `EndpointPool`, retries go to other endpoints if there are any,
+    and endpoints failing `eject_failures` times in a row are not used for `eject_timeout` seconds.
     """
 
+    MAX_RETRY_AFTER = 60
+
     def __init__(
         self,
         *,
-        render_url: str = '',
+        render_url: Union[str, Iterable[str]] = '',
         update_url: str = '',
         session: SessionCreator = requests.Session,
+        pool_connections: int = None,
+        pool_maxsize: int = None,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        retries: int = None,
+        retry_backoff: float = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        streaming: bool = None,
+        chunk_size: int = None,
+        balancing: str = None,
+        eject_failures: int = None,
+        eject_timeout: float = None,
         **kwargs
     ):
         super().__init__(**kwargs)
 
-        self.render_url = render_url or settings.PRERENDER_IO_HOSTED_URL
-        if not self.render_url:
+        urls = render_urls(render_url or settings.PRERENDER_IO_HOSTED_URL)
+        if not urls or not all(urls):
             raise ValueError('Render url is missing or empty')
 
         self.update_url = update_url or settings.PRERENDER_IO_HOSTED_UPDATE_URL
         if not self.update_url:
             raise ValueError('Update url is missing or empty')
 
-        self.session = session()
+        pool_connections = pool_connections if pool_connections is not None else settings.RENDER_POOL_CONNECTIONS
+        pool_maxsize = pool_maxsize if pool_maxsize is not None else settings.RENDER_POOL_MAXSIZE
+        endpoints = []
+        for url in urls:
+            endpoint_session = session()
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            endpoint_session.mount('http://', adapter)
+            endpoint_session.mount('https://', adapter)
+            endpoints.append(Endpoint(url, endpoint_session))
+        self.endpoints = EndpointPool(
+            endpoints,
+            strategy=balancing or settings.RENDER_BALANCING,
+            eject_failures=eject_failures if eject_failures is not None else settings.RENDER_EJECT_FAILURES,
+            eject_timeout=eject_timeout if eject_timeout is not None else settings.RENDER_EJECT_TIMEOUT,
+        )
+        self.render_url = endpoints[0].url
+        # Updates are sent with session of the first endpoint
+        self.session = endpoints[0].session
+
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else settings.RENDER_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else settings.RENDER_READ_TIMEOUT,
+        )
+        self.retries = retries if retries is not None else settings.RENDER_RETRIES
+        self.retry_backoff = retry_backoff if retry_backoff is not None else settings.RENDER_RETRY_BACKOFF
+
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else build_circuit_breaker()
+
+        self.streaming = streaming if streaming is not None else settings.STREAMING
+        self.chunk_size = chunk_size if chunk_size is not None else settings.STREAMING_CHUNK_SIZE
 
     def render(self, url: str) -> HttpResponse:
-        r = self.session.get('%s%s' % (self.render_url, url), allow_redirects=False)
-        assert r.status_code < 500
-        return self.requests_response_to_django_response(r)
+        if self.circuit_breaker is None:
+            return self.render_with_retries(url)
+        permit = self.circuit_breaker.allow()
+        if permit is None:
+            raise RenderError('Circuit breaker is open, not rendering %s' % url)
+
+        # Any exception escaping the render counts as a failure, so a half-open trial is always recorded
+        is_ok = False
+        try:
+            response = self.render_with_retries(url)
+            is_ok = True
+            return response
+        finally:
+            self.circuit_breaker.record(permit, is_ok)
+
+    def render_with_retries(self, url: str) -> HttpResponse:
+        """
+        Render url, retrying failed attempts on other endpoints with backoff.
+        """
+        delays = backoff_delays(self.retries, self.retry_backoff)
+        tried = []  # type: List[Endpoint]
+        while True:
+            endpoint = self.endpoints.acquire(url, exclude=tried)
+            is_ok = streamed = False
+            started = time.monotonic()
+            try:
+                with instrumentation.timer('upstream_render'):
+                    r = endpoint.session.get(
+                        '%s%s' % (endpoint.url, url),
+                        allow_redirects=False,
+                        timeout=self.timeout,
+                        stream=self.streaming,
+                    )
+            except requests.RequestException as e:
+                error = repr(e)
+            else:
+                is_ok = r.status_code < 500
+                if is_ok:
+                    if self.streaming:
+                        response = self.requests_response_to_streaming_response(r, self.chunk_size)
+                        # Endpoint is busy sending the page until the response is closed
+                        response.streaming_content = ClosingIterator(
+                            response.streaming_content, self.endpoints.releaser(endpoint, started).close,
+                        )
+                        streamed = True
+                        return response
+                    return self.requests_response_to_django_response(r)
+                error = 'status %d' % r.status_code
+                r.close()
+            finally:
+                if not streamed:
+                    self.endpoints.release(endpoint, is_ok, time.monotonic() - started)
+            tried.append(endpoint)
+
+            delay = next(delays, None)
+            if delay is None:
+                raise RenderError('Render of %s failed: %s' % (url, error))
+            logger.info('Render of %s by %s failed: %s, retrying in %.2fs' % (url, endpoint.url, error, delay))
+            time.sleep(delay)
 
     def update(self, url: str) -> bool:
+        return self.post_update({'url': url})
+
+    def post_update(self, data: dict) -> bool:
         headers = {'Content-Type': 'application/json'}
-        data = {'url': url}
-        return self.session.post(self.update_url, json=data, headers=headers).status_code < 500
+        delays = backoff_delays(self.retries, self.retry_backoff)
+        while True:
+            try:
+                r = self.session.post(self.update_url, json=data, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                logger.warning('Update of %s failed: %r' % (data, e))
+                return False
+            if r.status_code != 429:
+                return r.status_code < 500
+
+            delay = next(delays, None)
+            if delay is None:
+                logger.warning('Update of %s is rate limited' % data)
+                return False
+            time.sleep(max(delay, self.retry_after(r)))
+
+    def retry_after(self, response: requests.Response) -> float:
+        """
+        Return seconds from response's `Retry-After` header, dates are not supported.
+        """
+        try:
+            return min(float(response.headers.get('Retry-After', 0)), self.MAX_RETRY_AFTER)
+        except ValueError:
+            return 0
 
 
 class PrerenderIO(PrerenderIOHosted):
     """
     Render with prerender.io
+
+    `update_many` sends URLs to recache API in batches of up to `UPDATE_BATCH_SIZE`.
     """
 
+    UPDATE_BATCH_SIZE = 1000
+
     PRERENDER_IO_URL = 'https://service.prerender.io/'
     PRERENDER_IO_UPDATE_URL = 'https://api.prerender.io/recache'
     PRERENDER_TOKEN_HEADER_NAME = 'X-Prerender-Token'
@@ -203,9 +1028,17 @@ class PrerenderIO(PrerenderIOHosted):
         self.token = token or settings.PRERENDER_IO_TOKEN
         if not self.token:
             raise ValueError('prerender.io token is missing or empty')
-        self.session.headers[self.PRERENDER_TOKEN_HEADER_NAME] = self.token
+        for endpoint in self.endpoints:
+            endpoint.session.headers[self.PRERENDER_TOKEN_HEADER_NAME] = self.token
 
     def update(self, url: str) -> bool:
-        headers = {'Content-Type': 'application/json'}
-        data = {'prerenderToken': self.token, 'url': url}
-        return self.session.post(self.update_url, json=data, headers=headers).status_code < 500
+        return self.post_update({'prerenderToken': self.token, 'url': url})
+
+    def update_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        urls = list(OrderedDict.fromkeys(urls))
+        batches = [urls[i:i + self.UPDATE_BATCH_SIZE] for i in range(0, len(urls), self.UPDATE_BATCH_SIZE)]
+        results = self.dispatch_updates(self.update_batch, batches)
+        return OrderedDict((url, is_ok) for batch, is_ok in zip(batches, results) for url in batch)
+
+    def update_batch(self, urls: List[str]) -> bool:
+        return self.post_update({'prerenderToken': self.token, 'urls': urls})
@@ -0,0 +1,193 @@
+"""
+Spread renders across several render endpoints.
+"""
+import bisect
+import hashlib
+import random
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+from django_ssr.metrics import Counters, Timings
+
+__all__ = [
+    'Endpoint',
+    'EndpointPool',
+    'EndpointReleaser',
+]
+
+_hash = struct.Struct('>Q')
+
+
+def ring_hash(key: str) -> int:
+    return _hash.unpack_from(hashlib.md5(key.encode()).digest())[0]
+
+
+class Endpoint:
+    """
+    Render endpoint with its own http session, requests in flight, latency and health.
+    """
+
+    def __init__(self, url: str, session: Any = None):
+        self.url = url
+        self.session = session
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.counters = Counters()
+        self.timings = Timings()
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        c = self.counters.as_dict()
+        return {
+            'in_flight': self.in_flight,
+            'requests': c.get('requests', 0),
+            'failures': c.get('failures', 0),
+            'ejections': c.get('ejections', 0),
+            'ejected': not self.is_available(time.monotonic()),
+            'latency': self.timings.as_dict().get('render', {'count': 0, 'total': 0.0, 'max': 0.0}),
+        }
+
+    def __repr__(self):
+        return '<Endpoint %s>' % self.url
+
+
+class EndpointPool:
+    """
+    Pick endpoint for each render by `strategy`:
+
+    - 'least-outstanding' picks endpoint with the fewest requests in flight, ties are broken randomly;
+    - 'consistent-hash' picks endpoint by hash of rendered url, so renderers' own caches are hit
+      and only urls of an ejected endpoint move to other ones.
+
+    Endpoint failing `eject_failures` times in a row is ejected for `eject_timeout` seconds. Once back,
+    a single failure ejects it again until it succeeds. If all endpoints are ejected, they are all used.
+    """
+
+    STRATEGIES = ('least-outstanding', 'consistent-hash')
+    REPLICAS = 100
+
+    def __init__(
+        self,
+        endpoints: Iterable[Endpoint],
+        strategy: str = 'least-outstanding',
+        eject_failures: int = 5,
+        eject_timeout: float = 30
+    ):
+        self.endpoints = list(endpoints)
+        if not self.endpoints:
+            raise ValueError('Render url is missing or empty')
+        if strategy not in self.STRATEGIES:
+            raise ValueError('Unknown balancing strategy "%s"' % strategy)
+        self.strategy = strategy
+        self.eject_failures = eject_failures
+        self.eject_timeout = eject_timeout
+        self.counters = Counters()
+        self._lock = threading.Lock()
+
+        ring = sorted(
+            (ring_hash('%s#%d' % (endpoint.url, i)), n)
+            for n, endpoint in enumerate(self.endpoints) for i in range(self.REPLICAS)
+        )
+        self._ring_hashes = [h for h, _ in ring]
+        self._ring = [self.endpoints[n] for _, n in ring]
+
+    def acquire(self, url: str, exclude: Iterable[Endpoint] = ()) -> Endpoint:
+        """
+        Return endpoint to render url with, counting the request in flight until it is released.
+
+        Endpoints in `exclude`, e.g. already tried ones, are skipped unless there are no others.
+        """
+        with self._lock:
+            now = time.monotonic()
+            available = [e for e in self.endpoints if e.is_available(now)]
+            if not available:
+                self.counters.incr('all_ejected')
+                available = self.endpoints
+            exclude = set(exclude)
+            candidates = [e for e in available if e not in exclude] or available
+
+            if len(candidates) == 1:
+                endpoint = candidates[0]
+            elif self.strategy == 'consistent-hash':
+                endpoint = self._by_hash(url, set(candidates))
+            else:
+                least = min(e.in_flight for e in candidates)
+                endpoint = random.choice([e for e in candidates if e.in_flight == least])
+            endpoint.in_flight += 1
+        endpoint.counters.incr('requests')
+        return endpoint
+
+    def _by_hash(self, url: str, candidates: set) -> Endpoint:
+        start = bisect.bisect(self._ring_hashes, ring_hash(url))
+        for i in range(len(self._ring)):
+            endpoint = self._ring[(start + i) % len(self._ring)]
+            if endpoint in candidates:
+                return endpoint
+        raise AssertionError('Candidates are not in the ring')  # pragma: no cover
+
+    def release(self, endpoint: Endpoint, ok: bool, seconds: float):
+        """
+        Record outcome and latency of request acquired endpoint was used for.
+        """
+        endpoint.timings.add('render', seconds)
+        with self._lock:
+            endpoint.in_flight -= 1
+            if ok:
+                endpoint.failures = 0
+                return
+            endpoint.failures += 1
+            ejected = endpoint.failures >= self.eject_failures and endpoint.is_available(time.monotonic())
+            if ejected:
+                endpoint.ejected_until = time.monotonic() + self.eject_timeout
+        endpoint.counters.incr('failures')
+        if ejected:
+            endpoint.counters.incr('ejections')
+
+    def releaser(self, endpoint: Endpoint, started: float) -> 'EndpointReleaser':
+        """
+        Return object releasing endpoint as succeeded once it is closed, e.g. along with a streamed response.
+        """
+        return EndpointReleaser(self, endpoint, started)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return requests in flight, number of requests, failures and ejections and latency per endpoint url.
+        """
+        return {endpoint.url: endpoint.stats() for endpoint in self.endpoints}
+
+    def __iter__(self):
+        return iter(self.endpoints)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+
+class EndpointReleaser:
+    """
+    Release endpoint acquired at `started` when closed, closing it again does nothing.
+    """
+
+    def __init__(self, pool: EndpointPool, endpoint: Endpoint, started: float):
+        self.pool = pool
+        self.endpoint = endpoint
+        self.started = started
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.pool.release(self.endpoint, True, time.monotonic() - self.started)
+
+
+def render_urls(value: Any) -> List[str]:
+    """
+    Return list of render urls from a single url or a list of them.
+    """
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
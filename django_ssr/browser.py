@@ -0,0 +1,258 @@
+"""
+Render pages with a local headless browser, requires `playwright` to be installed, which needs Python 3.7+.
+
+Browsers are driven by an event loop running in a background thread, so the backend can be used
+by any number of threads of a WSGI server.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from django.http import HttpResponse
+
+from django_ssr import backends, instrumentation, settings
+
+try:
+    from playwright.async_api import async_playwright
+except ImportError:  # pragma: no cover
+    async_playwright = None
+
+__all__ = [
+    'PlaywrightLauncher',
+    'BrowserPool',
+    'HeadlessBrowser',
+]
+
+logger = logging.getLogger(__name__)
+Launcher = Callable[[], Awaitable]
+RenderResult = Tuple[int, Dict[str, str], str]
+
+WAIT_UNTIL = ('commit', 'domcontentloaded', 'load', 'networkidle')
+
+
+class PlaywrightLauncher:
+    """
+    Launch browsers of playwright's `browser_type` with `options` passed to its `launch`.
+    """
+
+    def __init__(self, browser_type: str = 'chromium', **options):
+        if async_playwright is None:
+            raise ImportError('playwright is required by %s' % self.__class__.__name__)
+        self.browser_type = browser_type
+        self.options = options
+        self._playwright = None
+
+    async def __call__(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return await getattr(self._playwright, self.browser_type).launch(**self.options)
+
+    async def stop(self):
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+class _Browser:
+    __slots__ = ('browser', 'renders', 'active', 'retired')
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.renders = 0
+        self.active = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """
+    Run at most `max_pages` pages at a time in a long-lived browser, each page in a new context,
+    so cookies and storage of pages are not shared.
+
+    Browser is replaced by a new one after `max_renders` renders or once it is disconnected, e.g. crashed,
+    the old one is closed once its pages are done.
+    The event loop thread and the browser are started on first render, so pools created before a server
+    forks its workers are safe.
+    """
+
+    def __init__(self, launcher: Launcher, max_pages: int, max_renders: int):
+        self.launcher = launcher
+        self.max_pages = max_pages
+        self.max_renders = max_renders
+        self.launched = 0
+        self._browser = None  # type: Optional[_Browser]
+        self._loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._lock = threading.Lock()
+        self._semaphore = None  # type: Optional[asyncio.Semaphore]
+        self._launch_lock = None  # type: Optional[asyncio.Lock]
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                t = threading.Thread(target=self._run, args=(loop, ready), name='django-ssr-browser', daemon=True)
+                t.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def _run(self, loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        asyncio.set_event_loop(loop)
+        self._semaphore = asyncio.Semaphore(self.max_pages)
+        self._launch_lock = asyncio.Lock()
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    def render(self, url: str, wait_until: str, timeout: float) -> RenderResult:
+        """
+        Return status, headers and html of page once `wait_until` event is fired.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.render_page(url, wait_until, timeout), self.loop)
+        try:
+            # Page may wait for a free slot before its own timeout starts
+            return future.result(timeout * 2)
+        except FutureTimeoutError:
+            future.cancel()
+            raise backends.RenderError('Render of %s timed out' % url) from None
+
+    async def render_page(self, url: str, wait_until: str, timeout: float) -> RenderResult:
+        async with self._semaphore:
+            browser = await self.acquire()
+            try:
+                context = await browser.browser.new_context()
+                try:
+                    page = await context.new_page()
+                    response = await page.goto(url, wait_until=wait_until, timeout=timeout * 1000)
+                    if response is None:
+                        raise backends.RenderError('Render of %s got no response' % url)
+                    return response.status, dict(response.headers), await page.content()
+                finally:
+                    # Pages are closed along with their context
+                    await self._close(context)
+            except Exception:
+                if not browser.browser.is_connected():
+                    self.retire(browser)
+                raise
+            finally:
+                await self.release(browser)
+
+    async def acquire(self) -> _Browser:
+        """
+        Return current browser launching a new one if needed.
+        """
+        async with self._launch_lock:
+            current = self._browser
+            if current is not None and not current.browser.is_connected():
+                self.retire(current)
+                await self.close_retired(current)
+            if self._browser is None:
+                self._browser = _Browser(await self.launcher())
+                self.launched += 1
+        browser = self._browser
+        browser.active += 1
+        browser.renders += 1
+        if browser.renders >= self.max_renders:
+            self.retire(browser)
+        return browser
+
+    def retire(self, browser: _Browser):
+        """
+        Stop giving out browser to new pages, it is closed by `release` once its pages are done.
+        """
+        browser.retired = True
+        if self._browser is browser:
+            self._browser = None
+
+    async def release(self, browser: _Browser):
+        browser.active -= 1
+        await self.close_retired(browser)
+
+    async def close_retired(self, browser: _Browser):
+        if browser.retired and browser.active == 0:
+            await self._close(browser.browser)
+
+    async def _close(self, obj):
+        try:
+            await obj.close()
+        except Exception as e:
+            logger.warning('Cannot close %r: %r' % (obj, e))
+
+    async def stop(self):
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            browser.retired = True
+            await self.close_retired(browser)
+        stop = getattr(self.launcher, 'stop', None)
+        if stop is not None:
+            await stop()
+
+    def close(self):
+        """
+        Close browser and stop the event loop thread.
+        """
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+class HeadlessBrowser(backends.BackendBase):
+    """
+    Render pages with a local headless browser, chromium launched by playwright by default.
+
+    `wait_until` is the navigation event html is taken after: 'commit', 'domcontentloaded', 'load' or 'networkidle'.
+    """
+
+    def __init__(
+        self,
+        *,
+        launcher: Launcher = None,
+        max_pages: int = None,
+        max_renders: int = None,
+        wait_until: str = None,
+        render_timeout: float = None,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.wait_until = wait_until or settings.BROWSER_WAIT_UNTIL
+        if self.wait_until not in WAIT_UNTIL:
+            raise ValueError('Unknown wait until event "%s"' % self.wait_until)
+        self.render_timeout = render_timeout if render_timeout is not None else settings.BROWSER_RENDER_TIMEOUT
+        self.pool = BrowserPool(
+            launcher if launcher is not None else PlaywrightLauncher(**settings.BROWSER_LAUNCH_OPTIONS),
+            max_pages if max_pages is not None else settings.BROWSER_MAX_PAGES,
+            max_renders if max_renders is not None else settings.BROWSER_MAX_RENDERS,
+        )
+
+    def render(self, url: str) -> HttpResponse:
+        try:
+            with instrumentation.timer('upstream_render'):
+                status, headers, html = self.pool.render(url, self.wait_until, self.render_timeout)
+        except backends.RenderError:
+            raise
+        except Exception as e:
+            raise backends.RenderError('Render of %s failed: %r' % (url, e)) from e
+        if status >= 500:
+            raise backends.RenderError('Render of %s failed with status %d' % (url, status))
+
+        content = html.encode()
+        instrumentation.size('rendered', len(content))
+        r = HttpResponse(content, content_type='text/html; charset=utf-8', status=status)
+        for k, v in headers.items():
+            name = k.lower()
+            if name not in settings.REMOVE_HEADERS and name not in ('content-type', 'content-length', 'set-cookie'):
+                r[k] = v
+        r['content-length'] = len(content)
+        return r
+
+    def update(self, url: str) -> bool:
+        # Pages are not stored by the browser, there is nothing to update
+        return True
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,160 @@
+"""
+Canonical form of urls, so variants of the same page share a cache entry and a render.
+
+Pages are rendered by canonical urls too, so a cached page does not depend on which variant was requested first.
+"""
+import fnmatch
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+from django.test.signals import setting_changed
+
+from django_ssr import settings
+
+__all__ = [
+    'UrlCanonicalizer',
+    'CanonicalIndex',
+    'build_url_canonicalizer',
+    'url_canonicalizer',
+]
+
+DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+class UrlCanonicalizer:
+    """
+    Normalize url: lowercase scheme and host, replace host aliases, drop default port and fragment,
+    filter and sort query parameters and optionally add or remove trailing slash.
+    Query parameters which are kept are not re-encoded, so `?flag` and `?flag=` stay distinct.
+
+    `allowed_params` keeps only listed parameters, `None` keeps all. `ignored_params` are dropped,
+    shell-style wildcards like `utm_*` are supported. `trailing_slash` is added if `True`,
+    removed if `False` and left as is if `None`, paths ending with a file name are not changed.
+    Results are memoized in a LRU cache of `cache_size` urls.
+    """
+
+    def __init__(
+        self,
+        *,
+        allowed_params: Optional[Iterable[str]] = None,
+        ignored_params: Iterable[str] = (),
+        sort_params: bool = True,
+        lowercase_host: bool = True,
+        host_aliases: Dict[str, str] = None,
+        trailing_slash: Optional[bool] = None,
+        cache_size: int = 0
+    ):
+        self.allowed_params = frozenset(allowed_params) if allowed_params is not None else None
+        patterns = [fnmatch.translate(p) for p in ignored_params]
+        self.ignored_params = re.compile('|'.join(patterns)) if patterns else None
+        self.sort_params = sort_params
+        self.lowercase_host = lowercase_host
+        self.host_aliases = host_aliases or {}
+        self.trailing_slash = trailing_slash
+        self.canonicalize = lru_cache(maxsize=cache_size)(self.canonicalize_uncached)
+
+    def canonicalize_uncached(self, url: str) -> str:
+        """
+        Return canonical form of url bypassing the cache.
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower() if self.lowercase_host else parts.netloc
+        netloc = self.host_aliases.get(netloc, netloc)
+        port = DEFAULT_PORTS.get(scheme)
+        if port is not None and netloc.endswith(port):
+            netloc = netloc[:-len(port)]
+
+        path = parts.path or '/'
+        if self.trailing_slash is not None and '.' not in path[path.rfind('/'):]:
+            if self.trailing_slash and not path.endswith('/'):
+                path += '/'
+            elif not self.trailing_slash and path != '/':
+                path = path.rstrip('/') or '/'
+
+        query = parts.query
+        if query:
+            params = [p for p in query.split('&') if p and self.is_param_kept(self.param_name(p))]
+            if self.sort_params:
+                params.sort(key=self.param_name)
+            query = '&'.join(params)
+        return urlunsplit((scheme, netloc, path, query, ''))
+
+    @staticmethod
+    def param_name(param: str) -> str:
+        return unquote_plus(param.partition('=')[0])
+
+    def is_param_kept(self, name: str) -> bool:
+        if self.allowed_params is not None and name not in self.allowed_params:
+            return False
+        return self.ignored_params is None or not self.ignored_params.match(name)
+
+    def cache_info(self):
+        return self.canonicalize.cache_info()
+
+
+class CanonicalIndex:
+    """
+    Count distinct raw urls collapsed onto each of `max_size` most recently seen canonical urls.
+
+    At most `max_raw` raw urls are remembered per canonical url.
+    """
+
+    def __init__(self, max_size: int, max_raw: int = 1000):
+        self.max_size = max_size
+        self.max_raw = max_raw
+        self._index = OrderedDict()  # type: OrderedDict[str, Set[str]]
+        self._lock = threading.Lock()
+
+    def record(self, raw: str, canonical: str):
+        with self._lock:
+            seen = self._index.get(canonical)
+            if seen is None:
+                seen = self._index[canonical] = set()
+                if len(self._index) > self.max_size:
+                    self._index.popitem(last=False)
+            else:
+                self._index.move_to_end(canonical)
+            if len(seen) < self.max_raw:
+                seen.add(raw)
+
+    def report(self, min_count: int = 2) -> List[Tuple[str, int]]:
+        """
+        Return canonical urls with number of distinct raw urls, most collapsed first.
+        """
+        with self._lock:
+            counts = [(canonical, len(seen)) for canonical, seen in self._index.items() if len(seen) >= min_count]
+        return sorted(counts, key=itemgetter(1), reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
+
+
+def build_url_canonicalizer() -> UrlCanonicalizer:
+    return UrlCanonicalizer(
+        allowed_params=settings.CANONICAL_ALLOWED_PARAMS,
+        ignored_params=settings.CANONICAL_IGNORED_PARAMS,
+        sort_params=settings.CANONICAL_SORT_PARAMS,
+        lowercase_host=settings.CANONICAL_LOWERCASE_HOST,
+        host_aliases=settings.CANONICAL_HOST_ALIASES,
+        trailing_slash=settings.CANONICAL_TRAILING_SLASH,
+        cache_size=settings.CANONICAL_LRU_SIZE,
+    )
+
+
+url_canonicalizer = build_url_canonicalizer()
+
+
+def reload_canonicalizer(*args, **kwargs):
+    global url_canonicalizer
+    if kwargs['setting'].replace('DJANGO_SSR_', '').startswith('CANONICAL_'):
+        url_canonicalizer = build_url_canonicalizer()
+
+
+setting_changed.connect(reload_canonicalizer)
@@ -0,0 +1,119 @@
+"""
+Content codecs used to store rendered pages compressed.
+
+`gzip` is always available, `br` requires `brotli` and `zstd` requires `zstandard` to be installed.
+"""
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from django.http import HttpResponse
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+__all__ = [
+    'Codec',
+    'CODECS',
+    'get_codec',
+    'accepts_encoding',
+    'decode_response',
+]
+
+
+class Codec:
+    """
+    Compress and decompress data for a single content-coding.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        compress: Callable[[bytes, int], bytes],
+        decompress: Callable[[bytes], bytes],
+        default_level: int
+    ):
+        self.name = name
+        self._compress = compress
+        self._decompress = decompress
+        self.default_level = default_level
+
+    def compress(self, data: bytes, level: int = None) -> bytes:
+        return self._compress(data, level if level is not None else self.default_level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompress(data)
+
+
+def _gzip_compress(data: bytes, level: int) -> bytes:
+    c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress(data) + c.flush()
+
+
+def _gzip_decompress(data: bytes) -> bytes:
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+CODECS = OrderedDict()  # type: Dict[str, Codec]
+CODECS['gzip'] = Codec('gzip', _gzip_compress, _gzip_decompress, 6)
+
+if brotli is not None:  # pragma: no cover
+    CODECS['br'] = Codec('br', lambda data, level: brotli.compress(data, quality=level), brotli.decompress, 5)
+
+if zstandard is not None:  # pragma: no cover
+    CODECS['zstd'] = Codec(
+        'zstd',
+        lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+        3,
+    )
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Return codec by content-coding name.
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError('Compression "%s" is not available' % name) from None
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """
+    Check `Accept-Encoding` header value allows content-coding.
+    """
+    wildcard = None  # type: Optional[bool]
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        accepted = True
+        for param in params.split(';'):
+            k, _, v = param.partition('=')
+            if k.strip().lower() == 'q':
+                try:
+                    accepted = float(v) > 0
+                except ValueError:
+                    accepted = False
+        if coding == encoding or (encoding == 'gzip' and coding == 'x-gzip'):
+            return accepted
+        if coding == '*':
+            wildcard = accepted
+    return bool(wildcard)
+
+
+def decode_response(resp: HttpResponse) -> HttpResponse:
+    """
+    Decompress response content in-place and remove `Content-Encoding`.
+    """
+    resp.content = get_codec(resp['Content-Encoding']).decompress(resp.content)
+    del resp['Content-Encoding']
+    resp['Content-Length'] = len(resp.content)
+    return resp
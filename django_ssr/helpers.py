@@ -1,63 +1,190 @@
-from typing import Iterable, Pattern
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Pattern, Tuple
 from urllib.parse import urlparse
 
+from django.test.signals import setting_changed
+
 from django_ssr import settings
 
 
-def must_render(url: str) -> bool:
+def must_render(url: str, path: str = None) -> bool:
     """
-    Check if url must be rendered.
+    Check if url must be rendered, `path` may be passed if url is already parsed.
     """
-    return all([
-        settings.ENABLED,
-        not is_url_ignored(url),
-        not is_path_ignored(url),
-        not is_extension_ignored(url),
-    ])
+    return settings.ENABLED and not url_classifier.is_ignored(url, path)
 
 
 def is_url_ignored(url: str, ignored_urls: Iterable[Pattern] = None) -> bool:
     """
     Check url is in the list of ignored urls.
     """
-    ignored_urls = ignored_urls if ignored_urls is not None else settings.IGNORE_URLS
-    for r in ignored_urls:
-        if r.match(url):
-            return True
-    return False
+    if ignored_urls is None:
+        return url_classifier.is_url_ignored(url)
+    return UrlClassifier(ignored_urls=ignored_urls).is_url_ignored(url)
 
 
 def is_path_ignored(url: str, ignored_path: Iterable[Pattern] = None) -> bool:
     """
     Check url's path is in the list of ignored paths.
     """
-    ignored_path = ignored_path if ignored_path is not None else settings.IGNORE_PATH
     path = urlparse(url).path
-    for r in ignored_path:
-        if r.match(path):
-            return True
-    return False
+    if ignored_path is None:
+        return url_classifier.is_path_ignored(path)
+    return UrlClassifier(ignored_path=ignored_path).is_path_ignored(path)
 
 
 def is_extension_ignored(url: str, ignored_ext: Iterable = None) -> bool:
     """
     Check url's file extension is in the list of ignored extensions.
     """
-    ignored_ext = ignored_ext if ignored_ext is not None else settings.IGNORE_EXTENSIONS
     path = urlparse(url).path
-    for ext in ignored_ext:
-        if path.endswith(ext):
+    if ignored_ext is None:
+        return url_classifier.is_extension_ignored(path)
+    return UrlClassifier(ignored_ext=ignored_ext).is_extension_ignored(path)
+
+
+def combine_patterns(patterns: Iterable[Pattern]) -> Tuple[Pattern, ...]:
+    """
+    Merge patterns into as few alternation regexes as possible.
+
+    Only patterns compiled with the same flags can share a regex,
+    so one regex is built per distinct set of flags.
+
+    Patterns with capturing groups are kept as they are, since merging would renumber
+    their backreferences or repeat their named groups.
+    """
+    groups = OrderedDict()
+    separate = []
+    for p in patterns:
+        if isinstance(p, str):
+            p = re.compile(p)
+        if p.groups:
+            separate.append(p)
+        else:
+            groups.setdefault(p.flags, []).append(p)
+
+    combined = []
+    for flags, group in groups.items():
+        if len(group) == 1:
+            combined.append(group[0])
+            continue
+        try:
+            combined.append(re.compile('|'.join('(?:%s)' % p.pattern for p in group), flags))
+        except re.error:
+            combined += group
+    return tuple(combined + separate)
+
+
+class UserAgentMatcher:
+    """
+    Match user agents against all patterns in a single pass and memoize results in a bounded LRU cache.
+    """
+
+    def __init__(self, user_agents: Iterable[Pattern], cache_size: int = 0):
+        self.patterns = combine_patterns(user_agents)
+        self.cache_size = cache_size
+        self.match = lru_cache(maxsize=cache_size)(self.match_uncached)
+
+    def match_uncached(self, user_agent: str) -> bool:
+        """
+        Check user agent against combined patterns bypassing the cache.
+        """
+        for r in self.patterns:
+            if r.match(user_agent):
+                return True
+        return False
+
+    def cache_info(self):
+        """
+        Return hits, misses, maxsize and currsize of the result cache.
+        """
+        return self.match.cache_info()
+
+    def cache_clear(self):
+        """
+        Drop all memoized results and reset hit/miss counters.
+        """
+        self.match.cache_clear()
+
+
+class UrlClassifier:
+    """
+    Check all ignore rules for url parsing it only once.
+
+    Url and path patterns are merged with `combine_patterns`. Extensions are looked up by the path's
+    final extension, only extensions which contain more than one dot fall back to `str.endswith`.
+    """
+
+    def __init__(
+        self,
+        *,
+        ignored_urls: Iterable[Pattern] = (),
+        ignored_path: Iterable[Pattern] = (),
+        ignored_ext: Iterable = ()
+    ):
+        self.ignored_urls = combine_patterns(ignored_urls)
+        self.ignored_path = combine_patterns(ignored_path)
+        self.ignored_ext = frozenset(ext for ext in ignored_ext if ext.rfind('.') == 0 and '/' not in ext)
+        self.ignored_suffixes = tuple(ext for ext in ignored_ext if ext not in self.ignored_ext)
+
+    def is_ignored(self, url: str, path: str = None) -> bool:
+        """
+        Check url against all rules, `path` may be passed if url is already parsed.
+        """
+        if self.is_url_ignored(url):
+            return True
+        path = path if path is not None else urlparse(url).path
+        return self.is_extension_ignored(path) or self.is_path_ignored(path)
+
+    def is_url_ignored(self, url: str) -> bool:
+        for r in self.ignored_urls:
+            if r.match(url):
+                return True
+        return False
+
+    def is_path_ignored(self, path: str) -> bool:
+        for r in self.ignored_path:
+            if r.match(path):
+                return True
+        return False
+
+    def is_extension_ignored(self, path: str) -> bool:
+        i = path.rfind('.')
+        if i != -1 and path[i:] in self.ignored_ext:
             return True
-    return False
+        return bool(self.ignored_suffixes) and path.endswith(self.ignored_suffixes)
+
+
+def build_url_classifier() -> UrlClassifier:
+    return UrlClassifier(
+        ignored_urls=settings.IGNORE_URLS,
+        ignored_path=settings.IGNORE_PATH,
+        ignored_ext=settings.IGNORE_EXTENSIONS,
+    )
+
+
+url_classifier = build_url_classifier()
+user_agent_matcher = UserAgentMatcher(settings.USER_AGENTS, settings.USER_AGENT_MATCH_LRU_SIZE)
 
 
-# @lru_cache(settings.USER_AGENT_MATCH_LRU_SIZE)
 def is_user_agent_match(user_agent: str, user_agents: Iterable[Pattern] = None) -> bool:
     """
     Check user agent is the list.
     """
-    user_agents = user_agents if user_agents is not None else settings.USER_AGENTS
-    for r in user_agents:
-        if r.match(user_agent):
-            return True
-    return False
+    if user_agents is None:
+        return user_agent_matcher.match(user_agent)
+    return UserAgentMatcher(user_agents).match_uncached(user_agent)
+
+
+def reload_helpers(*args, **kwargs):
+    global url_classifier, user_agent_matcher
+    name = kwargs['setting'].replace('DJANGO_SSR_', '')
+    if name in ('IGNORE_URLS', 'IGNORE_PATH', 'IGNORE_EXTENSIONS'):
+        url_classifier = build_url_classifier()
+    if name in ('USER_AGENTS', 'USER_AGENT_MATCH_LRU_SIZE'):
+        user_agent_matcher = UserAgentMatcher(settings.USER_AGENTS, settings.USER_AGENT_MATCH_LRU_SIZE)
+
+
+setting_changed.connect(reload_helpers)
@@ -0,0 +1,250 @@
+"""
+Durations of render pipeline stages, cache outcomes and payload sizes.
+
+Data is passed to the instrument configured with `DJANGO_SSR_INSTRUMENTATION`, a dotted path, class or instance
+of `Instrument`. `PrometheusExporter` keeps it in memory and exposes it with `metrics_view`::
+
+    DJANGO_SSR_INSTRUMENTATION = 'django_ssr.instrumentation.PrometheusExporter'
+
+    urlpatterns = [
+        path('metrics/ssr/', instrumentation.metrics_view),
+    ]
+
+Stages are 'ua_match', 'url_classification', 'cache_lookup', 'deserialize', 'cache_store', 'upstream_render'
+and 'response_build'. With `DJANGO_SSR_SERVER_TIMING` stages of a request are also sent in its Server-Timing
+header by synchronous middleware. When neither is enabled, timers are shared no-op objects.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from django.http import Http404, HttpRequest, HttpResponse
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from django_ssr import settings
+
+__all__ = [
+    'Instrument',
+    'PrometheusExporter',
+    'build_instrument',
+    'instrument',
+    'timer',
+    'record',
+    'incr',
+    'size',
+    'collect',
+    'metrics_view',
+]
+
+Timings = List[Tuple[str, float]]
+
+_local = threading.local()
+
+
+class Instrument:
+    """
+    Receiver of instrumentation data, subclasses override methods they need.
+    """
+
+    def timing(self, stage: str, seconds: float):
+        pass
+
+    def incr(self, name: str, value: int = 1):
+        pass
+
+    def size(self, name: str, value: int):
+        pass
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class PrometheusExporter(Instrument):
+    """
+    Keep histograms of stage durations and payload sizes and event counters in memory,
+    render them in Prometheus text format.
+    """
+
+    DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+    def __init__(self, prefix: str = 'django_ssr'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._durations = {}  # type: Dict[str, _Histogram]
+        self._sizes = {}  # type: Dict[str, _Histogram]
+        self._events = {}  # type: Dict[str, int]
+
+    def timing(self, stage: str, seconds: float):
+        self._observe(self._durations, self.DURATION_BUCKETS, stage, seconds)
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._events[name] = self._events.get(name, 0) + value
+
+    def size(self, name: str, value: int):
+        self._observe(self._sizes, self.SIZE_BUCKETS, name, value)
+
+    def _observe(self, histograms: Dict[str, _Histogram], buckets: Tuple[float, ...], name: str, value: float):
+        with self._lock:
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines = []  # type: List[str]
+        with self._lock:
+            self._render_histograms(
+                lines, 'stage_duration_seconds', 'Duration of render pipeline stages.', 'stage', self._durations,
+            )
+            self._render_histograms(
+                lines, 'payload_bytes', 'Size of rendered and cached pages.', 'payload', self._sizes,
+            )
+            name = '%s_events_total' % self.prefix
+            lines += ['# HELP %s Cache outcomes and other events.' % name, '# TYPE %s counter' % name]
+            for event, value in sorted(self._events.items()):
+                lines.append('%s{event="%s"} %d' % (name, event, value))
+        return '\n'.join(lines) + '\n'
+
+    def _render_histograms(self, lines: List[str], name: str, description: str, label: str, histograms: dict):
+        name = '%s_%s' % (self.prefix, name)
+        lines += ['# HELP %s %s' % (name, description), '# TYPE %s histogram' % name]
+        for value, h in sorted(histograms.items()):
+            cumulative = 0
+            for le, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append('%s_bucket{%s="%s",le="%s"} %d' % (name, label, value, le, cumulative))
+            lines.append('%s_bucket{%s="%s",le="+Inf"} %d' % (name, label, value, h.count))
+            lines.append('%s_sum{%s="%s"} %r' % (name, label, value, h.total))
+            lines.append('%s_count{%s="%s"} %d' % (name, label, value, h.count))
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._sizes.clear()
+            self._events.clear()
+
+
+class _Timer:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.started)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def timer(stage: str) -> Union[_Timer, _NullTimer]:
+    """
+    Return context manager recording duration of stage, it does nothing if instrumentation is disabled.
+    """
+    if instrument is None and (not settings.SERVER_TIMING or getattr(_local, 'timings', None) is None):
+        return _null_timer
+    return _Timer(stage)
+
+
+def record(stage: str, seconds: float):
+    if instrument is not None:
+        instrument.timing(stage, seconds)
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def incr(name: str, value: int = 1):
+    if instrument is not None:
+        instrument.incr(name, value)
+
+
+def size(name: str, value: int):
+    if instrument is not None:
+        instrument.size(name, value)
+
+
+@contextmanager
+def collect() -> Iterator[Timings]:
+    """
+    Collect durations of stages run by current thread.
+    """
+    timings = _local.timings = []  # type: Timings
+    try:
+        yield timings
+    finally:
+        _local.timings = None
+
+
+def server_timing(timings: Timings) -> str:
+    """
+    Return Server-Timing header value with durations in milliseconds, repeated stages are summed.
+    """
+    durations = OrderedDict()  # type: Dict[str, float]
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0) + seconds
+    return ', '.join('%s;dur=%.3f' % (stage, seconds * 1000) for stage, seconds in durations.items())
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Expose metrics of `PrometheusExporter` instrument.
+    """
+    if not isinstance(instrument, PrometheusExporter):
+        raise Http404('Prometheus exporter is not configured')
+    return HttpResponse(instrument.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def build_instrument() -> Optional[Instrument]:
+    value = settings.INSTRUMENTATION
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = import_string(value)
+    return value() if isinstance(value, type) else value
+
+
+instrument = build_instrument()
+
+
+def reload_instrument(*args, **kwargs):
+    global instrument
+    if kwargs['setting'].replace('DJANGO_SSR_', '') == 'INSTRUMENTATION':
+        instrument = build_instrument()
+
+
+setting_changed.connect(reload_instrument)
@@ -0,0 +1,226 @@
+"""
+Invalidate rendered pages when models they show change.
+
+Register models or querysets with functions returning urls of pages which show an instance::
+
+    from django_ssr import invalidation
+
+    invalidation.register(Article)  # uses Article.get_absolute_url
+
+    @invalidation.urls_for(Comment.objects.filter(is_public=True))
+    def comment_urls(comment):
+        return [comment.article.get_absolute_url(), '/comments/']
+
+Instances changed are recorded on `post_save` and `post_delete`. Once the transaction is committed their urls
+are collected, deduplicated and sent to backend by a background thread, so writes are not slowed down by the
+render service. Changes of rolled back transactions and savepoints are discarded.
+"""
+import asyncio
+import copy
+import itertools
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
+from urllib.parse import urljoin
+
+from django.db import transaction
+from django.db.models import Model, QuerySet
+from django.db.models.signals import post_delete, post_save
+
+from django_ssr import backends, settings
+from django_ssr.metrics import Counters
+from django_ssr.workers import BackgroundPool
+
+__all__ = [
+    'InvalidationRegistry',
+    'registry',
+    'register',
+    'unregister',
+    'urls_for',
+]
+
+logger = logging.getLogger(__name__)
+UrlGenerator = Callable[[Model], Union[str, Iterable[str], None]]
+ChangeKey = Tuple[Type[Model], Any, bool]
+
+
+def absolute_url(instance: Model) -> Optional[str]:
+    return instance.get_absolute_url()
+
+
+class _Batch:
+    """
+    Instances changed in a transaction or savepoint, it is released along with its commit hook on rollback.
+    """
+    __slots__ = ('changes', 'flushed', '__weakref__')
+
+    def __init__(self):
+        self.changes = OrderedDict()  # type: Dict[ChangeKey, Model]
+        self.flushed = False
+
+
+class InvalidationRegistry:
+    """
+    Map models to url generators and invalidate generated urls on changes of their instances.
+
+    Instances saved which do not match registered queryset are skipped, instances deleted are always invalidated.
+    With `recache` urls are updated by backend, otherwise only cached pages of caching backends are cleared.
+    """
+
+    def __init__(
+        self,
+        *,
+        backend: backends.Backend = None,
+        recache: bool = None,
+        base_url: str = None,
+        queue_size: int = None
+    ):
+        self._backend = backend
+        self.recache = recache if recache is not None else settings.INVALIDATION_RECACHE
+        self.base_url = base_url if base_url is not None else settings.INVALIDATION_BASE_URL
+        self.pool = BackgroundPool(1, queue_size if queue_size is not None else settings.INVALIDATION_QUEUE_SIZE)
+        self.counters = Counters()
+        self._generators = OrderedDict()  # type: Dict[Type[Model], List[Tuple[Optional[QuerySet], UrlGenerator]]]
+        self._local = threading.local()
+        self._batch_ids = itertools.count()
+
+    @property
+    def backend(self) -> backends.BackendBase:
+        if not isinstance(self._backend, backends.BackendBase):
+            backend = backends.get_backend(self._backend)
+            if asyncio.iscoroutinefunction(backend.update_many):
+                raise ValueError('Asynchronous backends cannot be used for invalidation')
+            self._backend = backend
+        return self._backend
+
+    def register(self, model: Union[Type[Model], QuerySet], urls: UrlGenerator = None):
+        """
+        Register url generator for model or queryset, `get_absolute_url` is used by default.
+        """
+        queryset = model if isinstance(model, QuerySet) else None
+        model = queryset.model if queryset is not None else model
+        if model not in self._generators:
+            self._generators[model] = []
+            post_save.connect(self.handle_save, sender=model, dispatch_uid=self.dispatch_uid(model))
+            post_delete.connect(self.handle_delete, sender=model, dispatch_uid=self.dispatch_uid(model))
+        self._generators[model].append((queryset, urls or absolute_url))
+
+    def urls_for(self, model: Union[Type[Model], QuerySet]) -> Callable[[UrlGenerator], UrlGenerator]:
+        """
+        Decorator registering url generator for model or queryset.
+        """
+        def decorator(urls: UrlGenerator) -> UrlGenerator:
+            self.register(model, urls)
+            return urls
+        return decorator
+
+    def unregister(self, model: Type[Model]):
+        """
+        Remove all url generators of model.
+        """
+        if self._generators.pop(model, None) is not None:
+            post_save.disconnect(sender=model, dispatch_uid=self.dispatch_uid(model))
+            post_delete.disconnect(sender=model, dispatch_uid=self.dispatch_uid(model))
+
+    def dispatch_uid(self, model: Type[Model]) -> str:
+        return 'django-ssr-invalidation-%d-%s' % (id(self), model._meta.label)
+
+    def collect(self, instance: Model, deleted: bool = False) -> List[str]:
+        """
+        Return absolute urls of pages showing instance, querysets are checked against committed data.
+        """
+        urls = []  # type: List[str]
+        for queryset, generator in self._generators.get(type(instance), ()):
+            if not deleted and queryset is not None and not queryset.filter(pk=instance.pk).exists():
+                continue
+            generated = generator(instance)
+            if generated is None:
+                continue
+            for url in [generated] if isinstance(generated, str) else generated:
+                urls.append(urljoin(self.base_url, url) if self.base_url else url)
+        return urls
+
+    def handle_save(self, sender, instance: Model, using: str = None, raw: bool = False, **kwargs):
+        if not raw:
+            self.schedule(instance, using=using)
+
+    def handle_delete(self, sender, instance: Model, using: str = None, **kwargs):
+        self.schedule(instance, deleted=True, using=using)
+
+    def schedule(self, instance: Model, deleted: bool = False, using: str = None):
+        """
+        Invalidate urls of instance in background once current transaction is committed.
+
+        Changes are batched per transaction and savepoint. Commit hooks of rolled back ones are dropped by django
+        along with their batches, which are only referenced weakly here.
+        """
+        if type(instance) not in self._generators:
+            return
+        if deleted:
+            # Django clears primary key of deleted instance before commit hooks are run
+            instance = copy.copy(instance)
+
+        key = (using, tuple(transaction.get_connection(using).savepoint_ids))
+        batches = getattr(self._local, 'batches', None)  # type: Dict[Tuple, weakref.ref]
+        if batches is None:
+            batches = self._local.batches = {}
+        batch = batches[key]() if key in batches else None
+        is_new = batch is None or batch.flushed
+        if is_new:
+            for k in [k for k, ref in batches.items() if ref() is None]:
+                del batches[k]
+            batch = _Batch()
+            batches[key] = weakref.ref(batch)
+        batch.changes[(type(instance), instance.pk, deleted)] = instance
+        if is_new:
+            transaction.on_commit(lambda: self.flush(batch), using=using)
+
+    def flush(self, batch: _Batch):
+        """
+        Collect urls of instances changed in committed batch and submit them to background thread.
+        """
+        batch.flushed = True
+        collected = OrderedDict()  # type: Dict[str, None]
+        for (_, _, deleted), instance in batch.changes.items():
+            try:
+                collected.update((url, None) for url in self.collect(instance, deleted))
+            except Exception as e:
+                self.counters.incr('failed')
+                logger.error('Collecting urls of %r failed: %s' % (instance, e), exc_info=True)
+        if not collected:
+            return
+        urls = list(collected)
+        if self.pool.submit(next(self._batch_ids), self.invalidate, urls):
+            self.counters.incr('scheduled', len(urls))
+        else:
+            self.counters.incr('dropped', len(urls))
+            logger.warning('Invalidation queue is full, %d urls are not invalidated' % len(urls))
+
+    def invalidate(self, urls: List[str]):
+        """
+        Update or clear cached pages of urls right away.
+        """
+        backend = self.backend
+        if self.recache:
+            results = backend.update_many(urls)
+            failed = [url for url, is_ok in results.items() if not is_ok]
+            if failed:
+                self.counters.incr('failed', len(failed))
+                logger.warning('Invalidation of %d urls failed: %s' % (len(failed), ', '.join(failed[:10])))
+        elif isinstance(backend, backends.CachingBackendMixin):
+            backend.cache_clear_many(urls)
+        self.counters.incr('invalidated', len(urls))
+
+    def join(self):
+        """
+        Block until all scheduled invalidations are done.
+        """
+        self.pool.join()
+
+
+registry = InvalidationRegistry()
+register = registry.register
+unregister = registry.unregister
+urls_for = registry.urls_for
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+__all__ = [
+    'MemoryLRU',
+]
+
+
+class MemoryLRU:
+    """
+    Thread-safe in-process LRU cache bounded by the total size of its values.
+
+    Every entry has its own expiry time, expired entries are dropped when they are read or evicted.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires = entry
+            if expires <= time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, size: int, expires: float):
+        """
+        Store value of given size until `expires` unix timestamp, values larger than the cache are skipped.
+        """
+        with self._lock:
+            self._pop(key)
+            if size > self.max_size:
+                return
+            self._entries[key] = (value, size, expires)
+            self.size += size
+            while self.size > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _pop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
@@ -0,0 +1,209 @@
+import asyncio
+import gzip
+import sys
+import time
+from concurrent import futures
+from typing import Dict, Iterator, List, Set
+from xml.etree import ElementTree
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+
+from django_ssr import backends, settings, workers
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class Command(BaseCommand):
+    help = (
+        'Render urls from sitemaps or text files with one url per line and store them in cache. '
+        'Reads stdin if no file is given.'
+    )
+    stealth_options = ('stdin',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*', default=['-'], help='Sitemap or text file, "-" for stdin.')
+        parser.add_argument('--backend', help='Dotted path to backend, defaults to DJANGO_SSR_BACKEND.')
+        parser.add_argument('--workers', type=int, default=8, help='Number of concurrent renders.')
+        parser.add_argument('--rate', type=float, default=0, help='Max renders per second, unlimited by default.')
+        parser.add_argument('--checkpoint', help='File to record warmed urls in, they are skipped on next run.')
+        parser.add_argument('--skip-fresh', action='store_true', help='Skip urls cached and not stale yet.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of pages stored in cache at once.')
+        parser.add_argument('--progress-interval', type=float, default=10, help='Seconds between progress reports.')
+        parser.add_argument(
+            '--sitemap-timeout',
+            type=float,
+            help='Seconds to wait for sitemaps listed in sitemap index, '
+                 'defaults to DJANGO_SSR_RENDER_CONNECT_TIMEOUT and DJANGO_SSR_RENDER_READ_TIMEOUT.',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+
+        self.backend = backends.get_backend(options['backend'])
+        if asyncio.iscoroutinefunction(self.backend.render):
+            raise CommandError('Asynchronous backends are not supported, pass a synchronous one with --backend')
+        self.caching = isinstance(self.backend, backends.CachingBackendMixin)
+        self.limiter = workers.RateLimiter(options['rate']) if options['rate'] > 0 else None
+        self.sitemap_timeout = options.get('sitemap_timeout') or (
+            settings.RENDER_CONNECT_TIMEOUT, settings.RENDER_READ_TIMEOUT,
+        )
+
+        urls = []  # type: List[str]
+        seen = set()  # type: Set[str]
+        for source in options['sources']:
+            for url in self.read_source(source, options.get('stdin') or sys.stdin):
+                url = self.backend.canonicalizer.canonicalize(url)
+                if url not in seen:
+                    seen.add(url)
+                    urls.append(url)
+
+        done = self.read_checkpoint(options['checkpoint']) if options['checkpoint'] else set()
+        self.checkpoint = open(options['checkpoint'], 'a') if options['checkpoint'] else None
+        try:
+            self.warm(urls, done, options)
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+
+    def warm(self, urls: List[str], done: Set[str], options: dict):
+        self.total = len(urls)
+        self.rendered = self.failed = self.skipped = 0
+        self.started = last_report = time.monotonic()
+        batch = {}  # type: Dict[str, HttpResponse]
+        skipped = []  # type: List[str]
+        max_pending = options['workers'] * 2
+
+        with futures.ThreadPoolExecutor(options['workers']) as executor:
+            pending = {}  # type: Dict[futures.Future, str]
+            queue = iter(urls)
+            while True:
+                for url in queue:
+                    if url in done or (options['skip_fresh'] and self.is_fresh(url)):
+                        self.skipped += 1
+                        if url not in done:
+                            skipped.append(url)
+                        continue
+                    pending[executor.submit(self.render, url)] = url
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+
+                finished, _ = futures.wait(
+                    pending,
+                    timeout=options['progress_interval'],
+                    return_when=futures.FIRST_COMPLETED,
+                )
+                for future in finished:
+                    url = pending.pop(future)
+                    try:
+                        resp = future.result()
+                    except Exception as e:
+                        self.failed += 1
+                        self.stderr.write('Render of %s failed: %s' % (url, e))
+                        continue
+                    self.rendered += 1
+                    batch[url] = resp
+                if len(batch) >= options['batch_size']:
+                    self.flush(batch)
+                    batch = {}
+                if skipped:
+                    self.record(skipped)
+                    skipped = []
+
+                if time.monotonic() - last_report >= options['progress_interval']:
+                    last_report = time.monotonic()
+                    self.report()
+
+        self.flush(batch)
+        self.record(skipped)
+        self.report()
+
+    def render(self, url: str) -> HttpResponse:
+        if self.limiter is not None:
+            self.limiter.acquire()
+        if self.caching:
+            return self.backend.render_checked(url)
+        resp = self.backend.render(url)
+        if resp.status_code >= 500:
+            resp.close()
+            raise backends.RenderError('Render of %s failed with status %d' % (url, resp.status_code))
+        return resp
+
+    def flush(self, batch: Dict[str, HttpResponse]):
+        if self.caching and batch:
+            self.backend.cache_set_many(batch)
+        self.record(batch)
+
+    def is_fresh(self, url: str) -> bool:
+        if not self.caching:
+            return False
+        snapshot = self.backend.cache_retrieve_snapshot(url)
+        return snapshot is not None and not self.backend.cache_is_stale(snapshot, self.backend.cache_policy(url))
+
+    def record(self, urls):
+        if self.checkpoint is not None and urls:
+            self.checkpoint.write(''.join('%s\n' % url for url in urls))
+            self.checkpoint.flush()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        processed = self.rendered + self.failed
+        self.stdout.write('%d/%d urls, %.1f urls/s, %d rendered, %d failed, %d skipped' % (
+            processed + self.skipped,
+            self.total,
+            processed / elapsed if elapsed else 0,
+            self.rendered,
+            self.failed,
+            self.skipped,
+        ))
+
+    def read_checkpoint(self, path: str) -> Set[str]:
+        try:
+            with open(path) as f:
+                return set(line.strip() for line in f if line.strip())
+        except FileNotFoundError:
+            return set()
+
+    def read_source(self, source: str, stdin) -> Iterator[str]:
+        if source == '-':
+            data = stdin.buffer.read() if hasattr(stdin, 'buffer') else stdin.read().encode()
+        else:
+            try:
+                with open(source, 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                raise CommandError('Cannot read %s: %s' % (source, e)) from e
+        return self.parse(data)
+
+    def parse(self, data: bytes) -> Iterator[str]:
+        """
+        Yield urls from sitemap, sitemap index or text with one url per line.
+        """
+        if data.startswith(GZIP_MAGIC):
+            data = gzip.decompress(data)
+        if not data.lstrip().startswith(b'<'):
+            for line in data.decode().splitlines():
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+            return
+
+        try:
+            root = ElementTree.fromstring(data)
+        except ElementTree.ParseError as e:
+            raise CommandError('Invalid sitemap: %s' % e) from e
+        locs = [el.text.strip() for el in root.iter() if el.tag.rpartition('}')[2] == 'loc' and el.text]
+        if root.tag.rpartition('}')[2] != 'sitemapindex':
+            yield from locs
+            return
+        for loc in locs:
+            try:
+                r = requests.get(loc, timeout=self.sitemap_timeout)
+                r.raise_for_status()
+            except requests.RequestException as e:
+                raise CommandError('Cannot fetch sitemap %s: %s' % (loc, e)) from e
+            yield from self.parse(r.content)
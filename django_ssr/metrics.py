@@ -0,0 +1,64 @@
+import threading
+from collections import Counter
+from typing import Dict, List
+
+__all__ = [
+    'Counters',
+    'Timings',
+]
+
+
+class Counters:
+    """
+    Thread-safe named counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = Counter()
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._values[name] += value
+
+    def get(self, name: str) -> int:
+        return self._values[name]
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Timings:
+    """
+    Thread-safe count, total and maximum of durations per name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}  # type: Dict[str, List[float]]
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            value = self._values.get(name)
+            if value is None:
+                self._values[name] = [1, seconds, seconds]
+            else:
+                value[0] += 1
+                value[1] += seconds
+                value[2] = max(value[2], seconds)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {'count': count, 'total': total, 'max': maximum}
+                for name, (count, total, maximum) in self._values.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
@@ -1,36 +1,208 @@
-from typing import Callable, Union
+import logging
+from functools import wraps
+from typing import Callable, Optional, Union
+from urllib.parse import urlparse
 
 from django.http import HttpResponse, HttpRequest
-from django.utils.decorators import decorator_from_middleware_with_args
-from django.utils.module_loading import import_string
+from django.utils.functional import cached_property
 
-from django_ssr import backends, helpers, settings
+from django_ssr import admission, backends, compression, helpers, instrumentation, routing, settings
+from django_ssr.snapshot import ClosingIterator
 
-Backend = Union[str, Callable[..., backends.BackendBase]]
+Backend = backends.Backend
 GetResponse = Callable[[HttpRequest], HttpResponse]
 
+logger = logging.getLogger(__name__)
+
+
+class RenderDecision:
+    """
+    Per-request state shared by render checks and the backend call.
+
+    Every property is computed lazily and at most once, so cheap checks can reject a request
+    before the absolute url is built.
+    """
+
+    def __init__(self, request: HttpRequest, backend: backends.BackendBase):
+        self.request = request
+        self.backend = backend
+        # Set by render checks if request is routed by its view
+        self.route = None  # type: Optional[routing.Route]
+
+    @cached_property
+    def user_agent(self) -> str:
+        return self.request.META.get('HTTP_USER_AGENT', '')
+
+    @cached_property
+    def url(self) -> str:
+        return self.backend.build_absolute_url(self.request)
+
+    @cached_property
+    def path(self) -> str:
+        return urlparse(self.url).path
+
+    @cached_property
+    def host(self) -> str:
+        return urlparse(self.url).netloc
+
 
 class BaseMiddleware:
     """
     Base class for SSR's middleware
+
+    Renders are admitted by `admission_controller`, `DJANGO_SSR_ADMISSION_*` settings are used by default.
+    Cached pages of caching backends are served without admission.
+
+    With `DJANGO_SSR_SERVER_TIMING` durations of render stages are sent in Server-Timing header.
+
+    Requests are routed by their views with `view_router`, `DJANGO_SSR_RENDER_VIEWS` are used by default.
+    Pages of views routed as not cacheable are rendered bypassing the cache.
     """
 
     def __init__(
         self,
         get_response: GetResponse,
-        backend: Backend = None
+        backend: Backend = None,
+        admission_controller: admission.AdmissionController = None,
+        view_router: routing.ViewRouter = None
     ):
         self.get_response = get_response
 
-        backend = backend if backend is not None else settings.BACKEND
-        if isinstance(backend, str):
-            backend = import_string(backend)
-        self.backend = backend()
+        self.backend = backends.get_backend(backend)
+        self._admission_controller = admission_controller
+        self._view_router = view_router
+
+    @property
+    def admission_controller(self) -> Optional[admission.AdmissionController]:
+        if self._admission_controller is not None:
+            return self._admission_controller
+        return admission.admission_controller
+
+    @property
+    def view_router(self) -> Optional[routing.ViewRouter]:
+        if self._view_router is not None:
+            return self._view_router
+        return routing.view_router
+
+    def __call__(self, request: HttpRequest, get_response: GetResponse = None) -> HttpResponse:
+        """
+        Render request or pass it to `get_response`, the middleware's one by default.
+        """
+        get_response = get_response if get_response is not None else self.get_response
+        if settings.SERVER_TIMING:
+            with instrumentation.collect() as timings:
+                response = self.handle(request, get_response)
+            if timings:
+                response['Server-Timing'] = instrumentation.server_timing(timings)
+            return response
+        return self.handle(request, get_response)
 
-    def __call__(self, request: HttpRequest) -> HttpResponse:
+    def handle(self, request: HttpRequest, get_response: GetResponse) -> HttpResponse:
         if self.must_render(request):
-            return self.backend.render(self.backend.build_absolute_url(request))
-        return self.get_response(request)
+            url = self.get_render_decision(request).url
+            not_modified = self.get_not_modified_response(request, url)
+            if not_modified is not None:
+                return not_modified
+            try:
+                response = self.render(request, url)
+            except backends.RenderError as e:
+                logger.warning('Falling back to django view: %s' % e)
+            else:
+                return self.process_rendered_response(request, response)
+        return get_response(request)
+
+    def render(self, request: HttpRequest, url: str) -> HttpResponse:
+        """
+        Render page once it is admitted, handle it by overflow policy if it is not.
+        """
+        route = self.get_render_decision(request).route
+        cacheable = route is None or route.cacheable
+        render = self.backend.render if cacheable else getattr(self.backend, 'render_uncached', self.backend.render)
+
+        controller = self.admission_controller
+        if controller is None:
+            return self.check_rendered_response(url, render(url))
+
+        render_cached = getattr(self.backend, 'render_cached', None)
+        if cacheable and render_cached is not None:
+            policy = self.backend.cache_policy(url)
+            response = render_cached(url, policy)
+            if response is not None:
+                return response
+            if policy.cacheable:
+                # Cache was just checked, admitted render must not look it up again
+                render = self.backend.render_miss
+
+        host = self.get_render_decision(request).host
+        rejected = controller.acquire(host)
+        if rejected is not None:
+            return self.render_overflow(url, controller, rejected)
+        streamed = False
+        try:
+            response = self.check_rendered_response(url, render(url))
+            if response.streaming:
+                # Render is in flight until the page is sent
+                response.streaming_content = ClosingIterator(
+                    response.streaming_content, lambda: controller.release(host),
+                )
+                streamed = True
+            return response
+        finally:
+            if not streamed:
+                controller.release(host)
+
+    def render_overflow(self, url: str, controller: admission.AdmissionController, reason: str) -> HttpResponse:
+        """
+        Return response to request whose render is not admitted, raise `RenderError` to serve django's view.
+        """
+        controller.counters.incr('overflow_%s' % controller.overflow)
+        if controller.overflow == 'unavailable':
+            response = HttpResponse(status=503)
+            response['Retry-After'] = str(controller.retry_after)
+            return response
+        if controller.overflow == 'stale':
+            render_stale = getattr(self.backend, 'render_stale', None)
+            response = render_stale(url) if render_stale is not None else None
+            if response is not None:
+                return response
+        raise backends.RenderError('Render of %s is not admitted: %s' % (url, reason))
+
+    def get_not_modified_response(self, request: HttpRequest, url: str) -> Optional[HttpResponse]:
+        """
+        Return 304 response if backend caches pages and its cached page matches conditional request.
+        """
+        render_not_modified = getattr(self.backend, 'render_not_modified', None)
+        return render_not_modified(request, url) if render_not_modified is not None else None
+
+    def check_rendered_response(self, url: str, response: HttpResponse) -> HttpResponse:
+        """
+        Raise `RenderError` if page rendered by backend is a server error, so django's view is served instead.
+        """
+        if response.status_code >= 500:
+            response.close()
+            raise backends.RenderError('Render of %s failed with status %d' % (url, response.status_code))
+        return response
+
+    def process_rendered_response(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        """
+        Adjust rendered response for request.
+
+        Responses compressed in cache are decompressed for clients which do not accept their encoding.
+        """
+        encoding = response.get('Content-Encoding')
+        if encoding in compression.CODECS:
+            if not compression.accepts_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), encoding):
+                compression.decode_response(response)
+        return response
+
+    def get_render_decision(self, request: HttpRequest) -> RenderDecision:
+        """
+        Return request's render decision, it is created once and stored as `request.ssr_decision`.
+        """
+        decision = getattr(request, 'ssr_decision', None)
+        if decision is None or decision.backend is not self.backend:
+            decision = request.ssr_decision = RenderDecision(request, self.backend)
+        return decision
 
     def must_render(self, request: HttpRequest) -> bool:
         """
@@ -42,12 +214,40 @@ class BaseMiddleware:
 class UserAgentMiddleware(BaseMiddleware):
     """
     Render page if request's User-Agent matches `settings.DJANGO_SSR_USER_AGENTS`
+
+    Pages are rendered if they are not ignored by `DJANGO_SSR_IGNORE_*` rules, or if their views are routed
+    to be rendered when `view_router` is set.
     """
 
     def must_render(self, request: HttpRequest) -> bool:
-        ua = request.META.get('HTTP_USER_AGENT', '')
-        url = self.backend.build_absolute_url(request)
-        return helpers.is_user_agent_match(ua) and helpers.must_render(url)
+        decision = self.get_render_decision(request)
+        with instrumentation.timer('ua_match'):
+            is_match = helpers.is_user_agent_match(decision.user_agent)
+        if not is_match:
+            return False
+        router = self.view_router
+        with instrumentation.timer('url_classification'):
+            if router is None:
+                return helpers.must_render(decision.url, decision.path)
+            if not settings.ENABLED:
+                return False
+            decision.route = router.route_request(request)
+            return decision.route.rendered
+
+
+def user_agent_ssr(*, cacheable: bool = True, **kwargs) -> Callable:
+    """
+    Render view's pages for crawlers with `UserAgentMiddleware`, keyword arguments are passed to the middleware.
+
+    The view is marked with `routing.ssr_eligible`, so it is rendered while views are routed as well.
+    """
+    def decorator(view: Callable) -> Callable:
+        mw = UserAgentMiddleware(view, **kwargs)
+
+        @wraps(view)
+        def wrapped_view(request: HttpRequest, *args, **view_kwargs) -> HttpResponse:
+            return mw(request, lambda r: view(r, *args, **view_kwargs))
 
+        return routing.ssr_eligible(wrapped_view, cacheable=cacheable)
 
-user_agent_ssr = decorator_from_middleware_with_args(UserAgentMiddleware)
+    return decorator
@@ -0,0 +1,167 @@
+"""
+Transform rendered html before it is stored, so the cost is paid once per render and not on every hit.
+
+Stages are callables taking html and url of the page and returning new html. They are configured with
+`DJANGO_SSR_POSTPROCESS` as dotted paths, callables or `(dotted path, kwargs)` pairs of stage factories::
+
+    DJANGO_SSR_POSTPROCESS = [
+        'django_ssr.postprocess.strip_scripts',
+        'django_ssr.postprocess.strip_comments',
+        'django_ssr.postprocess.collapse_whitespace',
+        ('django_ssr.postprocess.InjectHead', {'meta': {'robots': 'index, follow'}}),
+    ]
+
+Stages run on the whole document, rendered pages are stored complete anyway.
+"""
+import html as html_lib
+import logging
+import re
+import time
+from typing import Callable, Dict, Iterable, Optional, Union
+
+from django.utils.module_loading import import_string
+
+from django_ssr.metrics import Counters, Timings
+
+__all__ = [
+    'Pipeline',
+    'build_pipeline',
+    'strip_scripts',
+    'strip_comments',
+    'collapse_whitespace',
+    'InjectHead',
+]
+
+logger = logging.getLogger(__name__)
+Stage = Callable[[str, str], str]
+
+_script = re.compile(r'<script\b([^>]*)>.*?</script\s*>', re.I | re.S)
+_json_ld = re.compile(r'\btype\s*=\s*["\']?application/ld\+json', re.I)
+_comment = re.compile(r'<!--(?!\[if|<!|>).*?-->', re.S)
+_preserved = re.compile(r'<(pre|textarea|script|style)\b.*?</\1\s*>', re.I | re.S)
+_whitespace = re.compile(r'\s{2,}')
+_head_end = re.compile(r'</head\s*>', re.I)
+_canonical = re.compile(r'<link\b[^>]*\brel\s*=\s*["\']?canonical\b', re.I)
+
+
+def strip_scripts(html: str, url: str) -> str:
+    """
+    Remove scripts and inline json state, json-ld structured data is kept.
+    """
+    return _script.sub(lambda m: m.group(0) if _json_ld.search(m.group(1)) else '', html)
+
+
+def strip_comments(html: str, url: str) -> str:
+    """
+    Remove comments except conditional ones.
+    """
+    return _comment.sub('', html)
+
+
+def collapse_whitespace(html: str, url: str) -> str:
+    """
+    Replace runs of whitespace with a single space outside of pre, textarea, script and style elements.
+    """
+    parts, pos = [], 0
+    for m in _preserved.finditer(html):
+        parts += [_whitespace.sub(' ', html[pos:m.start()]), m.group(0)]
+        pos = m.end()
+    parts.append(_whitespace.sub(' ', html[pos:]))
+    return ''.join(parts)
+
+
+class InjectHead:
+    """
+    Add canonical link of page and meta tags to head unless the page already has them.
+    """
+
+    name = 'inject_head'
+
+    def __init__(self, canonical: bool = True, meta: Dict[str, str] = None):
+        self.canonical = canonical
+        self.meta = [
+            (
+                re.compile(r'<meta\b[^>]*\bname\s*=\s*["\']?%s\b' % re.escape(name), re.I),
+                '<meta name="%s" content="%s">' % (html_lib.escape(name), html_lib.escape(content)),
+            )
+            for name, content in (meta or {}).items()
+        ]
+
+    def __call__(self, html: str, url: str) -> str:
+        m = _head_end.search(html)
+        if m is None:
+            return html
+        head = html[:m.start()]
+        tags = [tag for pattern, tag in self.meta if not pattern.search(head)]
+        if self.canonical and not _canonical.search(head):
+            tags.append('<link rel="canonical" href="%s">' % html_lib.escape(url))
+        if not tags:
+            return html
+        return ''.join([head, ''.join(tags), html[m.start():]])
+
+
+class Pipeline:
+    """
+    Run html through stages, timing each of them and counting bytes before and after.
+
+    Pages which cannot be decoded are left as is, so is the page if a stage fails.
+    """
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages = [(getattr(s, 'name', None) or getattr(s, '__name__', repr(s)), s) for s in stages]
+        self.timings = Timings()
+        self.counters = Counters()
+
+    def process(self, body: bytes, url: str, charset: str = 'utf-8') -> bytes:
+        try:
+            html = body.decode(charset)
+        except (UnicodeDecodeError, LookupError):
+            self.counters.incr('skipped')
+            return body
+
+        for name, stage in self.stages:
+            started = time.perf_counter()
+            try:
+                html = stage(html, url)
+            except Exception as e:
+                logger.error('Post-processing stage %s failed for %s: %s' % (name, url, e), exc_info=True)
+                self.counters.incr('failed')
+                return body
+            self.timings.add(name, time.perf_counter() - started)
+
+        processed = html.encode(charset)
+        self.counters.incr('pages')
+        self.counters.incr('bytes_in', len(body))
+        self.counters.incr('bytes_out', len(processed))
+        return processed
+
+    def stats(self) -> dict:
+        """
+        Return number of pages processed, bytes before and after, share of bytes removed and timings of stages.
+        """
+        c = self.counters.as_dict()
+        bytes_in, bytes_out = c.get('bytes_in', 0), c.get('bytes_out', 0)
+        return {
+            'pages': c.get('pages', 0),
+            'skipped': c.get('skipped', 0),
+            'failed': c.get('failed', 0),
+            'bytes_in': bytes_in,
+            'bytes_out': bytes_out,
+            'reduction': 1 - bytes_out / bytes_in if bytes_in else 0.0,
+            'stages': self.timings.as_dict(),
+        }
+
+
+def build_pipeline(config: Iterable[Union[str, Stage, tuple]]) -> Optional[Pipeline]:
+    """
+    Build pipeline from stages configuration, return `None` if there are no stages.
+    """
+    stages = []
+    for item in config:
+        if isinstance(item, (tuple, list)):
+            factory, kwargs = item
+            item = (import_string(factory) if isinstance(factory, str) else factory)(**kwargs)
+        elif isinstance(item, str):
+            item = import_string(item)
+        stages.append(item() if isinstance(item, type) else item)
+    return Pipeline(stages) if stages else None
@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from typing import Iterator, NamedTuple, Optional
+
+from django_ssr import settings
+
+__all__ = [
+    'CircuitBreaker',
+    'Permit',
+    'backoff_delays',
+    'build_circuit_breaker',
+]
+
+Permit = NamedTuple('Permit', [('generation', int), ('trial', bool)])
+
+
+def backoff_delays(retries: int, backoff: float) -> Iterator[float]:
+    """
+    Yield `retries` delays of exponential backoff with full jitter.
+    """
+    for attempt in range(retries):
+        yield random.uniform(0, backoff * 2 ** attempt)
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing service once its error rate crosses `threshold`.
+
+    Error rate is computed over fixed windows of `window` seconds and only once the window has at least
+    `min_requests` calls. An open breaker rejects calls for `reset_timeout` seconds, then lets a single
+    trial call through: its success closes the breaker and its failure opens it again.
+
+    `allow` hands out a permit which the caller passes back to `record`. Outcomes of calls permitted before
+    the last state change are ignored, so a slow call admitted while closed cannot close an open breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold: float, min_requests: int, window: float, reset_timeout: float):
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._calls = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._generation = 0
+
+    def allow(self) -> Optional[Permit]:
+        """
+        Return permit for call if it may be made now, None otherwise.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return Permit(self._generation, False)
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return Permit(self._generation, True)
+            return None
+
+    def record(self, permit: Permit, ok: bool):
+        """
+        Record outcome of call made with `permit`.
+        """
+        with self._lock:
+            if permit.generation != self._generation:
+                return
+            now = time.monotonic()
+            if self.state != self.CLOSED:
+                if not permit.trial:
+                    return
+                if ok:
+                    self.state = self.CLOSED
+                    self._generation += 1
+                    self._reset(now)
+                else:
+                    self._open(now)
+                return
+
+            if now - self._window_start >= self.window:
+                self._reset(now)
+            self._calls += 1
+            self._failures += not ok
+            if self._calls >= self.min_requests and self._failures / self._calls >= self.threshold:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._generation += 1
+        self._reset(now)
+
+    def _reset(self, now: float):
+        self._window_start = now
+        self._calls = 0
+        self._failures = 0
+
+
+def build_circuit_breaker() -> Optional[CircuitBreaker]:
+    """
+    Build breaker from `DJANGO_SSR_CIRCUIT_BREAKER_*` settings, return `None` if threshold is not set.
+    """
+    if settings.CIRCUIT_BREAKER_THRESHOLD is None:
+        return None
+    return CircuitBreaker(
+        threshold=settings.CIRCUIT_BREAKER_THRESHOLD,
+        min_requests=settings.CIRCUIT_BREAKER_MIN_REQUESTS,
+        window=settings.CIRCUIT_BREAKER_WINDOW,
+        reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+    )
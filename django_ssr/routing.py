@@ -0,0 +1,143 @@
+"""
+Decide whether requests are rendered and cached by the view they are routed to instead of url patterns.
+
+Views are listed in `DJANGO_SSR_RENDER_VIEWS` by their url names, qualified with namespaces, e.g. 'blog:post',
+by namespaces followed by ':*', e.g. 'shop:*', or by dotted paths of views without url names. Views decorated
+with `ssr_eligible` or `user_agent_ssr` are rendered as well. Rendered views listed in `DJANGO_SSR_UNCACHED_VIEWS`
+are not cached::
+
+    DJANGO_SSR_RENDER_VIEWS = {'home', 'shop:*'}
+    DJANGO_SSR_UNCACHED_VIEWS = {'shop:cart'}
+
+Names are kept in frozensets built once, so a request resolved by django's url resolver is routed by a few set
+lookups. Routes of paths are memoized in a bounded LRU cache. `DJANGO_SSR_IGNORE_*` rules are not checked
+while views are routed.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from typing import Callable, Iterable, Optional
+
+from django.http import HttpRequest
+from django.test.signals import setting_changed
+from django.urls import Resolver404, ResolverMatch, resolve
+
+from django_ssr import settings
+
+__all__ = [
+    'Route',
+    'ViewNames',
+    'ViewRouter',
+    'build_view_router',
+    'ssr_eligible',
+    'view_router',
+]
+
+Route = namedtuple('Route', ('rendered', 'cacheable'))
+
+NOT_ROUTED = Route(False, False)
+
+
+def ssr_eligible(view: Callable = None, *, cacheable: bool = True) -> Callable:
+    """
+    Mark view to be rendered for crawlers while views are routed, `cacheable=False` keeps its pages out of cache.
+
+    May be used with or without arguments.
+    """
+    def decorator(func: Callable) -> Callable:
+        func.ssr_eligible = True
+        func.ssr_cacheable = cacheable
+        return func
+
+    return decorator(view) if view is not None else decorator
+
+
+class ViewNames:
+    """
+    Set of view names and namespaces, namespaces are given as 'namespace:*'.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        names = list(names)
+        self.names = frozenset(name for name in names if not name.endswith(':*'))
+        self.namespaces = frozenset(name[:-2] for name in names if name.endswith(':*'))
+
+    def __contains__(self, match: ResolverMatch) -> bool:
+        if match.view_name in self.names:
+            return True
+        if self.namespaces:
+            namespace = ''
+            for ns in match.namespaces:
+                namespace = '%s:%s' % (namespace, ns) if namespace else ns
+                if namespace in self.namespaces:
+                    return True
+        return False
+
+
+class ViewRouter:
+    """
+    Route requests by views they are resolved to, see module's docstring.
+    """
+
+    def __init__(self, render_views: Iterable[str], uncached_views: Iterable[str] = (), cache_size: int = 0):
+        self.render_views = ViewNames(render_views)
+        self.uncached_views = ViewNames(uncached_views)
+        self.route = lru_cache(maxsize=cache_size)(self.route_uncached)
+
+    def route_request(self, request: HttpRequest) -> Route:
+        """
+        Route request by its resolver match if it is already resolved, e.g. in a view decorator, or by its path.
+        """
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            return self.route_match(match)
+        return self.route(request.path_info, getattr(request, 'urlconf', None))
+
+    def route_uncached(self, path: str, urlconf: Optional[str] = None) -> Route:
+        """
+        Resolve path and route it bypassing the cache, paths which are not resolved are not rendered.
+        """
+        try:
+            match = resolve(path, urlconf)
+        except Resolver404:
+            return NOT_ROUTED
+        return self.route_match(match)
+
+    def route_match(self, match: ResolverMatch) -> Route:
+        marked = getattr(match.func, 'ssr_eligible', False)
+        if not marked and match not in self.render_views:
+            return NOT_ROUTED
+        cacheable = getattr(match.func, 'ssr_cacheable', True) and match not in self.uncached_views
+        return Route(True, cacheable)
+
+    def cache_info(self):
+        """
+        Return hits, misses, maxsize and currsize of the route cache.
+        """
+        return self.route.cache_info()
+
+    def cache_clear(self):
+        self.route.cache_clear()
+
+
+def build_view_router() -> Optional[ViewRouter]:
+    """
+    Build router from settings, return `None` if views are not routed.
+    """
+    if settings.RENDER_VIEWS is None:
+        return None
+    return ViewRouter(settings.RENDER_VIEWS, settings.UNCACHED_VIEWS, settings.ROUTING_LRU_SIZE)
+
+
+view_router = build_view_router()
+
+
+def reload_view_router(*args, **kwargs):
+    global view_router
+    name = kwargs['setting'].replace('DJANGO_SSR_', '')
+    if name in ('RENDER_VIEWS', 'UNCACHED_VIEWS', 'ROUTING_LRU_SIZE'):
+        view_router = build_view_router()
+    elif name == 'ROOT_URLCONF' and view_router is not None:
+        view_router.cache_clear()
+
+
+setting_changed.connect(reload_view_router)
@@ -0,0 +1,87 @@
+"""
+Caching policy per url path.
+
+Rules are `(pattern, options)` pairs matched against url's path in order, the first matching rule wins::
+
+    DJANGO_SSR_CACHE_RULES = [
+        (r'/$', {'timeout': 3600, 'soft_timeout': 600}),
+        (r'/articles/', {'timeout': 30 * 24 * 3600}),
+        (r'/search/', {'cacheable': False}),
+    ]
+
+Options are `timeout`, `soft_timeout`, `cacheable` and `cache_non_200`, the backend's value is used for missing ones.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional, Pattern, Tuple, Union
+from urllib.parse import urlsplit
+
+from django.test.signals import setting_changed
+
+from django_ssr import settings
+
+__all__ = [
+    'CachePolicy',
+    'CacheRules',
+    'build_cache_rules',
+    'cache_rules',
+]
+
+CachePolicy = NamedTuple('CachePolicy', [
+    ('timeout', Optional[int]),
+    ('soft_timeout', Optional[int]),
+    ('cacheable', Optional[bool]),
+    ('cache_non_200', Optional[bool]),
+])
+CachePolicy.__new__.__defaults__ = (None, None, None, None)
+
+Rule = Tuple[Union[str, Pattern], dict]
+
+
+class CacheRules:
+    """
+    Find caching policy of url by the first rule whose pattern matches its path.
+
+    Results are memoized per url in a LRU cache of `cache_size` urls.
+    """
+
+    def __init__(self, rules: Iterable[Rule] = (), cache_size: int = 0):
+        compiled = []
+        for pattern, options in rules:
+            unknown = set(options) - set(CachePolicy._fields)
+            if unknown:
+                raise ValueError('Unknown cache rule options: %s' % ', '.join(sorted(unknown)))
+            compiled.append((re.compile(pattern) if isinstance(pattern, str) else pattern, CachePolicy(**options)))
+        self.rules = tuple(compiled)
+        self.match = lru_cache(maxsize=cache_size)(self.match_uncached)
+
+    def match_uncached(self, url: str) -> Optional[CachePolicy]:
+        """
+        Return policy of the first rule matching url's path or `None` bypassing the cache.
+        """
+        if not self.rules:
+            return None
+        path = urlsplit(url).path or '/'
+        for pattern, policy in self.rules:
+            if pattern.match(path):
+                return policy
+        return None
+
+    def __bool__(self):
+        return bool(self.rules)
+
+
+def build_cache_rules() -> CacheRules:
+    return CacheRules(settings.CACHE_RULES, settings.CACHE_RULES_LRU_SIZE)
+
+
+cache_rules = build_cache_rules()
+
+
+def reload_cache_rules(*args, **kwargs):
+    global cache_rules
+    if kwargs['setting'].replace('DJANGO_SSR_', '') in ('CACHE_RULES', 'CACHE_RULES_LRU_SIZE'):
+        cache_rules = build_cache_rules()
+
+
+setting_changed.connect(reload_cache_rules)
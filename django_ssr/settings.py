@@ -1,6 +1,6 @@
 import datetime
 import re
-from typing import Container, Iterable, Pattern, Union
+from typing import Any, Callable, Container, Dict, Iterable, Optional, Pattern, Tuple, Union
 
 from django.conf import settings
 from django.test.signals import setting_changed
@@ -18,9 +18,58 @@ DEFAULTS = {
     'BACKEND': 'django_ssr.backends.PrerenderIO',
     'STRIP_QUERY_PARAMS': False,
 
+    # Canonical form of urls used as cache key and sent to render service
+    'CANONICAL_ALLOWED_PARAMS': None,
+    'CANONICAL_IGNORED_PARAMS': {
+        'utm_*',
+        'gclid',
+        'dclid',
+        'fbclid',
+        'msclkid',
+        'yclid',
+    },
+    'CANONICAL_SORT_PARAMS': True,
+    'CANONICAL_LOWERCASE_HOST': True,
+    'CANONICAL_HOST_ALIASES': {},
+    'CANONICAL_TRAILING_SLASH': None,
+    'CANONICAL_LRU_SIZE': 1024,
+    # Number of canonical urls to track collapsed raw urls of, disabled if 0
+    'CANONICAL_INDEX_SIZE': 0,
+
     'CACHE_ALIAS': 'default',
     'CACHE_PREFIX': 'django-ssr',
     'CACHE_TIMEOUT': int(datetime.timedelta(days=14).total_seconds()),
+    'CACHE_COMPRESSION': None,
+    'CACHE_COMPRESSION_LEVEL': None,
+    'CACHE_COMPRESSION_MIN_SIZE': 1024,
+    'CACHE_SOFT_TIMEOUT': None,
+    # Seconds copies of pages are kept past their timeout to be served when renders overflow, disabled if None
+    'CACHE_STALE_TIMEOUT': None,
+    'CACHE_MAX_SIZE': 10 * 1024 * 1024,
+    # Caching policy per url path, see `django_ssr.rules`
+    'CACHE_RULES': (),
+    'CACHE_RULES_LRU_SIZE': 1024,
+    # Html transforms applied before pages are stored, see `django_ssr.postprocess`
+    'POSTPROCESS': (),
+    # Timeouts of 404/410 and redirect responses, not longer than the url's timeout
+    'CACHE_NOT_FOUND_TIMEOUT': 300,
+    'CACHE_REDIRECT_TIMEOUT': 600,
+    # Renders of url are not retried for exponentially growing time after failures, disabled if None
+    'RENDER_FAILURE_BACKOFF': 10,
+    'RENDER_FAILURE_MAX_BACKOFF': 600,
+    'REFRESH_WORKERS': 2,
+    'REFRESH_QUEUE_SIZE': 100,
+
+    # In-process cache in front of django's cache, disabled if size is 0
+    'L1_CACHE_SIZE': 0,
+    'L1_CACHE_TIMEOUT': 60,
+
+    # Coalescing of concurrent renders of the same page
+    'RENDER_LOCK': False,
+    'RENDER_LOCK_TIMEOUT': 60,
+    'RENDER_WAIT_TIMEOUT': 30,
+    'RENDER_POLL_INTERVAL': 0.2,
+    'RENDER_WAIT_FALLBACK': 'render',
 
     'IGNORE_EXTENSIONS': {
         '.js',
@@ -58,10 +107,70 @@ DEFAULTS = {
         re.compile(r'.*Mediapartners-Google', re.I),
         re.compile(r'.*AdsBot-Google', re.I),
     },
+    'USER_AGENT_MATCH_LRU_SIZE': 1024,
+
+    # Routing by url names and namespaces of views instead of ignore rules, disabled if None.
+    # See `django_ssr.routing`.
+    'RENDER_VIEWS': None,
+    'UNCACHED_VIEWS': (),
+    'ROUTING_LRU_SIZE': 1024,
+
+    # Connections to render service
+    'RENDER_CONNECT_TIMEOUT': 5,
+    'RENDER_READ_TIMEOUT': 60,
+    'STREAMING': False,
+    'STREAMING_CHUNK_SIZE': 64 * 1024,
+    'RENDER_POOL_CONNECTIONS': 10,
+    'RENDER_POOL_MAXSIZE': 10,
+    'RENDER_RETRIES': 2,
+    'RENDER_RETRY_BACKOFF': 0.2,
+    'ASYNC_CONNECTION_LIMIT': 100,
+    'ASYNC_CONNECTION_LIMIT_PER_HOST': 0,
+
+    # Admission of renders, limits are unlimited if None. Rate of renders across processes sharing the cache
+    # is in renders per second, bursts of up to one second worth of renders are allowed if burst is None.
+    # Overflow policy is 'stale', 'origin' or 'unavailable'.
+    'ADMISSION_MAX_RENDERS': None,
+    'ADMISSION_MAX_RENDERS_PER_HOST': None,
+    'ADMISSION_QUEUE_SIZE': 100,
+    'ADMISSION_QUEUE_TIMEOUT': 5,
+    'ADMISSION_RATE': None,
+    'ADMISSION_BURST': None,
+    'ADMISSION_OVERFLOW': 'origin',
+    'ADMISSION_RETRY_AFTER': 10,
+
+    # Instrument receiving stage durations and cache outcomes, a dotted path, class or instance
+    'INSTRUMENTATION': None,
+    'SERVER_TIMING': False,
+
+    # Bulk cache updates, rate is in requests per second and unlimited if None
+    'UPDATE_CONCURRENCY': 8,
+    'UPDATE_RATE': None,
+
+    # Invalidation of pages on model changes, relative urls are joined with base url
+    'INVALIDATION_BASE_URL': '',
+    'INVALIDATION_RECACHE': True,
+    'INVALIDATION_QUEUE_SIZE': 1000,
+
+    # Stop rendering when render service fails, disabled if threshold is None
+    'CIRCUIT_BREAKER_THRESHOLD': 0.5,
+    'CIRCUIT_BREAKER_MIN_REQUESTS': 20,
+    'CIRCUIT_BREAKER_WINDOW': 60,
+    'CIRCUIT_BREAKER_RESET_TIMEOUT': 30,
+
+    # Local headless browser
+    'BROWSER_LAUNCH_OPTIONS': {},
+    'BROWSER_MAX_PAGES': 4,
+    'BROWSER_MAX_RENDERS': 500,
+    'BROWSER_WAIT_UNTIL': 'networkidle',
+    'BROWSER_RENDER_TIMEOUT': 30,
 
-    # Self-hosted https://prerender.io
+    # Self-hosted https://prerender.io, render url may be a list of urls to balance renders across
     'PRERENDER_IO_HOSTED_URL': '',
     'PRERENDER_IO_HOSTED_UPDATE_URL': '',
+    'RENDER_BALANCING': 'least-outstanding',
+    'RENDER_EJECT_FAILURES': 5,
+    'RENDER_EJECT_TIMEOUT': 30,
 
     # https://prerender.io
     'PRERENDER_IO_TOKEN': '',
@@ -72,19 +181,121 @@ ENABLED = s('ENABLED')  # type: bool
 BACKEND = s('BACKEND')  # type: str
 STRIP_QUERY_PARAMS = s('STRIP_QUERY_PARAMS')  # type: bool
 
+# Canonical form of urls used as cache key and sent to render service
+CANONICAL_ALLOWED_PARAMS = s('CANONICAL_ALLOWED_PARAMS')  # type: Optional[Iterable[str]]
+CANONICAL_IGNORED_PARAMS = s('CANONICAL_IGNORED_PARAMS')  # type: Iterable[str]
+CANONICAL_SORT_PARAMS = s('CANONICAL_SORT_PARAMS')  # type: bool
+CANONICAL_LOWERCASE_HOST = s('CANONICAL_LOWERCASE_HOST')  # type: bool
+CANONICAL_HOST_ALIASES = s('CANONICAL_HOST_ALIASES')  # type: Dict[str, str]
+CANONICAL_TRAILING_SLASH = s('CANONICAL_TRAILING_SLASH')  # type: Optional[bool]
+CANONICAL_LRU_SIZE = s('CANONICAL_LRU_SIZE')  # type: int
+# Number of canonical urls to track collapsed raw urls of, disabled if 0
+CANONICAL_INDEX_SIZE = s('CANONICAL_INDEX_SIZE')  # type: int
+
 CACHE_ALIAS = s('CACHE_ALIAS')  # type: str
 CACHE_PREFIX = s('CACHE_PREFIX')  # type: str
 CACHE_TIMEOUT = s('CACHE_TIMEOUT')  # type: int
+CACHE_COMPRESSION = s('CACHE_COMPRESSION')  # type: Optional[str]
+CACHE_COMPRESSION_LEVEL = s('CACHE_COMPRESSION_LEVEL')  # type: Optional[int]
+CACHE_COMPRESSION_MIN_SIZE = s('CACHE_COMPRESSION_MIN_SIZE')  # type: int
+CACHE_SOFT_TIMEOUT = s('CACHE_SOFT_TIMEOUT')  # type: Optional[int]
+# Seconds copies of pages are kept past their timeout to be served when renders overflow, disabled if None
+CACHE_STALE_TIMEOUT = s('CACHE_STALE_TIMEOUT')  # type: Optional[int]
+CACHE_MAX_SIZE = s('CACHE_MAX_SIZE')  # type: int
+# Caching policy per url path, see `django_ssr.rules`
+CACHE_RULES = s('CACHE_RULES')  # type: Iterable[Tuple[Union[str, Pattern], dict]]
+CACHE_RULES_LRU_SIZE = s('CACHE_RULES_LRU_SIZE')  # type: int
+# Html transforms applied before pages are stored, see `django_ssr.postprocess`
+POSTPROCESS = s('POSTPROCESS')  # type: Iterable[Union[str, Callable, tuple]]
+# Timeouts of 404/410 and redirect responses, not longer than the url's timeout
+CACHE_NOT_FOUND_TIMEOUT = s('CACHE_NOT_FOUND_TIMEOUT')  # type: Optional[int]
+CACHE_REDIRECT_TIMEOUT = s('CACHE_REDIRECT_TIMEOUT')  # type: Optional[int]
+# Renders of url are not retried for exponentially growing time after failures, disabled if None
+RENDER_FAILURE_BACKOFF = s('RENDER_FAILURE_BACKOFF')  # type: Optional[float]
+RENDER_FAILURE_MAX_BACKOFF = s('RENDER_FAILURE_MAX_BACKOFF')  # type: float
+REFRESH_WORKERS = s('REFRESH_WORKERS')  # type: int
+REFRESH_QUEUE_SIZE = s('REFRESH_QUEUE_SIZE')  # type: int
+
+# In-process cache in front of django's cache, disabled if size is 0
+L1_CACHE_SIZE = s('L1_CACHE_SIZE')  # type: int
+L1_CACHE_TIMEOUT = s('L1_CACHE_TIMEOUT')  # type: int
+
+# Coalescing of concurrent renders of the same page
+RENDER_LOCK = s('RENDER_LOCK')  # type: bool
+RENDER_LOCK_TIMEOUT = s('RENDER_LOCK_TIMEOUT')  # type: int
+RENDER_WAIT_TIMEOUT = s('RENDER_WAIT_TIMEOUT')  # type: float
+RENDER_POLL_INTERVAL = s('RENDER_POLL_INTERVAL')  # type: float
+RENDER_WAIT_FALLBACK = s('RENDER_WAIT_FALLBACK')  # type: str
 
 IGNORE_EXTENSIONS = s('IGNORE_EXTENSIONS')  # type: Iterable
 IGNORE_PATH = s('IGNORE_PATH')  # type: Iterable[Pattern]
 IGNORE_URLS = s('IGNORE_URLS')  # type: Iterable[Pattern]
 REMOVE_HEADERS = s('REMOVE_HEADERS')  # type: Union[Container, Iterable]
 USER_AGENTS = s('USER_AGENTS')  # type: Iterable[Pattern]
+USER_AGENT_MATCH_LRU_SIZE = s('USER_AGENT_MATCH_LRU_SIZE')  # type: int
+
+# Routing by url names and namespaces of views instead of ignore rules, disabled if None.
+# See `django_ssr.routing`.
+RENDER_VIEWS = s('RENDER_VIEWS')  # type: Optional[Iterable[str]]
+UNCACHED_VIEWS = s('UNCACHED_VIEWS')  # type: Iterable[str]
+ROUTING_LRU_SIZE = s('ROUTING_LRU_SIZE')  # type: int
+
+# Connections to render service
+RENDER_CONNECT_TIMEOUT = s('RENDER_CONNECT_TIMEOUT')  # type: float
+RENDER_READ_TIMEOUT = s('RENDER_READ_TIMEOUT')  # type: float
+STREAMING = s('STREAMING')  # type: bool
+STREAMING_CHUNK_SIZE = s('STREAMING_CHUNK_SIZE')  # type: int
+RENDER_POOL_CONNECTIONS = s('RENDER_POOL_CONNECTIONS')  # type: int
+RENDER_POOL_MAXSIZE = s('RENDER_POOL_MAXSIZE')  # type: int
+RENDER_RETRIES = s('RENDER_RETRIES')  # type: int
+RENDER_RETRY_BACKOFF = s('RENDER_RETRY_BACKOFF')  # type: float
+ASYNC_CONNECTION_LIMIT = s('ASYNC_CONNECTION_LIMIT')  # type: int
+ASYNC_CONNECTION_LIMIT_PER_HOST = s('ASYNC_CONNECTION_LIMIT_PER_HOST')  # type: int
+
+# Admission of renders, limits are unlimited if None. Rate of renders across processes sharing the cache
+# is in renders per second, bursts of up to one second worth of renders are allowed if burst is None.
+# Overflow policy is 'stale', 'origin' or 'unavailable'.
+ADMISSION_MAX_RENDERS = s('ADMISSION_MAX_RENDERS')  # type: Optional[int]
+ADMISSION_MAX_RENDERS_PER_HOST = s('ADMISSION_MAX_RENDERS_PER_HOST')  # type: Optional[int]
+ADMISSION_QUEUE_SIZE = s('ADMISSION_QUEUE_SIZE')  # type: int
+ADMISSION_QUEUE_TIMEOUT = s('ADMISSION_QUEUE_TIMEOUT')  # type: float
+ADMISSION_RATE = s('ADMISSION_RATE')  # type: Optional[float]
+ADMISSION_BURST = s('ADMISSION_BURST')  # type: Optional[float]
+ADMISSION_OVERFLOW = s('ADMISSION_OVERFLOW')  # type: str
+ADMISSION_RETRY_AFTER = s('ADMISSION_RETRY_AFTER')  # type: int
+
+# Instrument receiving stage durations and cache outcomes, a dotted path, class or instance
+INSTRUMENTATION = s('INSTRUMENTATION')  # type: Any
+SERVER_TIMING = s('SERVER_TIMING')  # type: bool
+
+# Bulk cache updates, rate is in requests per second and unlimited if None
+UPDATE_CONCURRENCY = s('UPDATE_CONCURRENCY')  # type: int
+UPDATE_RATE = s('UPDATE_RATE')  # type: Optional[float]
+
+# Invalidation of pages on model changes, relative urls are joined with base url
+INVALIDATION_BASE_URL = s('INVALIDATION_BASE_URL')  # type: str
+INVALIDATION_RECACHE = s('INVALIDATION_RECACHE')  # type: bool
+INVALIDATION_QUEUE_SIZE = s('INVALIDATION_QUEUE_SIZE')  # type: int
+
+# Stop rendering when render service fails, disabled if threshold is None
+CIRCUIT_BREAKER_THRESHOLD = s('CIRCUIT_BREAKER_THRESHOLD')  # type: Optional[float]
+CIRCUIT_BREAKER_MIN_REQUESTS = s('CIRCUIT_BREAKER_MIN_REQUESTS')  # type: int
+CIRCUIT_BREAKER_WINDOW = s('CIRCUIT_BREAKER_WINDOW')  # type: float
+CIRCUIT_BREAKER_RESET_TIMEOUT = s('CIRCUIT_BREAKER_RESET_TIMEOUT')  # type: float
+
+# Local headless browser
+BROWSER_LAUNCH_OPTIONS = s('BROWSER_LAUNCH_OPTIONS')  # type: dict
+BROWSER_MAX_PAGES = s('BROWSER_MAX_PAGES')  # type: int
+BROWSER_MAX_RENDERS = s('BROWSER_MAX_RENDERS')  # type: int
+BROWSER_WAIT_UNTIL = s('BROWSER_WAIT_UNTIL')  # type: str
+BROWSER_RENDER_TIMEOUT = s('BROWSER_RENDER_TIMEOUT')  # type: float
 
-# Self-hosted https://prerender.io
-PRERENDER_IO_HOSTED_URL = s('PRERENDER_IO_HOSTED_URL')  # type: str
+# Self-hosted https://prerender.io, render url may be a list of urls to balance renders across
+PRERENDER_IO_HOSTED_URL = s('PRERENDER_IO_HOSTED_URL')  # type: Union[str, Iterable[str]]
 PRERENDER_IO_HOSTED_UPDATE_URL = s('PRERENDER_IO_HOSTED_UPDATE_URL')  # type: str
+RENDER_BALANCING = s('RENDER_BALANCING')  # type: str
+RENDER_EJECT_FAILURES = s('RENDER_EJECT_FAILURES')  # type: int
+RENDER_EJECT_TIMEOUT = s('RENDER_EJECT_TIMEOUT')  # type: float
 
 # https://prerender.io
 PRERENDER_IO_TOKEN = s('PRERENDER_IO_TOKEN')  # type: str
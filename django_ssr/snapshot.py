@@ -0,0 +1,368 @@
+"""
+Compact binary snapshot of a rendered http response.
+
+Layout, all integers are big-endian:
+
+    magic    3s   b'SSR'
+    version  B    FORMAT_VERSION
+    created  d    unix timestamp when the page was rendered
+    status   H
+    encoding B + bytes (ascii), content-coding of body or empty
+    headers  I + bytes (utf-8), names and values separated by newlines, which headers cannot contain
+    body     I + bytes
+
+Metadata of a snapshot is stored separately, so conditional requests are answered without loading its body:
+
+    magic    3s   b'SSM'
+    version  B    FORMAT_VERSION
+    created  d
+    status   H
+    headers  I + bytes (utf-8), as above
+"""
+import hashlib
+import struct
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+from django_ssr import settings
+from django_ssr.compression import Codec
+
+__all__ = [
+    'CacheTee',
+    'ClosingIterator',
+    'FORMAT_VERSION',
+    'Snapshot',
+    'SnapshotError',
+    'SnapshotMeta',
+    'SnapshotVersionError',
+]
+
+MAGIC = b'SSR'
+META_MAGIC = b'SSM'
+FORMAT_VERSION = 4
+
+# Headers sent with 304 responses, as required by section 4.1 of RFC 7232
+META_HEADERS = ('cache-control', 'content-location', 'etag', 'expires', 'last-modified', 'vary')
+
+_prefix = struct.Struct('>3sBdHB')
+_meta_prefix = struct.Struct('>3sBdH')
+_size = struct.Struct('>I')
+
+
+def _dump_headers(headers: List[Tuple[str, str]]) -> List[bytes]:
+    fields = [field for header in headers for field in header]
+    if any('\n' in field for field in fields):
+        raise ValueError('Header names and values cannot contain newlines')
+    data = '\n'.join(fields).encode()
+    return [_size.pack(len(data)), data]
+
+
+def _load_headers(data: bytes, offset: int) -> Tuple[List[Tuple[str, str]], int]:
+    size, = _size.unpack_from(data, offset)
+    offset += _size.size
+    if offset + size > len(data):
+        raise SnapshotError('Snapshot headers size mismatch')
+    fields = data[offset:offset + size].decode().split('\n') if size else []
+    if len(fields) % 2:
+        raise SnapshotError('Snapshot header without value')
+    return list(zip(fields[::2], fields[1::2])), offset + size
+
+
+class SnapshotError(ValueError):
+    """
+    Data is not a valid snapshot.
+    """
+
+
+class SnapshotVersionError(SnapshotError):
+    """
+    Data was written by another version of the format.
+    """
+
+
+class Snapshot:
+    """
+    Status, headers and body of a rendered http response.
+
+    Body may be compressed, `encoding` is its content-coding then.
+    """
+
+    __slots__ = ('status', 'headers', 'body', 'encoding', 'created')
+
+    def __init__(
+        self,
+        status: int,
+        headers: List[Tuple[str, str]],
+        body: bytes,
+        encoding: str = '',
+        created: float = None
+    ):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.encoding = encoding
+        self.created = created if created is not None else time.time()
+
+    @property
+    def size(self) -> int:
+        """
+        Approximate memory used by the snapshot in bytes.
+        """
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the page was rendered.
+        """
+        return time.time() - self.created
+
+    @classmethod
+    def from_response(cls, resp: HttpResponse, remove_headers: Iterable = None, body: bytes = None) -> 'Snapshot':
+        """
+        Build snapshot from http response, hop-by-hop headers and content-length are dropped.
+
+        `body` must be passed for streaming responses.
+        """
+        remove_headers = remove_headers if remove_headers is not None else settings.REMOVE_HEADERS
+        headers = [
+            (k, v) for k, v in resp.items()
+            if k.lower() not in ('content-length', 'content-encoding') and k.lower() not in remove_headers
+        ]
+        body = body if body is not None else resp.content
+        return cls(resp.status_code, headers, body, resp.get('Content-Encoding', ''))
+
+    def compress(self, codec: Codec, level: int = None) -> 'Snapshot':
+        """
+        Return snapshot with body compressed by codec.
+        """
+        if self.encoding:
+            raise ValueError('Snapshot is already compressed with "%s"' % self.encoding)
+        return self.__class__(self.status, self.headers, codec.compress(self.body, level), codec.name, self.created)
+
+    def with_validators(self) -> 'Snapshot':
+        """
+        Return snapshot with ETag computed from its body and Last-Modified set to the render time.
+
+        ETag is weak as the same page is sent compressed or not depending on client.
+        """
+        if self.encoding:
+            raise ValueError('Validators must be computed before compression')
+        headers = [(k, v) for k, v in self.headers if k.lower() not in ('etag', 'last-modified')]
+        headers += [
+            ('ETag', 'W/"%s"' % hashlib.md5(self.body).hexdigest()),
+            ('Last-Modified', http_date(self.created)),
+        ]
+        return self.__class__(self.status, headers, self.body, self.encoding, self.created)
+
+    def meta(self) -> 'SnapshotMeta':
+        """
+        Return metadata needed to answer conditional requests for the snapshot.
+        """
+        return SnapshotMeta(self.status, [(k, v) for k, v in self.headers if k.lower() in META_HEADERS], self.created)
+
+    def to_response(self) -> HttpResponse:
+        """
+        Build new http response from snapshot.
+        """
+        content_type = None
+        headers = []
+        for k, v in self.headers:
+            if content_type is None and k.lower() == 'content-type':
+                content_type = v
+            else:
+                headers.append((k, v))
+        r = HttpResponse(self.body, content_type=content_type, status=self.status)
+        for k, v in headers:
+            r[k] = v
+        r['content-length'] = len(self.body)
+        if self.encoding:
+            r['content-encoding'] = self.encoding
+            patch_vary_headers(r, ('Accept-Encoding',))
+        return r
+
+    def dumps(self) -> bytes:
+        encoding = self.encoding.encode('ascii')
+        parts = [_prefix.pack(MAGIC, FORMAT_VERSION, self.created, self.status, len(encoding)), encoding]
+        parts += _dump_headers(self.headers)
+        parts += [_size.pack(len(self.body)), self.body]
+        return b''.join(parts)
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'Snapshot':
+        if not isinstance(data, bytes) or data[:len(MAGIC)] != MAGIC:
+            raise SnapshotVersionError('Data is not a snapshot')
+
+        try:
+            magic, version, created, status, size = _prefix.unpack_from(data)
+            if version != FORMAT_VERSION:
+                raise SnapshotVersionError('Unsupported snapshot version %d' % version)
+
+            offset = _prefix.size
+            encoding = str(memoryview(data)[offset:offset + size], 'ascii')
+            offset += size
+            headers, offset = _load_headers(data, offset)
+
+            size, = _size.unpack_from(data, offset)
+            offset += _size.size
+            if offset + size != len(data):
+                raise SnapshotError('Snapshot body size mismatch')
+            body = data[offset:]
+        except (struct.error, UnicodeDecodeError) as e:
+            raise SnapshotError('Malformed snapshot: %s' % e) from e
+
+        return cls(status, headers, body, encoding, created)
+
+
+class SnapshotMeta:
+    """
+    Status, render time and validator headers of a snapshot.
+    """
+
+    __slots__ = ('status', 'headers', 'created')
+
+    def __init__(self, status: int, headers: List[Tuple[str, str]], created: float):
+        self.status = status
+        self.headers = headers
+        self.created = created
+
+    @property
+    def etag(self) -> Optional[str]:
+        return next((v for k, v in self.headers if k.lower() == 'etag'), None)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created
+
+    def dumps(self) -> bytes:
+        parts = [_meta_prefix.pack(META_MAGIC, FORMAT_VERSION, self.created, self.status)]
+        parts += _dump_headers(self.headers)
+        return b''.join(parts)
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'SnapshotMeta':
+        if not isinstance(data, bytes) or data[:len(META_MAGIC)] != META_MAGIC:
+            raise SnapshotVersionError('Data is not a snapshot metadata')
+
+        try:
+            magic, version, created, status = _meta_prefix.unpack_from(data)
+            if version != FORMAT_VERSION:
+                raise SnapshotVersionError('Unsupported snapshot metadata version %d' % version)
+            headers, offset = _load_headers(data, _meta_prefix.size)
+            if offset != len(data):
+                raise SnapshotError('Snapshot metadata size mismatch')
+        except (struct.error, UnicodeDecodeError) as e:
+            raise SnapshotError('Malformed snapshot metadata: %s' % e) from e
+
+        return cls(status, headers, created)
+
+
+class ClosingIterator:
+    """
+    Iterate over `content` and call `on_close` once when closed.
+
+    Assigned as `streaming_content`, it is closed by django together with its response,
+    even if the content was never read.
+    """
+
+    def __init__(self, content: Iterable[bytes], on_close: Callable[[], None]):
+        self.content = iter(content)
+        self.on_close = on_close
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self.content)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            close = getattr(self.content, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.on_close()
+
+
+class CacheTee:
+    """
+    Buffer streaming response's content while it is sent to client and pass its snapshot to `on_complete`.
+
+    Content larger than `max_size` is not buffered and the response is not stored.
+    `on_done` is called once the response is sent or closed, even if its content was never read.
+    """
+
+    def __init__(
+        self,
+        response: StreamingHttpResponse,
+        max_size: int,
+        on_complete: Callable[[Snapshot], Snapshot],
+        on_done: Callable[[], None] = None
+    ):
+        self.response = response
+        self.max_size = max_size
+        self.on_complete = on_complete
+        self.on_done = on_done
+        self.snapshot = None  # type: Optional[Snapshot]
+        self.done = threading.Event()
+        self._finished = False
+        self._lock = threading.Lock()
+        # A generator which was never iterated does not run its finally clause when closed
+        response.streaming_content = ClosingIterator(self._tee(response.streaming_content), self.close)
+
+    def _tee(self, content: Iterator[bytes]) -> Iterator[bytes]:
+        chunks, size = [], 0
+        try:
+            for chunk in content:
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        chunks = None
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+            if chunks is not None:
+                self.snapshot = self.on_complete(Snapshot.from_response(self.response, body=b''.join(chunks)))
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Mark the response as done, it is called when the response is sent or closed.
+        """
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        self.done.set()
+        if self.on_done is not None:
+            self.on_done()
+
+    def wait(self, timeout: float = None) -> Optional[Snapshot]:
+        """
+        Wait until the response is sent and return its snapshot unless it was too large.
+        """
+        self.done.wait(timeout)
+        return self.snapshot
+
+    def consume(self) -> Optional[Snapshot]:
+        """
+        Read and close the response when there is no client to send it to.
+        """
+        try:
+            for _ in self.response.streaming_content:
+                pass
+        finally:
+            self.response.close()
+        return self.snapshot
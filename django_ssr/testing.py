@@ -0,0 +1,67 @@
+"""
+Stub prerender server for tests and benchmarks of projects rendering pages with `PrerenderIOHosted`.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+__all__ = [
+    'StubPrerenderServer',
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(('GET', self.path, None))
+        time.sleep(server.latency)
+
+        url = self.path[len('/render/'):]
+        status = 500 if url.endswith('/500') else 404 if url.endswith('/404') else 200
+        body = ('<html><body><h1>%s</h1></body></html>' % url).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        server.requests.append(('POST', self.path, data))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubPrerenderServer(ThreadingMixIn, HTTPServer):
+    """
+    Local prerender server: pages are rendered at `/render/<url>`, recache requests are accepted at `/update/`.
+
+    Urls ending with `/404` or `/500` are rendered with that status.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.requests = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
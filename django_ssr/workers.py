@@ -0,0 +1,161 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+__all__ = [
+    'BackgroundPool',
+    'RateLimiter',
+    'SingleFlight',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundPool:
+    """
+    Bounded pool of daemon threads running tasks deduplicated by key.
+
+    Threads are started lazily on first submit, so pools created before a server forks its workers are safe.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(max_queue)
+        self._pending = set()  # type: Set[Hashable]
+        self._lock = threading.Lock()
+        self._threads = []  # type: List[threading.Thread]
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> bool:
+        """
+        Schedule `fn(*args)`, return `False` if a task with the same key is pending or queue is full.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            try:
+                self._queue.put_nowait((key, fn, args))
+            except queue.Full:
+                return False
+            self._pending.add(key)
+            if len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._work, name='django-ssr-worker-%d' % len(self._threads), daemon=True)
+                t.start()
+                self._threads.append(t)
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    def join(self):
+        """
+        Block until all submitted tasks are done.
+        """
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            key, fn, args = self._queue.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error('Background task %s failed: %s' % (key, e), exc_info=True)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None  # type: Optional[BaseException]
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time, concurrent callers wait for it and share its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # type: Dict[Hashable, _Call]
+
+    def do(self, key: Hashable, fn: Callable, *args, timeout: float = None) -> Tuple[Any, bool]:
+        """
+        Return result of `fn(*args)` and whether it was shared with another caller.
+
+        Raise `TimeoutError` if the call in flight does not finish within `timeout` seconds.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError('Timed out waiting for %s' % (key,))
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    def waiters(self, key: Hashable) -> int:
+        """
+        Return number of callers waiting for the call in flight for key.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` calls per second on average with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError('Rate must be positive')
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token and return how many seconds the caller must wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self):
+        """
+        Block until a call is allowed.
+        """
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
@@ -9,12 +9,19 @@ setuptools.setup(
     license='MIT',
     description='SSR for django project',
     url='https://github.com/greyzmeem/django-ssr',
-    packages=['django_ssr'],
+    packages=setuptools.find_packages(include=['django_ssr', 'django_ssr.*']),
     python_requires='>=3.5,<3.8',
     install_requires=[
         'django>=1.11,<2.2',
         'requests>=2',
     ],
+    extras_require={
+        'async': ['aiohttp>=3.3'],
+        'brotli': ['brotli'],
+        # playwright supports Python 3.7+ only
+        'browser': ['playwright; python_version >= "3.7"'],
+        'zstd': ['zstandard'],
+    },
     classifiers=(
         'Development Status :: 2 - Pre-Alpha',
         'Programming Language :: Python :: 3 :: Only',
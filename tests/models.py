@@ -0,0 +1,9 @@
+from django.db import models
+
+
+class Article(models.Model):
+    slug = models.SlugField()
+    is_public = models.BooleanField(default=True)
+
+    def get_absolute_url(self):
+        return '/articles/%s/' % self.slug
@@ -11,3 +11,7 @@ DATABASES = {
         'NAME': ':memory:',
     },
 }
+INSTALLED_APPS = [
+    'django_ssr',
+    'tests',
+]
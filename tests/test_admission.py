@@ -0,0 +1,103 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from django_ssr import admission
+
+
+class AdmissionControllerTestCase(TestCase):
+    def test_limits(self):
+        controller = admission.AdmissionController(max_renders=3, max_renders_per_host=2)
+        self.assertIsNone(controller.acquire('a'))
+        self.assertIsNone(controller.acquire('a'))
+        self.assertEqual('queue_full', controller.acquire('a'))
+        self.assertIsNone(controller.acquire('b'))
+        self.assertEqual('queue_full', controller.acquire('c'))
+
+        controller.release('a')
+        self.assertIsNone(controller.acquire('c'))
+        self.assertEqual({
+            'in_flight': 3,
+            'queue_depth': 0,
+            'admitted': 4,
+            'rejected': 2,
+            'rejected_queue_full': 2,
+        }, controller.stats())
+
+    def test_queue(self):
+        controller = admission.AdmissionController(max_renders=1, queue_size=1, queue_timeout=5)
+        self.assertIsNone(controller.acquire('a'))
+
+        results = []
+        waiting = threading.Thread(target=lambda: results.append(controller.acquire('a')))
+        waiting.start()
+        while controller.queue_depth == 0:
+            time.sleep(0.001)
+        self.assertEqual('queue_full', controller.acquire('a'))
+
+        controller.release('a')
+        waiting.join()
+        self.assertEqual([None], results)
+        self.assertEqual(1, controller.in_flight)
+        self.assertEqual(1, controller.counters.get('queued'))
+
+    def test_queue_timeout(self):
+        controller = admission.AdmissionController(max_renders_per_host=1, queue_size=1, queue_timeout=0.01)
+        controller.acquire('a')
+        self.assertEqual('queue_timeout', controller.acquire('a'))
+        self.assertEqual(0, controller.queue_depth)
+
+    def test_invalid_overflow(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown admission overflow policy "drop"'):
+            admission.AdmissionController(overflow='drop')
+
+
+class CacheRateLimiterTestCase(TestCase):
+    def test_rate(self):
+        cache = caches['default']
+        cache.clear()
+        limiter = admission.CacheRateLimiter(cache, 'test:admission', rate=2, burst=4)
+        other = admission.CacheRateLimiter(cache, 'test:admission', rate=2, burst=4)
+        with patch('django_ssr.admission.time.time') as now:
+            now.return_value = 6000
+            self.assertEqual(
+                [True] * 4 + [False] * 2,
+                [limiter.try_acquire() for _ in range(3)] + [other.try_acquire() for _ in range(3)],
+            )
+            # Tokens are refilled at rate, without waiting for a window to end
+            now.return_value = 6000.5
+            self.assertEqual([True, False], [limiter.try_acquire(), other.try_acquire()])
+            now.return_value = 6100
+            self.assertEqual([True] * 4 + [False], [limiter.try_acquire() for _ in range(5)])
+
+    def test_lock_timeout(self):
+        cache = caches['default']
+        cache.clear()
+        limiter = admission.CacheRateLimiter(cache, 'test:admission', rate=2, lock_timeout=0)
+        cache.add('test:admission:lock', 1)
+        self.assertFalse(limiter.try_acquire())
+        cache.delete('test:admission:lock')
+        self.assertTrue(limiter.try_acquire())
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            admission.CacheRateLimiter(caches['default'], 'test:admission', rate=0)
+        with self.assertRaises(ValueError):
+            admission.CacheRateLimiter(caches['default'], 'test:admission', rate=2, burst=0.5)
+
+
+class BuildAdmissionControllerTestCase(TestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(admission.admission_controller)
+
+    def test_reload(self):
+        with override_settings(DJANGO_SSR_ADMISSION_MAX_RENDERS=4, DJANGO_SSR_ADMISSION_OVERFLOW='unavailable'):
+            controller = admission.admission_controller
+            self.assertEqual(4, controller.max_renders)
+            self.assertEqual('unavailable', controller.overflow)
+        with override_settings(DJANGO_SSR_ADMISSION_RATE=10):
+            self.assertIsNotNone(admission.admission_controller.rate_limiter)
+        self.assertIsNone(admission.admission_controller)
@@ -0,0 +1,171 @@
+import asyncio
+from unittest import skipIf
+
+from django.http import HttpResponse
+from django.test import TestCase
+
+from django_ssr import aio, backends
+from django_ssr.resilience import CircuitBreaker
+from django_ssr.testing import StubPrerenderServer
+
+
+class CachingBackend(aio.AsyncCachingBackendMixin, aio.AsyncPrerenderIOHosted):
+    pass
+
+
+@skipIf(aio.aiohttp is None, 'aiohttp is not installed')
+class AsyncPrerenderIOHostedTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubPrerenderServer().__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_backend(self, backend, coro):
+        async def run():
+            try:
+                return await coro
+            finally:
+                await backend.close()
+        return self.loop.run_until_complete(run())
+
+    def build(self, backend=aio.AsyncPrerenderIOHosted, **kwargs):
+        return backend(render_url='%s/render/' % self.server.url, update_url='%s/update/' % self.server.url, **kwargs)
+
+    def test_render(self):
+        b = self.build()
+        r = self.run_backend(b, b.render('http://test/example'))
+
+        self.assertIsInstance(r, HttpResponse)
+        self.assertEqual(200, r.status_code)
+        self.assertEqual(b'<html><body><h1>http://test/example</h1></body></html>', r.content)
+        self.assertEqual(str(len(r.content)), r['content-length'])
+        self.assertEqual([('GET', '/render/http://test/example', None)], self.server.requests)
+
+    def test_render_error(self):
+        b = self.build(retries=0)
+        with self.assertRaisesMessage(backends.RenderError, 'failed: status 500'):
+            self.run_backend(b, b.render('http://test/500'))
+
+    def test_render_is_retried(self):
+        b = self.build(retries=2, retry_backoff=0)
+        with self.assertRaisesMessage(backends.RenderError, 'failed: status 500'):
+            self.run_backend(b, b.render('http://test/500'))
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(threshold=0.5, min_requests=2, window=60, reset_timeout=60)
+        b = self.build(retries=0, circuit_breaker=breaker)
+
+        async def render_all():
+            for _ in range(2):
+                with self.assertRaisesMessage(backends.RenderError, 'failed: status 500'):
+                    await b.render('http://test/500')
+            with self.assertRaisesMessage(backends.RenderError, 'Circuit breaker is open'):
+                await b.render('http://test/example')
+
+        self.run_backend(b, render_all())
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+
+    def test_render_timeout(self):
+        b = self.build(read_timeout=0.05, retries=0)
+        self.server.latency = 0.2
+        try:
+            with self.assertRaises(backends.RenderError):
+                self.run_backend(b, b.render('http://test/example'))
+        finally:
+            self.server.latency = 0
+
+    def test_multiple_endpoints(self):
+        b = aio.AsyncPrerenderIOHosted(
+            render_url=['http://127.0.0.1:1/render/', '%s/render/' % self.server.url],
+            update_url='%s/update/' % self.server.url,
+            balancing='consistent-hash',
+            eject_failures=1,
+            retry_backoff=0,
+        )
+        dead, alive = b.endpoints
+
+        async def render_all():
+            results = []
+            for i in range(20):
+                try:
+                    results.append((await b.render('http://test/%d' % i)).status_code)
+                except backends.RenderError:
+                    results.append(None)
+            return results
+
+        # Render failed by the dead endpoint is retried by the alive one
+        self.assertEqual([200] * 20, self.run_backend(b, render_all()))
+        self.assertEqual(20, b.endpoints.stats()[alive.url]['requests'])
+        self.assertEqual(0, alive.in_flight + dead.in_flight)
+
+    def test_update(self):
+        b = self.build()
+        self.assertTrue(self.run_backend(b, b.update('http://test/example')))
+        self.assertEqual([('POST', '/update/', {'url': 'http://test/example'})], self.server.requests)
+
+    def test_prerender_io_token(self):
+        b = self.build(aio.AsyncPrerenderIO, token='token')
+        self.assertTrue(self.run_backend(b, b.update('http://test/example')))
+        self.assertEqual({'prerenderToken': 'token', 'url': 'http://test/example'}, self.server.requests[0][2])
+        self.assertEqual('token', b.headers[backends.PrerenderIO.PRERENDER_TOKEN_HEADER_NAME])
+
+    def test_caching_coalesces_concurrent_misses(self):
+        b = self.build(CachingBackend)
+        b.cache.clear()
+        self.server.latency = 0.05
+
+        async def burst():
+            return await asyncio.gather(*[b.render('http://test/example') for _ in range(3)])
+
+        try:
+            responses = self.run_backend(b, burst())
+        finally:
+            self.server.latency = 0
+
+        self.assertEqual(1, len(self.server.requests))
+        self.assertEqual(2, b.counters.get('coalesced'))
+        self.assertEqual({200}, {r.status_code for r in responses})
+
+        r = self.run_backend(b, b.render('http://test/example'))
+        self.assertEqual(responses[0].content, r.content)
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_caching_update_clears_cache(self):
+        b = self.build(CachingBackend)
+        b.cache_set('http://test/example', HttpResponse(b'cached'))
+        self.assertTrue(self.run_backend(b, b.update('http://test/example')))
+        self.assertIsNone(b.cache_retrieve('http://test/example'))
+
+    def test_update_many(self):
+        b = self.build(aio.AsyncPrerenderIO, token='token')
+        b.UPDATE_BATCH_SIZE = 2
+        r = self.run_backend(b, b.update_many(['http://test/1', 'http://test/2', 'http://test/3']))
+        self.assertEqual({'http://test/1': True, 'http://test/2': True, 'http://test/3': True}, r)
+        self.assertEqual(
+            [['http://test/1', 'http://test/2'], ['http://test/3']],
+            sorted(data['urls'] for _, _, data in self.server.requests),
+        )
+
+    def test_caching_update_many_clears_cache(self):
+        b = self.build(CachingBackend)
+        b.cache_set('http://test/1', HttpResponse(b'cached'))
+        b.cache_set('http://test/2', HttpResponse(b'cached'))
+        r = self.run_backend(b, b.update_many(['http://test/1', 'http://test/2']))
+        self.assertEqual({'http://test/1': True, 'http://test/2': True}, r)
+        self.assertIsNone(b.cache_retrieve('http://test/1'))
+        self.assertIsNone(b.cache_retrieve('http://test/2'))
+        self.assertEqual(2, len(self.server.requests))
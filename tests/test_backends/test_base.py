@@ -14,3 +14,13 @@ class BaseBackendTestCase(TestCase):
     def test_build_absolute_url_strip_query_params(self):
         req = RequestFactory().get('/main?test=1')
         self.assertEqual('http://testserver/main', self.backend(strip_query_params=True).build_absolute_url(req))
+
+    def test_build_absolute_url_is_canonical(self):
+        req = RequestFactory().get('/main?utm_source=mail&b=1&a=2&flag', HTTP_HOST='Example.com')
+        backend = self.backend(canonical_index_size=10)
+        self.assertEqual('http://example.com/main?a=2&b=1&flag', backend.build_absolute_url(req))
+        self.assertEqual([], backend.canonical_index.report())
+
+        backend.build_absolute_url(RequestFactory().get('/main?a=2&flag&b=1', HTTP_HOST='example.com'))
+        self.assertEqual([('http://example.com/main?a=2&b=1&flag', 2)], backend.canonical_index.report())
+        self.assertIsNone(self.backend().canonical_index)
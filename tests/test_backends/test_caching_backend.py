@@ -1,9 +1,12 @@
 import pickle
+import threading
+import time
+from unittest.mock import ANY, patch
 
-from django.http import HttpResponse
-from django.test import TestCase
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 
-from django_ssr import backends
+from django_ssr import backends, postprocess, rules
 
 
 class Backend(backends.BackendBase):
@@ -18,6 +21,15 @@ class CachingBackend(backends.CachingBackendMixin, Backend):
     pass
 
 
+class StreamingBackend(backends.BackendBase):
+    def render(self, url):
+        return StreamingHttpResponse(iter([b'<h1>Hello', b' there!</h1>']))
+
+
+class CachingStreamingBackend(backends.CachingBackendMixin, StreamingBackend):
+    pass
+
+
 class CachingBackendTestCase(TestCase):
     def setUp(self):
         self.backend = CachingBackend()
@@ -57,3 +69,457 @@ class CachingBackendTestCase(TestCase):
 
         self.backend.update(url)
         self.assertIsNone(self.backend.cache.get(self.backend.cache_build_key(url)))
+
+    def test_response_is_compressed(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(compression='gzip', compression_min_size=10)
+        backend.cache_set(url, HttpResponse(b'<h1>Hello there!</h1>'))
+
+        resp = backend.cache_retrieve(url)
+        self.assertEqual('gzip', resp['Content-Encoding'])
+        self.assertEqual('Accept-Encoding', resp['Vary'])
+        self.assertEqual(str(len(resp.content)), resp['Content-Length'])
+        self.assertEqual(b'<h1>Hello there!</h1>', backend.compression.decompress(resp.content))
+
+    def test_small_response_is_not_compressed(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(compression='gzip', compression_min_size=1024)
+        backend.cache_set(url, HttpResponse(b'<h1>Hello there!</h1>'))
+
+        resp = backend.cache_retrieve(url)
+        self.assertNotIn('Content-Encoding', resp)
+        self.assertEqual(b'<h1>Hello there!</h1>', resp.content)
+
+    def test_unavailable_compression(self):
+        with self.assertRaisesMessage(ValueError, 'Compression "lzma" is not available'):
+            CachingBackend(compression='lzma')
+
+    def test_stale_response_is_refreshed(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(cache_soft_timeout=60)
+        backend.cache_set(url, HttpResponse(b'Stale'))
+        snapshot = backend.cache_retrieve_snapshot(url)
+        snapshot.created -= 120
+        backend.cache.set(backend.cache_build_key(url), snapshot.dumps())
+
+        self.assertEqual(b'Stale', backend.render(url).content)
+        backend.refresh_pool.join()
+        self.assertEqual(b'<h1>Hello there!</h1>', backend.render(url).content)
+        for name in ('stale_served', 'refresh_scheduled', 'refreshed'):
+            self.assertEqual(1, backend.counters.get(name))
+
+    def test_expired_copy_is_served_stale(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(cache_timeout=60, cache_stale_timeout=600)
+        with patch.object(backend.cache, 'set', wraps=backend.cache.set) as cache_set:
+            backend.cache_set(url, HttpResponse(b'Expired'))
+        stale_key = backend.cache_build_stale_key(backend.cache_build_key(url))
+        cache_set.assert_any_call(stale_key, ANY, timeout=660)
+        self.assertEqual(b'Expired', backend.render_stale(url).content)
+        self.assertEqual(0, backend.counters.get('expired_served'))
+
+        # The page itself has expired
+        backend.cache.delete(backend.cache_build_key(url))
+        self.assertIsNone(backend.render_cached(url))
+        self.assertEqual(b'Expired', backend.render_stale(url).content)
+        self.assertEqual(1, backend.counters.get('expired_served'))
+
+        backend.cache_clear(url)
+        self.assertIsNone(backend.render_stale(url))
+
+        backend.cache_set_many({url: HttpResponse(b'Warmed')})
+        backend.cache.delete(backend.cache_build_key(url))
+        self.assertEqual(b'Warmed', backend.render_stale(url).content)
+        self.assertIsNone(CachingBackend().render_stale('http://example.com/missing'))
+
+    def test_fresh_response_is_not_refreshed(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(cache_soft_timeout=60)
+        backend.cache_set(url, HttpResponse(b'Fresh'))
+
+        self.assertEqual(b'Fresh', backend.render(url).content)
+        self.assertEqual(0, backend.counters.get('stale_served'))
+        self.assertEqual(0, backend.counters.get('refresh_scheduled'))
+
+    def test_refresh_is_deduplicated(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend()
+        backend.refresh_pool.submit(backend.cache_build_key(url), lambda: None)
+        self.assertFalse(backend.schedule_refresh(url))
+        self.assertEqual(1, backend.counters.get('refresh_skipped'))
+
+    def test_concurrent_misses_are_coalesced(self):
+        url = 'http://example.com/test'
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def render(url):
+            calls.append(url)
+            started.set()
+            release.wait()
+            return HttpResponse(b'<h1>Hello there!</h1>')
+
+        results = []
+        with patch.object(Backend, 'render', side_effect=render):
+            threads = [threading.Thread(target=lambda: results.append(self.backend.render(url))) for _ in range(3)]
+            threads[0].start()
+            started.wait()
+            for t in threads[1:]:
+                t.start()
+            while self.backend.flights.waiters(self.backend.cache_build_key(url)) < 2:
+                time.sleep(0.001)
+            release.set()
+            for t in threads:
+                t.join()
+
+        self.assertEqual([url], calls)
+        self.assertEqual([b'<h1>Hello there!</h1>'] * 3, [r.content for r in results])
+        self.assertEqual(2, self.backend.counters.get('coalesced'))
+
+    def test_render_lock_waits_for_other_process(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(render_lock=True, render_poll_interval=0.01)
+        backend.cache.add('%s:lock' % backend.cache_build_key(url), 1)
+
+        def store():
+            backend.cache_set(url, HttpResponse(b'Rendered elsewhere'))
+
+        timer = threading.Timer(0.05, store)
+        timer.start()
+        with patch.object(Backend, 'render') as render:
+            self.assertEqual(b'Rendered elsewhere', backend.render(url).content)
+        timer.join()
+        render.assert_not_called()
+        self.assertEqual(1, backend.counters.get('coalesced_remote'))
+
+    def test_render_lock_released(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(render_lock=True)
+        backend.render(url)
+        self.assertIsNone(backend.cache.get('%s:lock' % backend.cache_build_key(url)))
+
+    def test_render_lock_timeout_fallback(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(render_lock=True, render_wait_timeout=0.02, render_poll_interval=0.01)
+        backend.cache.add('%s:lock' % backend.cache_build_key(url), 1)
+        self.assertEqual(b'<h1>Hello there!</h1>', backend.render(url).content)
+        self.assertEqual(1, backend.counters.get('render_wait_timeout'))
+
+        backend = CachingBackend(
+            render_lock=True, render_wait_timeout=0.02, render_poll_interval=0.01, render_wait_fallback='origin',
+        )
+        backend.cache.add('%s:lock' % backend.cache_build_key('http://example.com/other'), 1)
+        with self.assertRaises(backends.RenderError):
+            backend.render('http://example.com/other')
+
+    def test_l1_cache(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(l1_cache_size=1024)
+        backend.cache_set(url, HttpResponse(b'Hello there!'))
+        backend.cache.clear()
+
+        self.assertEqual(b'Hello there!', backend.render(url).content)
+        self.assertEqual(1, backend.counters.get('l1_hits'))
+        self.assertEqual(0, backend.counters.get('l2_hits'))
+
+        backend.cache_clear(url)
+        self.assertEqual(b'<h1>Hello there!</h1>', backend.render(url).content)
+        self.assertEqual(1, backend.counters.get('l2_misses'))
+
+    def test_l1_cache_is_filled_from_l2(self):
+        url = 'http://example.com/test'
+        self.backend.cache_set(url, HttpResponse(b'Hello there!'))
+        backend = CachingBackend(l1_cache_size=1024)
+
+        backend.render(url)
+        backend.render(url)
+        stats = backend.cache_stats()
+        self.assertEqual(0.5, stats['l1_hit_ratio'])
+        self.assertEqual(1.0, stats['l2_hit_ratio'])
+        self.assertEqual(1, stats['l1_entries'])
+        self.assertGreater(stats['l1_size'], len(b'Hello there!'))
+
+    def test_l1_cache_expires_with_l2(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(l1_cache_size=1024, cache_timeout=60)
+        snapshot = backend.cache_set(url, HttpResponse(b'Hello there!'))
+        snapshot.created -= 60
+        backend.l1_cache_set(backend.cache_build_key(url), snapshot, 60)
+        self.assertIsNone(backend.l1_cache.get(backend.cache_build_key(url)))
+
+    def test_l1_cache_without_l2_timeout(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(l1_cache_size=1024, l1_cache_timeout=60)
+        backend.cache_timeout = None
+        backend.cache_set(url, HttpResponse(b'Hello there!'))
+        backend.l1_cache.clear()
+        self.assertEqual(b'Hello there!', backend.render(url).content)
+        self.assertEqual(1, backend.counters.get('l2_hits'))
+        self.assertEqual(b'Hello there!', backend.render(url).content)
+        self.assertEqual(1, backend.counters.get('l1_hits'))
+
+        snapshot = backend.cache_retrieve_snapshot(url)
+        snapshot.created -= 3600
+        backend.l1_cache_set(backend.cache_build_key(url), snapshot, None)
+        self.assertIsNotNone(backend.l1_cache.get(backend.cache_build_key(url)))
+
+    def test_streaming_response_is_cached_once_sent(self):
+        url = 'http://example.com/test'
+        backend = CachingStreamingBackend()
+
+        resp = backend.render(url)
+        self.assertIsInstance(resp, StreamingHttpResponse)
+        self.assertIsNone(backend.cache_retrieve(url))
+
+        self.assertEqual(b'<h1>Hello there!</h1>', b''.join(resp.streaming_content))
+        self.assertEqual(b'<h1>Hello there!</h1>', backend.render(url).content)
+
+    def test_large_streaming_response_is_not_cached(self):
+        url = 'http://example.com/test'
+        backend = CachingStreamingBackend(cache_max_size=12)
+
+        self.assertEqual(b'<h1>Hello there!</h1>', b''.join(backend.render(url).streaming_content))
+        self.assertIsNone(backend.cache_retrieve(url))
+
+    def test_unread_streaming_response_is_released_once_closed(self):
+        url = 'http://example.com/test'
+        backend = CachingStreamingBackend()
+
+        resp = backend.render(url)
+        self.assertEqual([backend.cache_build_key(url)], list(backend.streams))
+        resp.close()
+        self.assertEqual({}, backend.streams)
+        self.assertIsNone(backend.cache_retrieve(url))
+
+    def test_streaming_response_is_refreshed(self):
+        url = 'http://example.com/test'
+        backend = CachingStreamingBackend()
+        backend.refresh(url)
+        self.assertEqual(b'<h1>Hello there!</h1>', backend.cache_retrieve(url).content)
+
+    def test_coalesced_miss_waits_for_stream(self):
+        url = 'http://example.com/test'
+        backend = CachingStreamingBackend()
+        leader = backend.render(url)
+
+        tee = backend.streams[backend.cache_build_key(url)]
+        waiting = threading.Event()
+
+        def wait(timeout=None, wait=tee.wait):
+            waiting.set()
+            return wait(timeout)
+
+        result = []
+        with patch.object(tee, 'wait', wait):
+            t = threading.Thread(target=lambda: result.append(backend.render(url)))
+            t.start()
+            self.assertTrue(waiting.wait(5))
+            self.assertEqual(b'<h1>Hello there!</h1>', b''.join(leader.streaming_content))
+            t.join()
+
+        self.assertEqual(b'<h1>Hello there!</h1>', result[0].content)
+        self.assertEqual(1, backend.counters.get('coalesced'))
+        self.assertEqual({}, backend.streams)
+
+    def test_cache_set_many(self):
+        backend = CachingBackend(compression='gzip', compression_min_size=0, cache_max_size=20)
+        streamed = StreamingHttpResponse(iter([b'b', b'b']))
+        with patch.object(streamed, 'close') as close:
+            backend.cache_set_many({
+                'http://example.com/a': HttpResponse(b'a'),
+                'http://example.com/b': streamed,
+                'http://example.com/c': HttpResponse(b'c' * 30),
+            })
+        close.assert_called_once_with()
+        self.assertEqual('gzip', backend.cache_retrieve('http://example.com/a')['Content-Encoding'])
+        self.assertEqual(b'a', backend.compression.decompress(backend.cache_retrieve('http://example.com/a').content))
+        self.assertEqual(b'bb', backend.compression.decompress(backend.cache_retrieve('http://example.com/b').content))
+        self.assertIsNone(backend.cache_retrieve('http://example.com/c'))
+        self.assertEqual(1, backend.counters.get('cache_too_large'))
+
+    def test_update_many(self):
+        class Parent(Backend):
+            def update(self, url):
+                if url.endswith('/error'):
+                    raise ValueError('Boom')
+                return not url.endswith('/fail')
+
+        class CachingParent(backends.CachingBackendMixin, Parent):
+            pass
+
+        backend = CachingParent(update_concurrency=4)
+        urls = ['http://example.com/%s' % p for p in ('a', 'b', 'fail', 'error')]
+        for url in urls:
+            backend.cache_set(url, HttpResponse(b'cached'))
+
+        with patch.object(backend.cache, 'delete_many', wraps=backend.cache.delete_many) as delete_many, \
+                patch.object(backend, 'cache_clear') as cache_clear:
+            results = backend.update_many(urls + urls[:1])
+
+        self.assertEqual(dict(zip(urls, (True, True, False, False))), results)
+        keys = [backend.cache_build_key(url) for url in urls[:2]]
+        delete_many.assert_called_once_with(keys + [backend.cache_build_meta_key(key) for key in keys])
+        cache_clear.assert_not_called()
+        self.assertIsNone(backend.cache_retrieve(urls[0]))
+        self.assertIsNotNone(backend.cache_retrieve(urls[2]))
+
+    def test_url_variants_share_cache_entry(self):
+        self.backend.cache_set('http://example.com/test?b=1&a=2', HttpResponse(b'cached'))
+        self.assertEqual(
+            b'cached',
+            self.backend.cache_retrieve('http://EXAMPLE.com/test?a=2&b=1&utm_campaign=x').content,
+        )
+
+    def test_url_variants_are_rendered_by_canonical_url(self):
+        with patch.object(Backend, 'render', return_value=HttpResponse(b'rendered')) as render:
+            self.backend.render('http://EXAMPLE.com/other?flag&b=1&a=2&utm_campaign=x')
+            self.backend.render('http://example.com/other?a=2&b=1&flag')
+        render.assert_called_once_with('http://example.com/other?a=2&b=1&flag')
+
+    def test_cache_rules(self):
+        backend = CachingBackend(cache_timeout=100, cache_soft_timeout=50, cache_rules=rules.CacheRules([
+            (r'/articles/', {'timeout': 1000}),
+            (r'/search/', {'cacheable': False}),
+            (r'/fresh/', {'soft_timeout': 0}),
+            (r'/', {'cache_non_200': False}),
+        ]))
+        policy = backend.cache_policy('http://example.com/articles/1')
+        self.assertEqual(rules.CachePolicy(1000, 50, True, True), policy)
+        self.assertEqual(rules.CachePolicy(100, 50, True, False), backend.cache_policy('http://example.com/'))
+
+        with patch.object(backend.cache, 'set', wraps=backend.cache.set) as cache_set:
+            backend.render('http://example.com/articles/1')
+        self.assertEqual(1000, cache_set.call_args[1]['timeout'])
+
+        backend.render('http://example.com/search/')
+        self.assertIsNone(backend.cache_retrieve('http://example.com/search/'))
+        self.assertEqual(1, backend.counters.get('not_cacheable'))
+
+        backend.cache_set('http://example.com/missing', HttpResponse(status=404))
+        self.assertIsNone(backend.cache_retrieve('http://example.com/missing'))
+
+        backend.cache_set('http://example.com/fresh/', HttpResponse(b'cached'))
+        with patch.object(backend, 'schedule_refresh') as schedule_refresh:
+            backend.render('http://example.com/fresh/')
+        schedule_refresh.assert_called_once_with('http://example.com/fresh/')
+
+    def test_cache_set_many_with_rules(self):
+        cache_rules = rules.CacheRules([(r'/a', {'timeout': 10}), (r'/c', {'cacheable': False})])
+        backend = CachingBackend(cache_rules=cache_rules)
+        with patch.object(backend.cache, 'set_many', wraps=backend.cache.set_many) as set_many:
+            backend.cache_set_many({
+                'http://example.com/a': HttpResponse(b'a'),
+                'http://example.com/b': HttpResponse(b'b'),
+                'http://example.com/c': HttpResponse(b'c'),
+            })
+        self.assertEqual({10, backend.cache_timeout}, {c[1]['timeout'] for c in set_many.call_args_list})
+        self.assertIsNone(backend.cache_retrieve('http://example.com/c'))
+
+    def test_not_found_and_redirects_are_cached_shortly(self):
+        backend = CachingBackend(cache_timeout=1000, cache_not_found_timeout=10, cache_redirect_timeout=20)
+        with patch.object(backend.cache, 'set_many', wraps=backend.cache.set_many) as cache_set:
+            for status in (200, 404, 410, 301, 302):
+                backend.cache_set('http://example.com/%d' % status, HttpResponse(status=status))
+        self.assertEqual([1000, 10, 10, 20, 20], [c[1]['timeout'] for c in cache_set.call_args_list])
+
+        policy = rules.CachePolicy(timeout=5)
+        self.assertEqual(5, backend.cache_timeout_for(404, policy))
+        backend.cache_not_found_timeout = None
+        self.assertEqual(5, backend.cache_timeout_for(404, policy))
+
+    def test_server_errors_are_not_cached(self):
+        self.backend.cache_set('http://example.com/test', HttpResponse(status=503))
+        self.assertIsNone(self.backend.cache_retrieve('http://example.com/test'))
+
+    def test_render_failure_backoff(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(render_failure_backoff=10, render_failure_max_backoff=25)
+        with patch.object(Backend, 'render', side_effect=backends.RenderError('Boom')) as render:
+            with self.assertRaisesMessage(backends.RenderError, 'Boom'):
+                backend.render(url)
+            with self.assertRaisesMessage(backends.RenderError, 'failed 1 times'):
+                backend.render(url)
+            self.assertEqual(1, render.call_count)
+
+            delays = []
+            now = time.time()
+            for offset in (11, 32, 58):
+                with patch('time.time', return_value=now + offset):
+                    with self.assertRaises(backends.RenderError):
+                        backend.render(url)
+                    count, retry_at = backend.cache.get(backend.render_failures_key(url))
+                    delays.append(retry_at - time.time())
+            self.assertEqual([20, 25, 25], delays)
+            self.assertEqual(4, count)
+            self.assertEqual(4, backend.counters.get('render_failed'))
+            self.assertEqual(1, backend.counters.get('render_backoff'))
+
+        with patch('time.time', return_value=now + 84):
+            self.assertEqual(b'<h1>Hello there!</h1>', backend.render(url).content)
+        self.assertIsNone(backend.cache.get(backend.render_failures_key(url)))
+
+    def test_server_error_is_render_failure(self):
+        url = 'http://example.com/test'
+        backend = CachingBackend(render_failure_backoff=10)
+        with patch.object(Backend, 'render', return_value=HttpResponse(status=500)) as render:
+            with self.assertRaisesMessage(backends.RenderError, 'status 500'):
+                backend.render(url)
+            with self.assertRaisesMessage(backends.RenderError, 'failed 1 times'):
+                backend.render(url)
+        self.assertEqual(1, render.call_count)
+
+    def test_render_failure_is_render_error(self):
+        with override_settings(DJANGO_SSR_RENDER_FAILURE_BACKOFF=None):
+            backend = CachingBackend()
+        with patch.object(Backend, 'render', side_effect=ValueError('Boom')):
+            with self.assertRaisesMessage(backends.RenderError, 'Boom'):
+                backend.render('http://example.com/test')
+            with self.assertRaisesMessage(backends.RenderError, 'Boom'):
+                backend.render('http://example.com/test')
+        self.assertIsNone(backend.cache.get(backend.render_failures_key('http://example.com/test')))
+
+    def test_postprocess(self):
+        pipeline = postprocess.Pipeline([lambda html, url: html.replace('Hello', 'Bye')])
+        backend = CachingBackend(postprocess=pipeline)
+        self.assertEqual(b'<h1>Bye there!</h1>', backend.render('http://example.com/test').content)
+        self.assertEqual(b'<h1>Bye there!</h1>', backend.cache_retrieve('http://example.com/test').content)
+
+        backend.cache_set_many({
+            'http://example.com/json': HttpResponse(b'Hello', content_type='application/json'),
+            'http://example.com/html': HttpResponse(b'Hello'),
+        })
+        self.assertEqual(b'Hello', backend.cache_retrieve('http://example.com/json').content)
+        self.assertEqual(b'Bye', backend.cache_retrieve('http://example.com/html').content)
+        self.assertEqual(2, pipeline.stats()['pages'])
+
+    def test_postprocess_canonical_url(self):
+        backend = CachingBackend(postprocess=postprocess.Pipeline([postprocess.InjectHead()]))
+        with patch.object(Backend, 'render', return_value=HttpResponse(b'<html><head></head><body></body></html>')):
+            backend.render('http://Example.com/page?utm_source=newsletter&gclid=abc')
+        self.assertIn(
+            b'<link rel="canonical" href="http://example.com/page">',
+            backend.cache_retrieve('http://example.com/page').content,
+        )
+
+    def test_conditional_request(self):
+        url = 'http://example.com/test'
+        etag = self.backend.render(url)['ETag']
+        last_modified = self.backend.render(url)['Last-Modified']
+        self.assertTrue(etag.startswith('W/"'))
+
+        def not_modified(**headers):
+            return self.backend.render_not_modified(RequestFactory().get(url, **headers), url)
+
+        with patch('django_ssr.snapshot.Snapshot.loads') as loads:
+            res = not_modified(HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(304, res.status_code)
+            self.assertEqual(etag, res['ETag'])
+            self.assertEqual(last_modified, res['Last-Modified'])
+            self.assertEqual(304, not_modified(HTTP_IF_MODIFIED_SINCE=last_modified).status_code)
+            self.assertIsNone(not_modified(HTTP_IF_NONE_MATCH='"other"'))
+            self.assertIsNone(not_modified())
+        loads.assert_not_called()
+        self.assertEqual(2, self.backend.counters.get('not_modified'))
+
+        self.backend.cache_clear(url)
+        self.assertIsNone(not_modified(HTTP_IF_NONE_MATCH=etag))
@@ -34,7 +34,7 @@ class PrerenderIOTestCase(TestCase):
         r = self.backend(token='token', session=MagicMock(return_value=session)).render('http://test/example')
 
         url = '%shttp://test/example' % self.backend.PRERENDER_IO_URL
-        session.get.assert_called_once_with(url, allow_redirects=False)
+        session.get.assert_called_once_with(url, allow_redirects=False, timeout=(5, 60), stream=False)
 
         self.assertIsInstance(r, HttpResponse)
         self.assertEqual(200, r.status_code)
@@ -52,7 +52,7 @@ class PrerenderIOTestCase(TestCase):
 
         h = {'Content-Type': 'application/json'}
         d = {'prerenderToken': 'token', 'url': 'http://test/example'}
-        session.post.assert_called_once_with(self.backend.PRERENDER_IO_UPDATE_URL, json=d, headers=h)
+        session.post.assert_called_once_with(self.backend.PRERENDER_IO_UPDATE_URL, json=d, headers=h, timeout=(5, 60))
         self.assertTrue(r)
 
     def test_update_is_false(self):
@@ -66,5 +66,42 @@ class PrerenderIOTestCase(TestCase):
 
         h = {'Content-Type': 'application/json'}
         d = {'prerenderToken': 'token', 'url': 'http://test/example'}
-        session.post.assert_called_once_with(self.backend.PRERENDER_IO_UPDATE_URL, json=d, headers=h)
+        session.post.assert_called_once_with(self.backend.PRERENDER_IO_UPDATE_URL, json=d, headers=h, timeout=(5, 60))
         self.assertFalse(r)
+
+    def test_update_many_is_batched(self):
+        resp = requests.Response()
+        resp.status_code = 200
+
+        session = MagicMock()
+        session.post = MagicMock(return_value=resp)
+
+        backend = self.backend(token='token', session=MagicMock(return_value=session), update_concurrency=1)
+        backend.UPDATE_BATCH_SIZE = 2
+        urls = ['http://test/1', 'http://test/2', 'http://test/1', 'http://test/3']
+        r = backend.update_many(urls)
+
+        self.assertEqual({'http://test/1': True, 'http://test/2': True, 'http://test/3': True}, r)
+        self.assertEqual(
+            [['http://test/1', 'http://test/2'], ['http://test/3']],
+            [c[1]['json']['urls'] for c in session.post.call_args_list],
+        )
+        self.assertEqual('token', session.post.call_args[1]['json']['prerenderToken'])
+
+    def test_update_is_retried_when_rate_limited(self):
+        limited = requests.Response()
+        limited.status_code = 429
+        limited.headers['Retry-After'] = '0'
+        resp = requests.Response()
+        resp.status_code = 200
+
+        session = MagicMock()
+        session.post = MagicMock(side_effect=[limited, resp])
+
+        backend = self.backend(token='token', session=MagicMock(return_value=session), retry_backoff=0)
+        self.assertTrue(backend.update('http://test/example'))
+        self.assertEqual(2, session.post.call_count)
+
+        session.post = MagicMock(return_value=limited)
+        self.assertFalse(backend.update('http://test/example'))
+        self.assertEqual(3, session.post.call_count)
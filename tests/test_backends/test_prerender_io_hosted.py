@@ -2,10 +2,12 @@ import io
 from unittest.mock import MagicMock
 
 import requests
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.test import TestCase
 
 from django_ssr import backends
+from django_ssr.resilience import CircuitBreaker
+from django_ssr.testing import StubPrerenderServer
 
 
 class PrerenderIOHostedTestCase(TestCase):
@@ -34,7 +36,9 @@ class PrerenderIOHostedTestCase(TestCase):
         b = self.backend(render_url='http://testserver/render/', update_url='http://testserver/update/', session=s)
         r = b.render('http://test/example')
 
-        session.get.assert_called_once_with('http://testserver/render/http://test/example', allow_redirects=False)
+        session.get.assert_called_once_with(
+            'http://testserver/render/http://test/example', allow_redirects=False, timeout=(5, 60), stream=False,
+        )
 
         self.assertIsInstance(r, HttpResponse)
         self.assertEqual(200, r.status_code)
@@ -54,7 +58,7 @@ class PrerenderIOHostedTestCase(TestCase):
 
         h = {'Content-Type': 'application/json'}
         d = {'url': 'http://test/example'}
-        session.post.assert_called_once_with('http://testserver/update/', json=d, headers=h)
+        session.post.assert_called_once_with('http://testserver/update/', json=d, headers=h, timeout=(5, 60))
         self.assertTrue(r)
 
     def test_update_is_false(self):
@@ -70,5 +74,136 @@ class PrerenderIOHostedTestCase(TestCase):
 
         h = {'Content-Type': 'application/json'}
         d = {'url': 'http://test/example'}
-        session.post.assert_called_once_with('http://testserver/update/', json=d, headers=h)
+        session.post.assert_called_once_with('http://testserver/update/', json=d, headers=h, timeout=(5, 60))
         self.assertFalse(r)
+
+    def build(self, session, **kwargs):
+        return self.backend(
+            render_url='http://testserver/render/',
+            update_url='http://testserver/update/',
+            session=MagicMock(return_value=session),
+            retry_backoff=0,
+            **kwargs
+        )
+
+    def response(self, status_code):
+        resp = requests.Response()
+        resp.status_code = status_code
+        resp.raw = io.BytesIO(b'<h1>Hello there.</h1>')
+        return resp
+
+    def test_session_pool(self):
+        b = self.backend(
+            render_url='http://testserver/render/', update_url='http://testserver/update/', pool_maxsize=32,
+        )
+        self.assertEqual(32, b.session.get_adapter('http://testserver/')._pool_maxsize)
+        self.assertEqual(32, b.session.get_adapter('https://testserver/')._pool_maxsize)
+
+    def test_render_is_retried(self):
+        session = MagicMock()
+        session.get = MagicMock(side_effect=[requests.ConnectionError(), self.response(502), self.response(200)])
+
+        r = self.build(session, retries=2).render('http://test/example')
+        self.assertEqual(3, session.get.call_count)
+        self.assertEqual(200, r.status_code)
+
+    def test_render_fails_after_retries(self):
+        session = MagicMock()
+        session.get = MagicMock(side_effect=[self.response(500), requests.Timeout()])
+
+        with self.assertRaisesMessage(backends.RenderError, 'Render of http://test/example failed: Timeout()'):
+            self.build(session, retries=1).render('http://test/example')
+        self.assertEqual(2, session.get.call_count)
+
+    def test_circuit_breaker(self):
+        session = MagicMock()
+        session.get = MagicMock(return_value=self.response(500))
+        breaker = CircuitBreaker(threshold=0.5, min_requests=2, window=60, reset_timeout=60)
+        b = self.build(session, retries=0, circuit_breaker=breaker)
+
+        for _ in range(2):
+            with self.assertRaisesMessage(backends.RenderError, 'failed: status 500'):
+                b.render('http://test/example')
+        with self.assertRaisesMessage(backends.RenderError, 'Circuit breaker is open'):
+            b.render('http://test/example')
+        self.assertEqual(2, session.get.call_count)
+
+    def test_circuit_breaker_trial_error(self):
+        session = MagicMock()
+        session.get = MagicMock(side_effect=ValueError('Malformed response'))
+        breaker = CircuitBreaker(threshold=0.5, min_requests=1, window=60, reset_timeout=0)
+        breaker.state = CircuitBreaker.OPEN
+        b = self.build(session, retries=0, circuit_breaker=breaker)
+
+        with self.assertRaises(ValueError):
+            b.render('http://test/example')
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+
+        session.get = MagicMock(return_value=self.response(200))
+        self.assertEqual(200, b.render('http://test/example').status_code)
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    def test_update_connection_error(self):
+        session = MagicMock()
+        session.post = MagicMock(side_effect=requests.ConnectionError())
+        self.assertFalse(self.build(session).update('http://test/example'))
+
+    def test_streaming_render(self):
+        with StubPrerenderServer() as server:
+            b = self.backend(
+                render_url='%s/render/' % server.url,
+                update_url='%s/update/' % server.url,
+                streaming=True,
+                chunk_size=4,
+            )
+            r = b.render('http://test/example')
+            self.assertIsInstance(r, StreamingHttpResponse)
+            self.assertEqual(b'<html><body><h1>http://test/example</h1></body></html>', b''.join(r.streaming_content))
+            # Endpoint is released once the response is closed
+            endpoint, = b.endpoints
+            self.assertEqual(1, endpoint.in_flight)
+            r.close()
+            r.close()
+            self.assertEqual(0, endpoint.in_flight)
+            self.assertEqual(0, endpoint.failures)
+
+    def test_streaming_refresh(self):
+        class CachingPrerenderIOHosted(backends.CachingBackendMixin, backends.PrerenderIOHosted):
+            pass
+
+        with StubPrerenderServer() as server:
+            b = CachingPrerenderIOHosted(
+                render_url='%s/render/' % server.url,
+                update_url='%s/update/' % server.url,
+                streaming=True,
+                chunk_size=4,
+            )
+            b.cache.clear()
+            b.refresh('http://test/example')
+            self.assertEqual(b'<html><body><h1>http://test/example</h1></body></html>',
+                             b.cache_retrieve('http://test/example').content)
+            endpoint, = b.endpoints
+            self.assertEqual(0, endpoint.in_flight)
+            self.assertEqual(1, b.endpoints.stats()[endpoint.url]['latency']['count'])
+
+    def test_multiple_endpoints(self):
+        with StubPrerenderServer() as server:
+            b = self.backend(
+                render_url=['http://127.0.0.1:1/render/', '%s/render/' % server.url],
+                update_url='%s/update/' % server.url,
+                retries=1,
+                retry_backoff=0,
+                eject_failures=2,
+                circuit_breaker=CircuitBreaker(threshold=1, min_requests=100, window=60, reset_timeout=60),
+            )
+            dead, alive = b.endpoints
+            self.assertIsNot(dead.session, alive.session)
+            for _ in range(50):
+                self.assertEqual(200, b.render('http://test/example').status_code)
+
+        stats = b.endpoints.stats()
+        self.assertEqual(50, stats[alive.url]['requests'])
+        self.assertEqual(0, stats[alive.url]['in_flight'])
+        self.assertEqual(50, stats[alive.url]['latency']['count'])
+        self.assertEqual(2, stats[dead.url]['failures'])
+        self.assertTrue(stats[dead.url]['ejected'])
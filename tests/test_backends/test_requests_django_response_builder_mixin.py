@@ -1,7 +1,7 @@
 import io
 
 import requests
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.test import TestCase
 
 from django_ssr import backends, settings
@@ -34,3 +34,27 @@ class RequestsDjangoResponseBuilderMixinTestCase(TestCase):
         r = self.backend().requests_response_to_django_response(resp)
         for h in settings.REMOVE_HEADERS:
             self.assertNotIn(h, r)
+
+    def test_build_django_streaming_response(self):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.headers['content-type'] = 'text/html'
+        resp.headers['content-length'] = '21'
+        resp.raw = io.BytesIO(b'<h1>Hello there.</h1>')
+
+        r = self.backend().requests_response_to_streaming_response(resp, chunk_size=8)
+        self.assertIsInstance(r, StreamingHttpResponse)
+        self.assertEqual(200, r.status_code)
+        self.assertEqual('21', r['content-length'])
+        self.assertEqual([b'<h1>Hell', b'o there.', b'</h1>'], list(r.streaming_content))
+
+    def test_streaming_response_of_encoded_content_has_no_length(self):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.headers['content-encoding'] = 'gzip'
+        resp.headers['content-length'] = '10'
+        resp.raw = io.BytesIO(b'')
+
+        r = self.backend().requests_response_to_streaming_response(resp, chunk_size=8)
+        self.assertNotIn('content-length', r)
+        self.assertNotIn('content-encoding', r)
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from django_ssr.balancer import Endpoint, EndpointPool
+
+
+class EndpointPoolTestCase(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('django_ssr.balancer.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def build(self, strategy='least-outstanding', count=3):
+        return EndpointPool(
+            [Endpoint('http://render-%d/' % i) for i in range(count)],
+            strategy=strategy,
+            eject_failures=2,
+            eject_timeout=30,
+        )
+
+    def test_invalid_config(self):
+        with self.assertRaisesMessage(ValueError, 'Render url is missing or empty'):
+            EndpointPool([])
+        with self.assertRaisesMessage(ValueError, 'Unknown balancing strategy "random"'):
+            self.build('random')
+
+    def test_least_outstanding(self):
+        pool = self.build()
+        acquired = [pool.acquire('http://example.com/') for _ in range(3)]
+        self.assertEqual(set(pool), set(acquired))
+
+        pool.release(acquired[1], True, 0.5)
+        self.assertIs(acquired[1], pool.acquire('http://example.com/'))
+        self.assertEqual([1, 1, 1], [e.in_flight for e in pool])
+
+    def test_consistent_hash(self):
+        pool = self.build('consistent-hash')
+        urls = ['http://example.com/%d' % i for i in range(100)]
+        picked = {url: pool.acquire(url) for url in urls}
+        self.assertEqual(picked, {url: pool.acquire(url) for url in urls})
+        self.assertEqual(3, len(set(picked.values())))
+
+        ejected = pool.endpoints[0]
+        for _ in range(2):
+            pool.release(ejected, False, 1)
+        moved = {url: pool.acquire(url) for url in urls}
+        self.assertNotIn(ejected, moved.values())
+        self.assertEqual(
+            {url: e for url, e in picked.items() if e is not ejected},
+            {url: e for url, e in moved.items() if picked[url] is not ejected},
+        )
+
+    def test_exclude(self):
+        pool = self.build('consistent-hash', count=2)
+        first = pool.acquire('http://example.com/')
+        self.assertIsNot(first, pool.acquire('http://example.com/', exclude=[first]))
+        self.assertIs(first, pool.acquire('http://example.com/', exclude=pool.endpoints))
+
+    def test_ejection(self):
+        pool = self.build(count=2)
+        failing, healthy = pool.endpoints
+        pool.release(failing, False, 1)
+        pool.release(failing, True, 1)
+        pool.release(failing, False, 1)
+        self.assertFalse(pool.stats()[failing.url]['ejected'])
+
+        pool.release(failing, False, 1)
+        self.assertTrue(pool.stats()[failing.url]['ejected'])
+        self.assertEqual([healthy] * 5, [pool.acquire('http://example.com/') for _ in range(5)])
+
+        self.now += 30
+        self.assertIn(failing, [pool.acquire('http://example.com/') for _ in range(5)])
+        # A single failure ejects endpoint back in rotation until it succeeds
+        pool.release(failing, False, 1)
+        self.assertTrue(pool.stats()[failing.url]['ejected'])
+
+        pool.release(healthy, False, 1)
+        pool.release(healthy, False, 1)
+        self.assertIsNotNone(pool.acquire('http://example.com/'))
+        self.assertEqual(1, pool.counters.get('all_ejected'))
+
+    def test_stats(self):
+        pool = self.build(count=1)
+        endpoint = pool.acquire('http://example.com/')
+        pool.release(endpoint, True, 0.25)
+        pool.acquire('http://example.com/')
+        pool.release(endpoint, False, 0.75)
+        pool.acquire('http://example.com/')
+        self.assertEqual({
+            'in_flight': 1,
+            'requests': 3,
+            'failures': 1,
+            'ejections': 0,
+            'ejected': False,
+            'latency': {'count': 2, 'total': 1.0, 'max': 0.75},
+        }, pool.stats()['http://render-0/'])
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from django.test import TestCase
+
+from django_ssr import backends
+from django_ssr.browser import HeadlessBrowser
+from django_ssr.testing import StubPrerenderServer
+
+
+class StubResponse:
+    def __init__(self, status, headers):
+        self.status = status
+        self.headers = headers
+
+
+class StubPage:
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self.html = ''
+
+    async def goto(self, url, wait_until, timeout):
+        self.launcher.wait_until.add(wait_until)
+        self.launcher.open_pages += 1
+        self.launcher.max_open_pages = max(self.launcher.max_open_pages, self.launcher.open_pages)
+        try:
+            r = await asyncio.get_event_loop().run_in_executor(None, self.fetch, url)
+        finally:
+            self.launcher.open_pages -= 1
+        self.html = r[2]
+        return StubResponse(r[0], r[1])
+
+    def fetch(self, url):
+        try:
+            r = urlopen(url)
+        except HTTPError as e:
+            r = e
+        return r.status if hasattr(r, 'status') else r.code, dict(r.headers), r.read().decode()
+
+    async def content(self):
+        return self.html.replace('</body>', '<p>rendered</p></body>')
+
+    async def close(self):
+        pass
+
+
+class StubContext:
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self.closed = False
+
+    async def new_page(self):
+        return StubPage(self.launcher)
+
+    async def close(self):
+        self.closed = True
+
+
+class StubBrowser:
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self.contexts = []
+        self.closed = False
+        self.connected = True
+        self.crash = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        if self.crash:
+            self.connected = False
+            raise OSError('Browser crashed')
+        context = StubContext(self.launcher)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+
+
+class StubLauncher:
+    def __init__(self):
+        self.browsers = []
+        self.wait_until = set()
+        self.open_pages = self.max_open_pages = 0
+        self.stopped = False
+
+    async def __call__(self):
+        browser = StubBrowser(self)
+        self.browsers.append(browser)
+        return browser
+
+    async def stop(self):
+        self.stopped = True
+
+
+class HeadlessBrowserTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubPrerenderServer().__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.launcher = StubLauncher()
+
+    def build(self, **kwargs):
+        backend = HeadlessBrowser(launcher=self.launcher, **kwargs)
+        self.addCleanup(backend.close)
+        return backend
+
+    def url(self, path):
+        return '%s/render/%s' % (self.server.url, path)
+
+    def test_render(self):
+        r = self.build(wait_until='load').render(self.url('page'))
+        self.assertEqual(200, r.status_code)
+        self.assertEqual(b'<html><body><h1>page</h1><p>rendered</p></body></html>', r.content)
+        self.assertEqual(str(len(r.content)), r['content-length'])
+        self.assertEqual('text/html; charset=utf-8', r['content-type'])
+        self.assertEqual({'load'}, self.launcher.wait_until)
+
+    def test_status(self):
+        backend = self.build()
+        self.assertEqual(404, backend.render(self.url('page/404')).status_code)
+        with self.assertRaisesMessage(backends.RenderError, 'failed with status 500'):
+            backend.render(self.url('page/500'))
+
+    def test_contexts_are_new_and_browser_recycled(self):
+        backend = self.build(max_renders=3)
+        for _ in range(4):
+            backend.render(self.url('page'))
+        first, second = self.launcher.browsers
+        self.assertTrue(first.closed)
+        self.assertEqual(3, len(first.contexts))
+        self.assertTrue(all(c.closed for c in first.contexts + second.contexts))
+        self.assertFalse(second.closed)
+        self.assertEqual(2, backend.pool.launched)
+
+        backend.close()
+        self.assertTrue(second.closed)
+        self.assertTrue(self.launcher.stopped)
+
+    def test_disconnected_browser_is_replaced(self):
+        backend = self.build()
+        backend.render(self.url('page'))
+        self.launcher.browsers[0].connected = False
+        backend.render(self.url('page'))
+        self.assertEqual(2, backend.pool.launched)
+        self.assertTrue(self.launcher.browsers[0].closed)
+
+        # Browser crashed during render is not given out again
+        self.launcher.browsers[1].crash = True
+        with self.assertRaisesMessage(backends.RenderError, 'Browser crashed'):
+            backend.render(self.url('page'))
+        self.assertTrue(self.launcher.browsers[1].closed)
+        backend.render(self.url('page'))
+        self.assertEqual(3, backend.pool.launched)
+
+    def test_concurrent_pages_are_capped(self):
+        backend = self.build(max_pages=2)
+        self.server.latency = 0.05
+        try:
+            threads = [threading.Thread(target=backend.render, args=(self.url('page'),)) for _ in range(6)]
+            started = time.monotonic()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            self.server.latency = 0
+        self.assertEqual(2, self.launcher.max_open_pages)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_failure_is_render_error(self):
+        async def fail():
+            raise OSError('Cannot launch')
+
+        backend = HeadlessBrowser(launcher=fail)
+        self.addCleanup(backend.close)
+        with self.assertRaisesMessage(backends.RenderError, 'Cannot launch'):
+            backend.render(self.url('page'))
+
+    def test_unknown_wait_until(self):
+        with self.assertRaises(ValueError):
+            HeadlessBrowser(launcher=self.launcher, wait_until='idle')
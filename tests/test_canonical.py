@@ -0,0 +1,72 @@
+from django.test import TestCase, override_settings
+
+from django_ssr import canonical
+from django_ssr.canonical import CanonicalIndex, UrlCanonicalizer
+
+
+class UrlCanonicalizerTestCase(TestCase):
+    def test_defaults(self):
+        c = canonical.build_url_canonicalizer()
+        self.assertEqual(
+            'http://example.com/page?a=1&b=2&b=1',
+            c.canonicalize('HTTP://Example.COM:80/page?b=2&utm_source=x&a=1&gclid=y&b=1#top'),
+        )
+        self.assertEqual('https://example.com/', c.canonicalize('https://example.com:443'))
+        self.assertEqual('https://example.com:8443/', c.canonicalize('https://example.com:8443/'))
+        self.assertEqual(
+            'http://example.com/?empty=&flag&q=a%20b',
+            c.canonicalize('http://example.com/?q=a%20b&&flag&empty='),
+        )
+
+    def test_allowed_params(self):
+        c = UrlCanonicalizer(allowed_params={'page'}, sort_params=False)
+        self.assertEqual('http://example.com/?page=2', c.canonicalize('http://example.com/?sort=asc&page=2'))
+        self.assertEqual('http://example.com/', c.canonicalize('http://example.com/?sort=asc'))
+
+    def test_unsorted_params(self):
+        c = UrlCanonicalizer(sort_params=False)
+        self.assertEqual('http://example.com/?b=1&a=2', c.canonicalize('http://example.com/?b=1&a=2'))
+
+    def test_host(self):
+        c = UrlCanonicalizer(host_aliases={'www.example.com': 'example.com'})
+        self.assertEqual('http://example.com/', c.canonicalize('http://WWW.example.com/'))
+        c = UrlCanonicalizer(lowercase_host=False)
+        self.assertEqual('http://Example.com/', c.canonicalize('http://Example.com/'))
+
+    def test_trailing_slash(self):
+        add, remove, keep = (UrlCanonicalizer(trailing_slash=v) for v in (True, False, None))
+        self.assertEqual('http://example.com/page/', add.canonicalize('http://example.com/page'))
+        self.assertEqual('http://example.com/page.html', add.canonicalize('http://example.com/page.html'))
+        self.assertEqual('http://example.com/page', remove.canonicalize('http://example.com/page//'))
+        self.assertEqual('http://example.com/', remove.canonicalize('http://example.com/'))
+        self.assertEqual('http://example.com/page', keep.canonicalize('http://example.com/page'))
+        self.assertEqual('http://example.com/page/', keep.canonicalize('http://example.com/page/'))
+
+    def test_cache(self):
+        c = UrlCanonicalizer(cache_size=10)
+        c.canonicalize('http://example.com/')
+        c.canonicalize('http://example.com/')
+        self.assertEqual(1, c.cache_info().hits)
+
+    def test_reload(self):
+        url = 'http://example.com/page'
+        with override_settings(DJANGO_SSR_CANONICAL_TRAILING_SLASH=True):
+            self.assertEqual('http://example.com/page/', canonical.url_canonicalizer.canonicalize(url))
+        self.assertEqual('http://example.com/page', canonical.url_canonicalizer.canonicalize(url))
+
+
+class CanonicalIndexTestCase(TestCase):
+    def test_report(self):
+        index = CanonicalIndex(2, max_raw=3)
+        for raw in ('/a?utm_source=1', '/a?utm_source=2', '/a?utm_source=1', '/a'):
+            index.record(raw, '/a')
+        index.record('/b', '/b')
+        self.assertEqual([('/a', 3)], index.report())
+        self.assertEqual([('/a', 3), ('/b', 1)], index.report(min_count=1))
+
+        index.record('/a?x', '/a')
+        index.record('/c', '/c')
+        self.assertEqual([('/a', 3), ('/c', 1)], index.report(min_count=1))
+
+        index.clear()
+        self.assertEqual([], index.report(min_count=1))
@@ -0,0 +1,148 @@
+import gzip
+import io
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.test import TestCase
+
+from django_ssr import aio, backends
+
+SITEMAP = b'''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>http://example.com/</loc></url>
+  <url><loc> http://example.com/about </loc><lastmod>2018-01-01</lastmod></url>
+</urlset>
+'''
+
+SITEMAP_INDEX = b'''<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>http://example.com/sitemap.xml</loc></sitemap>
+</sitemapindex>
+'''
+
+
+class Backend(backends.BackendBase):
+    rendered = []
+
+    def render(self, url):
+        self.rendered.append(url)
+        if url.endswith('/fail'):
+            raise backends.RenderError('Boom')
+        if url.endswith('/error'):
+            return HttpResponse(b'Server error', status=500)
+        return HttpResponse(('<h1>%s</h1>' % url).encode())
+
+
+class CachingBackend(backends.CachingBackendMixin, Backend):
+    pass
+
+
+class AsyncBackend(aio.AsyncBackendBase):
+    pass
+
+
+BACKEND = 'tests.test_commands.CachingBackend'
+
+
+class SsrWarmTestCase(TestCase):
+    def setUp(self):
+        Backend.rendered = []
+        self.backend = CachingBackend()
+        self.backend.cache.clear()
+        self.tmp = tempfile.mkdtemp()
+
+    def path(self, name, data=None):
+        path = os.path.join(self.tmp, name)
+        if data is not None:
+            with open(path, 'wb') as f:
+                f.write(data)
+        return path
+
+    def warm(self, *args, stdin='', **kwargs):
+        out, err = io.StringIO(), io.StringIO()
+        kwargs.setdefault('backend', BACKEND)
+        call_command('ssr_warm', *args, stdin=io.StringIO(stdin), stdout=out, stderr=err, **kwargs)
+        return out.getvalue(), err.getvalue()
+
+    def test_text_from_stdin(self):
+        out, err = self.warm(stdin='http://example.com/a\n\n# comment\nhttp://example.com/b\nhttp://example.com/a\n')
+        self.assertEqual(['http://example.com/a', 'http://example.com/b'], sorted(Backend.rendered))
+        self.assertEqual(b'<h1>http://example.com/a</h1>', self.backend.cache_retrieve('http://example.com/a').content)
+        self.assertIn('2/2 urls', out)
+        self.assertEqual('', err)
+
+    def test_sitemap(self):
+        self.warm(self.path('sitemap.xml', SITEMAP), batch_size=1)
+        self.assertEqual(['http://example.com/', 'http://example.com/about'], sorted(Backend.rendered))
+        self.assertIsNotNone(self.backend.cache_retrieve('http://example.com/about'))
+
+    def test_gzipped_sitemap(self):
+        self.warm(self.path('sitemap.xml.gz', gzip.compress(SITEMAP)))
+        self.assertEqual(2, len(Backend.rendered))
+
+    def test_sitemap_index(self):
+        with patch('requests.get') as get:
+            get.return_value.content = SITEMAP
+            self.warm(self.path('sitemap.xml', SITEMAP_INDEX))
+        get.assert_called_once_with('http://example.com/sitemap.xml', timeout=(5, 60))
+        self.assertEqual(2, len(Backend.rendered))
+
+        with patch('requests.get') as get:
+            get.return_value.content = SITEMAP
+            self.warm(self.path('sitemap.xml', SITEMAP_INDEX), sitemap_timeout=1.5)
+        get.assert_called_once_with('http://example.com/sitemap.xml', timeout=1.5)
+
+    def test_invalid_sitemap(self):
+        with self.assertRaises(CommandError):
+            self.warm(self.path('sitemap.xml', b'<urlset>'))
+
+    def test_failures_are_reported(self):
+        out, err = self.warm(stdin='http://example.com/fail\nhttp://example.com/ok\n')
+        self.assertIn('1 rendered, 1 failed', out)
+        self.assertIn('http://example.com/fail', err)
+        self.assertIsNone(self.backend.cache_retrieve('http://example.com/fail'))
+
+    def test_server_errors_are_failures(self):
+        checkpoint = self.path('checkpoint')
+        out, err = self.warm(stdin='http://example.com/error\nhttp://example.com/ok\n', checkpoint=checkpoint)
+        self.assertIn('1 rendered, 1 failed', out)
+        self.assertIn('http://example.com/error', err)
+        self.assertIsNone(self.backend.cache_retrieve('http://example.com/error'))
+        self.assertIsNotNone(self.backend.cache.get(self.backend.render_failures_key('http://example.com/error')))
+        with open(checkpoint) as f:
+            self.assertEqual(['http://example.com/ok'], f.read().split())
+
+        out, _ = self.warm(stdin='http://example.com/error\n', backend='tests.test_commands.Backend')
+        self.assertIn('0 rendered, 1 failed', out)
+
+    def test_skip_fresh(self):
+        self.backend.cache_set('http://example.com/a', HttpResponse(b'cached'))
+        out, _ = self.warm(stdin='http://example.com/a\nhttp://example.com/b\n', skip_fresh=True)
+        self.assertEqual(['http://example.com/b'], Backend.rendered)
+        self.assertIn('1 skipped', out)
+
+    def test_checkpoint(self):
+        checkpoint = self.path('checkpoint')
+        self.warm(stdin='http://example.com/a\nhttp://example.com/fail\n', checkpoint=checkpoint)
+        with open(checkpoint) as f:
+            self.assertEqual(['http://example.com/a'], f.read().split())
+
+        Backend.rendered = []
+        self.warm(stdin='http://example.com/a\nhttp://example.com/fail\nhttp://example.com/b\n', checkpoint=checkpoint)
+        # Failed url is not checkpointed, but is not rendered again until its failure backoff is over
+        self.assertEqual(['http://example.com/b'], Backend.rendered)
+        with open(checkpoint) as f:
+            self.assertEqual(['http://example.com/a', 'http://example.com/b'], f.read().split())
+
+    def test_not_caching_backend(self):
+        self.warm(stdin='http://example.com/a\n', backend='tests.test_commands.Backend')
+        self.assertEqual(['http://example.com/a'], Backend.rendered)
+        self.assertIsNone(self.backend.cache_retrieve('http://example.com/a'))
+
+    def test_async_backend_is_rejected(self):
+        with self.assertRaises(CommandError):
+            self.warm(backend='tests.test_commands.AsyncBackend')
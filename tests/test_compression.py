@@ -0,0 +1,43 @@
+from unittest import skipIf
+
+from django.http import HttpResponse
+from django.test import TestCase
+
+from django_ssr import compression
+
+
+class CompressionTestCase(TestCase):
+    def test_gzip(self):
+        codec = compression.get_codec('gzip')
+        data = b'<h1>Hello there!</h1>' * 100
+        self.assertLess(len(codec.compress(data)), len(data))
+        self.assertEqual(data, codec.decompress(codec.compress(data, 9)))
+
+    @skipIf('br' not in compression.CODECS, 'brotli is not installed')
+    def test_brotli(self):
+        codec = compression.get_codec('br')
+        self.assertEqual(b'<h1>Hello there!</h1>', codec.decompress(codec.compress(b'<h1>Hello there!</h1>')))
+
+    def test_unknown_codec(self):
+        with self.assertRaisesMessage(ValueError, 'Compression "lzma" is not available'):
+            compression.get_codec('lzma')
+
+    def test_accepts_encoding(self):
+        self.assertTrue(compression.accepts_encoding('gzip, deflate, br', 'gzip'))
+        self.assertTrue(compression.accepts_encoding('deflate, x-gzip', 'gzip'))
+        self.assertTrue(compression.accepts_encoding('br;q=1.0, gzip;q=0.8', 'gzip'))
+        self.assertTrue(compression.accepts_encoding('*', 'br'))
+        self.assertFalse(compression.accepts_encoding('', 'gzip'))
+        self.assertFalse(compression.accepts_encoding('identity', 'gzip'))
+        self.assertFalse(compression.accepts_encoding('gzip;q=0', 'gzip'))
+        self.assertFalse(compression.accepts_encoding('gzip;q=0, *', 'gzip'))
+        self.assertFalse(compression.accepts_encoding('*;q=0', 'br'))
+
+    def test_decode_response(self):
+        resp = HttpResponse(compression.get_codec('gzip').compress(b'<h1>Hello there!</h1>'))
+        resp['Content-Encoding'] = 'gzip'
+
+        compression.decode_response(resp)
+        self.assertEqual(b'<h1>Hello there!</h1>', resp.content)
+        self.assertEqual('21', resp['Content-Length'])
+        self.assertNotIn('Content-Encoding', resp)
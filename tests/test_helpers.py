@@ -1,5 +1,7 @@
 import re
 
+from django.test import override_settings
+
 from django_ssr import helpers
 
 
@@ -46,3 +48,65 @@ def test_must_render():
     assert not helpers.must_render('http://example.net/app.js')
     assert helpers.must_render('http://example.net/app')
     assert helpers.must_render('http://example.net/admin')
+
+
+def test_combine_patterns():
+    items = [re.compile('.*googlebot', re.I), re.compile('.*bingbot', re.I), re.compile('Yandex')]
+    combined = helpers.combine_patterns(items)
+    assert len(combined) == 2
+    assert combined[0].match('Mozilla/5.0 (compatible; BingBot/2.0)')
+    assert not combined[1].match('yandex')
+
+
+def test_combine_patterns_with_groups():
+    items = ['(a)b\\1', '(?P<x>c)d(?P=x)', '(?P<x>e)', 'f']
+    combined = helpers.combine_patterns(items)
+    assert len(combined) == 4
+    matcher = helpers.UserAgentMatcher(items)
+    assert matcher.match_uncached('aba')
+    assert matcher.match_uncached('cdc')
+    assert not matcher.match_uncached('abb')
+    assert matcher.match_uncached('e')
+
+
+def test_user_agent_matcher_cache():
+    matcher = helpers.UserAgentMatcher({re.compile('.*googlebot', re.I)}, cache_size=2)
+    assert matcher.match('Googlebot/2.1')
+    assert matcher.match('Googlebot/2.1')
+    assert not matcher.match('Mozilla/5.0')
+    assert not matcher.match('Safari')
+    assert matcher.match('Googlebot/2.1')
+    info = matcher.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 4, 2)
+
+
+def test_user_agent_matcher_reloaded():
+    user_agents = {re.compile('.*crawler', re.I)}
+    with override_settings(DJANGO_SSR_USER_AGENTS=user_agents, DJANGO_SSR_USER_AGENT_MATCH_LRU_SIZE=8):
+        assert helpers.user_agent_matcher.cache_size == 8
+        assert helpers.is_user_agent_match('Some Crawler')
+        assert not helpers.is_user_agent_match('Googlebot')
+    assert helpers.is_user_agent_match('Googlebot')
+    assert not helpers.is_user_agent_match('Some Crawler')
+
+
+def test_url_classifier():
+    classifier = helpers.UrlClassifier(
+        ignored_urls={re.compile(r'https?://example\.com/')},
+        ignored_path={re.compile(r'/media/'), re.compile(r'/static/')},
+        ignored_ext={'.js', '.tar.gz'},
+    )
+    assert classifier.is_ignored('http://example.com/app')
+    assert classifier.is_ignored('http://example.net/static/app')
+    assert classifier.is_ignored('http://example.net/app.min.js?v=1')
+    assert classifier.is_ignored('http://example.net/app.tar.gz')
+    assert classifier.is_ignored('http://example.net/app', path='/media/app')
+    assert not classifier.is_ignored('http://example.net/app.gz')
+    assert not classifier.is_ignored('http://example.net/v1.0/app')
+
+
+def test_url_classifier_reloaded():
+    with override_settings(DJANGO_SSR_IGNORE_EXTENSIONS={'.html'}, DJANGO_SSR_ENABLED=True):
+        assert not helpers.must_render('http://example.net/index.html')
+        assert helpers.must_render('http://example.net/app.js')
+    assert not helpers.must_render('http://example.net/app.js')
@@ -0,0 +1,74 @@
+import re
+from unittest.mock import MagicMock
+
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from django_ssr import backends, instrumentation, middleware
+
+
+class Backend(backends.BackendBase):
+    def render(self, url):
+        return HttpResponse(b'<h1>Hello there!</h1>')
+
+
+class CachingBackend(backends.CachingBackendMixin, Backend):
+    pass
+
+
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        self.backend = CachingBackend()
+        self.backend.cache.clear()
+
+    def test_disabled(self):
+        self.assertIsNone(instrumentation.instrument)
+        self.assertIs(instrumentation.timer('ua_match'), instrumentation.timer('cache_lookup'))
+
+    def test_stages(self):
+        exporter = instrumentation.PrometheusExporter()
+        with override_settings(DJANGO_SSR_INSTRUMENTATION=exporter):
+            self.assertIs(exporter, instrumentation.instrument)
+            for _ in range(3):
+                self.backend.render('http://example.com/test')
+        self.assertIsNone(instrumentation.instrument)
+
+        metrics = exporter.render()
+        for stage, count in (('cache_lookup', 3), ('deserialize', 2), ('cache_store', 1), ('response_build', 2)):
+            self.assertIn('django_ssr_stage_duration_seconds_count{stage="%s"} %d\n' % (stage, count), metrics)
+        self.assertIn('django_ssr_payload_bytes_bucket{payload="cached",le="1024"} 2\n', metrics)
+        self.assertIn('django_ssr_payload_bytes_bucket{payload="cached",le="+Inf"} 2\n', metrics)
+        self.assertIn('django_ssr_events_total{event="cache_hit"} 2\n', metrics)
+        self.assertIn('django_ssr_events_total{event="cache_miss"} 1\n', metrics)
+
+    def test_histogram_buckets_are_cumulative(self):
+        exporter = instrumentation.PrometheusExporter(prefix='ssr')
+        for seconds in (0.0001, 0.003, 0.003, 100):
+            exporter.timing('upstream_render', seconds)
+        metrics = exporter.render()
+        self.assertIn('ssr_stage_duration_seconds_bucket{stage="upstream_render",le="0.0005"} 1\n', metrics)
+        self.assertIn('ssr_stage_duration_seconds_bucket{stage="upstream_render",le="0.005"} 3\n', metrics)
+        self.assertIn('ssr_stage_duration_seconds_bucket{stage="upstream_render",le="30"} 3\n', metrics)
+        self.assertIn('ssr_stage_duration_seconds_bucket{stage="upstream_render",le="+Inf"} 4\n', metrics)
+
+    def test_metrics_view(self):
+        with self.assertRaises(Http404):
+            instrumentation.metrics_view(RequestFactory().get('/metrics/'))
+        with override_settings(DJANGO_SSR_INSTRUMENTATION='django_ssr.instrumentation.PrometheusExporter'):
+            instrumentation.incr('cache_hit')
+            res = instrumentation.metrics_view(RequestFactory().get('/metrics/'))
+        self.assertEqual('text/plain; version=0.0.4; charset=utf-8', res['Content-Type'])
+        self.assertIn(b'django_ssr_events_total{event="cache_hit"} 1\n', res.content)
+
+    def test_server_timing(self):
+        mw = middleware.UserAgentMiddleware(MagicMock(side_effect=lambda r: HttpResponse()), backend=CachingBackend)
+        with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}, DJANGO_SSR_SERVER_TIMING=True):
+            res = mw(RequestFactory().get('/', HTTP_USER_AGENT='Crawler'))
+            self.assertRegex(
+                res['Server-Timing'],
+                r'^ua_match;dur=[\d.]+, url_classification;dur=[\d.]+, cache_lookup;dur=[\d.]+, '
+                r'cache_store;dur=[\d.]+$',
+            )
+            res = mw(RequestFactory().get('/', HTTP_USER_AGENT='Firefox'))
+            self.assertRegex(res['Server-Timing'], r'^ua_match;dur=[\d.]+$')
+        self.assertNotIn('Server-Timing', mw(RequestFactory().get('/', HTTP_USER_AGENT='Crawler')))
@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import TransactionTestCase
+
+from django_ssr import backends
+from django_ssr.invalidation import InvalidationRegistry
+
+from .models import Article
+
+
+class Backend(backends.BackendBase):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.updated = []
+
+    def render(self, url):
+        return HttpResponse(b'<h1>Hello there!</h1>')
+
+    def update(self, url):
+        self.updated.append(url)
+        return True
+
+
+class CachingBackend(backends.CachingBackendMixin, Backend):
+    pass
+
+
+class InvalidationRegistryTestCase(TransactionTestCase):
+    def setUp(self):
+        self.backend = Backend(update_concurrency=1)
+        self.registry = InvalidationRegistry(backend=self.backend, base_url='http://example.com')
+
+    def tearDown(self):
+        self.registry.unregister(Article)
+
+    def test_save_and_delete(self):
+        self.registry.register(Article)
+        article = Article.objects.create(slug='a')
+        self.registry.join()
+        self.assertEqual(['http://example.com/articles/a/'], self.backend.updated)
+
+        article.delete()
+        self.registry.join()
+        self.assertEqual(['http://example.com/articles/a/'] * 2, self.backend.updated)
+
+    def test_batched_per_transaction(self):
+        @self.registry.urls_for(Article)
+        def urls(article):
+            return ['/', article.get_absolute_url()]
+
+        with transaction.atomic():
+            article = Article.objects.create(slug='a')
+            article.save()
+            Article.objects.create(slug='b')
+            self.registry.join()
+            self.assertEqual([], self.backend.updated)
+
+        self.registry.join()
+        self.assertEqual(
+            ['http://example.com/', 'http://example.com/articles/a/', 'http://example.com/articles/b/'],
+            self.backend.updated,
+        )
+        self.assertEqual(3, self.registry.counters.get('invalidated'))
+
+    def test_rolled_back(self):
+        self.registry.register(Article)
+        with self.assertRaises(ValueError), transaction.atomic():
+            Article.objects.create(slug='a')
+            raise ValueError
+        self.registry.join()
+        self.assertEqual([], self.backend.updated)
+
+    def test_rolled_back_urls_are_dropped(self):
+        self.registry.register(Article)
+        with self.assertRaises(ValueError), transaction.atomic():
+            Article.objects.create(slug='a')
+            raise ValueError
+        with transaction.atomic():
+            Article.objects.create(slug='b')
+            with self.assertRaises(ValueError), transaction.atomic():
+                Article.objects.create(slug='c')
+                raise ValueError
+            with transaction.atomic():
+                Article.objects.create(slug='d')
+        self.registry.join()
+        self.assertEqual(['http://example.com/articles/b/', 'http://example.com/articles/d/'], self.backend.updated)
+
+    def test_collected_once_committed(self):
+        collected = []
+
+        @self.registry.urls_for(Article.objects.filter(is_public=True))
+        def urls(article):
+            collected.append(article.slug)
+            return article.get_absolute_url()
+
+        with transaction.atomic():
+            article = Article.objects.create(slug='a')
+            article.is_public = False
+            article.save()
+            Article.objects.create(slug='b').delete()
+            self.assertEqual([], collected)
+
+        self.registry.join()
+        self.assertEqual(['b'], collected)
+        self.assertEqual(['http://example.com/articles/b/'], self.backend.updated)
+
+    def test_queryset(self):
+        self.registry.register(Article.objects.filter(is_public=True))
+        article = Article.objects.create(slug='a', is_public=False)
+        self.registry.join()
+        self.assertEqual([], self.backend.updated)
+
+        article.is_public = True
+        article.save()
+        article.delete()
+        self.registry.join()
+        self.assertEqual(['http://example.com/articles/a/'] * 2, self.backend.updated)
+
+    def test_unregister(self):
+        self.registry.register(Article)
+        self.registry.unregister(Article)
+        Article.objects.create(slug='a')
+        self.registry.join()
+        self.assertEqual([], self.backend.updated)
+
+    def test_clear_without_recache(self):
+        backend = CachingBackend()
+        registry = InvalidationRegistry(backend=backend, recache=False, base_url='http://example.com')
+        registry.register(Article)
+        backend.cache_set('http://example.com/articles/a/', HttpResponse(b'cached'))
+        try:
+            Article.objects.create(slug='a')
+            registry.join()
+        finally:
+            registry.unregister(Article)
+        self.assertIsNone(backend.cache_retrieve('http://example.com/articles/a/'))
+        self.assertEqual([], backend.updated)
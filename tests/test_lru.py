@@ -0,0 +1,44 @@
+import time
+
+from django.test import TestCase
+
+from django_ssr.lru import MemoryLRU
+
+
+class MemoryLRUTestCase(TestCase):
+    def setUp(self):
+        self.expires = time.time() + 60
+
+    def test_size_is_bounded(self):
+        cache = MemoryLRU(max_size=10)
+        cache.set('a', 'a', 4, self.expires)
+        cache.set('b', 'b', 4, self.expires)
+        self.assertEqual('a', cache.get('a'))
+        cache.set('c', 'c', 4, self.expires)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('a', cache.get('a'))
+        self.assertEqual('c', cache.get('c'))
+        self.assertEqual(8, cache.size)
+
+    def test_too_large_value_is_skipped(self):
+        cache = MemoryLRU(max_size=10)
+        cache.set('a', 'a', 4, self.expires)
+        cache.set('a', 'b', 11, self.expires)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, cache.size)
+
+    def test_expired(self):
+        cache = MemoryLRU(max_size=10)
+        cache.set('a', 'a', 4, time.time() - 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_delete_and_clear(self):
+        cache = MemoryLRU(max_size=10)
+        cache.set('a', 'a', 4, self.expires)
+        cache.set('b', 'b', 4, self.expires)
+        cache.delete('a')
+        self.assertEqual((1, 4), (len(cache), cache.size))
+        cache.clear()
+        self.assertEqual((0, 0), (len(cache), cache.size))
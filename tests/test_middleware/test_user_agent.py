@@ -1,11 +1,11 @@
 import re
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.test import TestCase, RequestFactory
 
-from django_ssr import middleware
-from django_ssr.backends import BackendBase
+from django_ssr import admission, compression, middleware
+from django_ssr.backends import BackendBase, CachingBackendMixin, RenderError
 
 
 class Backend(BackendBase):
@@ -13,6 +13,17 @@ class Backend(BackendBase):
         return HttpResponse(b'<h1>Hello there!</h1>', status=200)
 
 
+class CachingBackend(CachingBackendMixin, Backend):
+    pass
+
+
+class CompressingBackend(BackendBase):
+    def render(self, url: str) -> HttpResponse:
+        resp = HttpResponse(compression.get_codec('gzip').compress(b'<h1>Hello there!</h1>'))
+        resp['Content-Encoding'] = 'gzip'
+        return resp
+
+
 class UserAgentMiddlewareTestCase(TestCase):
     def setUp(self):
         self.get_response = MagicMock()
@@ -32,3 +43,127 @@ class UserAgentMiddlewareTestCase(TestCase):
             res = self.middleware(req)
         self.get_response.assert_called_once_with(req)
         self.assertEqual(self.get_response(req), res)
+
+    def test_server_error_falls_back(self):
+        req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler')
+        with patch.object(Backend, 'render', return_value=HttpResponse(status=502)):
+            with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+                res = self.middleware(req)
+        self.get_response.assert_called_once_with(req)
+        self.assertEqual(self.get_response.return_value, res)
+
+    def test_url_built_once(self):
+        req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler')
+        with patch.object(Backend, 'build_absolute_url', return_value='http://example.net/') as build:
+            with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+                self.middleware(req)
+        build.assert_called_once_with(req)
+        self.assertEqual('http://example.net/', req.ssr_decision.url)
+        self.assertEqual('/', req.ssr_decision.path)
+
+    def test_url_not_built_for_humans(self):
+        req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Firefox')
+        with patch.object(Backend, 'build_absolute_url') as build:
+            self.middleware(req)
+        build.assert_not_called()
+
+    def test_compressed_response(self):
+        mw = middleware.UserAgentMiddleware(self.get_response, backend=CompressingBackend)
+        with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+            req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler', HTTP_ACCEPT_ENCODING='gzip')
+            res = mw(req)
+            self.assertEqual('gzip', res['Content-Encoding'])
+
+            req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler')
+            res = mw(req)
+            self.assertNotIn('Content-Encoding', res)
+            self.assertEqual(b'<h1>Hello there!</h1>', res.content)
+
+    def test_render_error_falls_back_to_view(self):
+        req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler')
+        with patch.object(Backend, 'render', side_effect=RenderError('Renderer is down')):
+            with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+                res = self.middleware(req)
+        self.get_response.assert_called_once_with(req)
+        self.assertEqual(self.get_response(req), res)
+
+    def test_conditional_request(self):
+        mw = middleware.UserAgentMiddleware(self.get_response, backend=CachingBackend)
+        mw.backend.cache.clear()
+        with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+            etag = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler'))['ETag']
+            res = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(304, res.status_code)
+        self.assertEqual(b'', res.content)
+        self.get_response.assert_not_called()
+
+    def test_admission_overflow(self):
+        controller = admission.AdmissionController(max_renders=0, overflow='unavailable', retry_after=30)
+        mw = middleware.UserAgentMiddleware(self.get_response, backend=CachingBackend, admission_controller=controller)
+        mw.backend.cache.clear()
+        with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+            res = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler'))
+            self.assertEqual(503, res.status_code)
+            self.assertEqual('30', res['Retry-After'])
+
+            controller.overflow = 'origin'
+            res = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler'))
+            self.assertEqual(self.get_response.return_value, res)
+
+            # Cached pages are served without admission
+            req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler')
+            mw.backend.cache_set(mw.backend.build_absolute_url(req), HttpResponse(b'<h1>Cached</h1>'))
+            res = mw(req)
+            self.assertEqual(b'<h1>Cached</h1>', res.content)
+
+        self.assertEqual(2, controller.counters.get('rejected_queue_full'))
+        self.assertEqual(1, controller.counters.get('overflow_unavailable'))
+        self.assertEqual(1, controller.counters.get('overflow_origin'))
+
+    def test_admission_overflow_stale(self):
+        controller = admission.AdmissionController(max_renders=0, overflow='stale')
+        mw = middleware.UserAgentMiddleware(self.get_response, backend=CachingBackend, admission_controller=controller)
+        mw.backend.cache.clear()
+        mw.backend.cache_stale_timeout = 600
+        req = RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler')
+        url = mw.backend.build_absolute_url(req)
+        with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+            self.assertEqual(self.get_response.return_value, mw(req))
+
+            mw.backend.cache_set(url, HttpResponse(b'<h1>Expired</h1>'))
+            mw.backend.cache.delete(mw.backend.cache_build_key(url))
+            res = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler'))
+        self.assertEqual(b'<h1>Expired</h1>', res.content)
+        self.assertEqual(2, controller.counters.get('overflow_stale'))
+
+    def test_admitted_miss_is_looked_up_once(self):
+        controller = admission.AdmissionController(max_renders=1)
+        mw = middleware.UserAgentMiddleware(self.get_response, backend=CachingBackend, admission_controller=controller)
+        mw.backend.cache.clear()
+        with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+            res = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler'))
+        self.assertEqual(b'<h1>Hello there!</h1>', res.content)
+        self.assertEqual(1, mw.backend.counters.get('l2_misses'))
+        self.assertEqual(1, controller.counters.get('admitted'))
+
+    def test_admission_released_once_stream_is_closed(self):
+        controller = admission.AdmissionController(max_renders=1)
+        mw = middleware.UserAgentMiddleware(self.get_response, backend=Backend, admission_controller=controller)
+        streamed = StreamingHttpResponse(iter([b'<h1>Hello', b' there!</h1>']))
+        with patch.object(Backend, 'render', return_value=streamed):
+            with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+                res = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler'))
+        self.assertEqual(1, controller.in_flight)
+        self.assertEqual(b'<h1>Hello there!</h1>', b''.join(res.streaming_content))
+        res.close()
+        res.close()
+        self.assertEqual(0, controller.in_flight)
+
+    def test_admission(self):
+        controller = admission.AdmissionController(max_renders=1, max_renders_per_host=1)
+        mw = middleware.UserAgentMiddleware(self.get_response, backend=Backend, admission_controller=controller)
+        with patch.object(Backend, 'render', side_effect=lambda url: HttpResponse(str(controller.stats()))):
+            with self.settings(DJANGO_SSR_USER_AGENTS={re.compile('crawler', re.I)}):
+                res = mw(RequestFactory().get('http://example.net', HTTP_USER_AGENT='Crawler'))
+        self.assertIn(b"'in_flight': 1", res.content)
+        self.assertEqual(0, controller.in_flight)
@@ -0,0 +1,95 @@
+from django.test import TestCase
+
+from django_ssr import postprocess
+from django_ssr.postprocess import InjectHead, Pipeline, build_pipeline
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+  <title>Page</title>
+  <!-- build: 1234 -->
+  <!--[if IE]><link rel="stylesheet" href="/ie.css"><![endif]-->
+  <script src="/app.js"></script>
+  <script type="application/ld+json">{"@type": "Article"}</script>
+</head>
+<body>
+  <div id="app">   <h1>Hello    there!</h1>
+  </div>
+  <pre>  keep
+    this  </pre>
+  <script>window.__STATE__ = {"a":   1};</script>
+  <SCRIPT type="application/json">{"b": 2}</SCRIPT>
+</body>
+</html>
+'''
+
+
+class StagesTestCase(TestCase):
+    def test_strip_scripts(self):
+        html = postprocess.strip_scripts(PAGE, '')
+        self.assertNotIn('app.js', html)
+        self.assertNotIn('__STATE__', html)
+        self.assertNotIn('"b": 2', html)
+        self.assertIn('<script type="application/ld+json">{"@type": "Article"}</script>', html)
+
+    def test_strip_comments(self):
+        html = postprocess.strip_comments(PAGE, '')
+        self.assertNotIn('build: 1234', html)
+        self.assertIn('<!--[if IE]>', html)
+
+    def test_collapse_whitespace(self):
+        html = postprocess.collapse_whitespace(PAGE, '')
+        self.assertIn('<div id="app"> <h1>Hello there!</h1> </div>', html)
+        self.assertIn('<pre>  keep\n    this  </pre>', html)
+        self.assertIn('{"a":   1}', html)
+
+    def test_inject_head(self):
+        stage = InjectHead(meta={'robots': 'index, follow'})
+        html = stage(PAGE, 'http://example.com/?a=1&b=2')
+        self.assertIn(
+            '<meta name="robots" content="index, follow"><link rel="canonical" href="http://example.com/?a=1&amp;b=2">'
+            '</head>',
+            html,
+        )
+        self.assertEqual(html, stage(html, 'http://example.com/other'))
+        self.assertEqual('<p>No head</p>', stage('<p>No head</p>', 'http://example.com/'))
+
+
+class PipelineTestCase(TestCase):
+    def test_process(self):
+        pipeline = build_pipeline([
+            'django_ssr.postprocess.strip_scripts',
+            postprocess.strip_comments,
+            ('django_ssr.postprocess.InjectHead', {'canonical': False, 'meta': {'robots': 'noarchive'}}),
+            'django_ssr.postprocess.InjectHead',
+        ])
+        body = pipeline.process(PAGE.encode(), 'http://example.com/')
+        self.assertIn(b'<meta name="robots" content="noarchive"><link rel="canonical"', body)
+        self.assertNotIn(b'app.js', body)
+
+        stats = pipeline.stats()
+        self.assertEqual(1, stats['pages'])
+        self.assertEqual(len(PAGE.encode()), stats['bytes_in'])
+        self.assertEqual(len(body), stats['bytes_out'])
+        self.assertAlmostEqual(1 - len(body) / len(PAGE.encode()), stats['reduction'])
+        self.assertEqual({'strip_scripts', 'strip_comments', 'inject_head'}, set(stats['stages']))
+        self.assertEqual(2, stats['stages']['inject_head']['count'])
+
+    def test_charset(self):
+        pipeline = Pipeline([postprocess.collapse_whitespace])
+        self.assertEqual('<p>Привет мир</p>'.encode('cp1251'), pipeline.process(
+            '<p>Привет   мир</p>'.encode('cp1251'), 'http://example.com/', 'cp1251',
+        ))
+        self.assertEqual(b'\xff  \xfe', pipeline.process(b'\xff  \xfe', 'http://example.com/'))
+        self.assertEqual(1, pipeline.stats()['skipped'])
+
+    def test_failed_stage(self):
+        def fail(html, url):
+            raise ValueError('Boom')
+
+        pipeline = Pipeline([postprocess.collapse_whitespace, fail])
+        self.assertEqual(PAGE.encode(), pipeline.process(PAGE.encode(), 'http://example.com/'))
+        self.assertEqual(1, pipeline.stats()['failed'])
+
+    def test_empty(self):
+        self.assertIsNone(build_pipeline([]))
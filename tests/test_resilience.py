@@ -0,0 +1,78 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from django_ssr.resilience import CircuitBreaker, backoff_delays
+
+
+class BackoffDelaysTestCase(TestCase):
+    def test_delays(self):
+        delays = list(backoff_delays(3, 0.5))
+        self.assertEqual(3, len(delays))
+        for attempt, delay in enumerate(delays):
+            self.assertTrue(0 <= delay <= 0.5 * 2 ** attempt)
+
+
+class CircuitBreakerTestCase(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('django_ssr.resilience.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(threshold=0.5, min_requests=4, window=10, reset_timeout=30)
+
+    def call(self, ok):
+        self.breaker.record(self.breaker.allow(), ok)
+
+    def test_opens_on_error_rate(self):
+        for ok in (True, False, True):
+            self.call(ok)
+        self.assertIsNotNone(self.breaker.allow())
+        self.call(False)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertIsNone(self.breaker.allow())
+
+    def test_window_is_reset(self):
+        for ok in (False, False, True):
+            self.call(ok)
+        self.now += 10
+        self.call(False)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+
+    def test_half_open(self):
+        for _ in range(4):
+            self.call(False)
+        self.now += 30
+        trial = self.breaker.allow()
+        self.assertTrue(trial.trial)
+        self.assertIsNone(self.breaker.allow())
+        self.breaker.record(trial, False)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+
+        self.now += 30
+        self.breaker.record(self.breaker.allow(), True)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.assertIsNotNone(self.breaker.allow())
+
+    def test_late_outcomes_are_ignored(self):
+        permits = [self.breaker.allow() for _ in range(8)]
+        for permit in permits[:4]:
+            self.breaker.record(permit, False)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+
+        # Calls admitted before the breaker opened finish while it is open
+        self.breaker.record(permits[4], True)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+
+        self.now += 30
+        trial = self.breaker.allow()
+        # ...or while its trial call is in flight
+        self.breaker.record(permits[5], True)
+        self.breaker.record(permits[6], False)
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.state)
+        self.assertIsNone(self.breaker.allow())
+
+        self.breaker.record(trial, True)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.breaker.record(permits[7], False)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock, patch
+
+from django.conf.urls import include, url
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+
+from django_ssr import middleware, routing
+
+from .test_middleware.test_user_agent import Backend, CachingBackend
+
+
+def view(request, **kwargs):
+    return HttpResponse(b'<h1>Origin</h1>')
+
+
+@routing.ssr_eligible(cacheable=False)
+def marked_view(request):
+    return HttpResponse(b'<h1>Origin</h1>')
+
+
+@middleware.user_agent_ssr(backend=Backend)
+def decorated_view(request, pk):
+    return HttpResponse(('<h1>Origin %s</h1>' % pk).encode())
+
+
+shop_patterns = ([
+    url(r'^$', view, name='index'),
+    url(r'^cart/$', view, name='cart'),
+    url(r'^items/', include(([url(r'^(?P<pk>\d+)/$', view, name='item')], 'items'))),
+], 'shop')
+
+urlpatterns = [
+    url(r'^$', view, name='home'),
+    url(r'^about/$', view, name='about'),
+    url(r'^marked/$', marked_view),
+    url(r'^decorated/(?P<pk>\d+)/$', decorated_view),
+    url(r'^shop/', include(shop_patterns)),
+]
+
+USER_AGENTS = {'Crawler'}
+
+
+@override_settings(ROOT_URLCONF='tests.test_routing', DJANGO_SSR_USER_AGENTS=USER_AGENTS)
+class ViewRouterTestCase(TestCase):
+    def setUp(self):
+        self.router = routing.ViewRouter({'home', 'shop:*'}, {'shop:cart'}, cache_size=16)
+
+    def test_names_and_namespaces(self):
+        self.assertEqual(routing.Route(True, True), self.router.route('/'))
+        self.assertEqual(routing.Route(True, True), self.router.route('/shop/'))
+        self.assertEqual(routing.Route(True, True), self.router.route('/shop/items/1/'))
+        self.assertEqual(routing.Route(True, False), self.router.route('/shop/cart/'))
+        self.assertEqual(routing.Route(False, False), self.router.route('/about/'))
+        self.assertEqual(routing.Route(False, False), self.router.route('/missing/'))
+
+        router = routing.ViewRouter({'shop:items:*'})
+        self.assertTrue(router.route('/shop/items/1/').rendered)
+        self.assertFalse(router.route('/shop/').rendered)
+
+    def test_marked_views(self):
+        self.assertEqual(routing.Route(True, False), self.router.route('/marked/'))
+        self.assertEqual(routing.Route(True, True), self.router.route('/decorated/1/'))
+
+    def test_routes_cached(self):
+        with patch('django_ssr.routing.resolve', wraps=routing.resolve) as resolve:
+            self.router.route('/shop/items/1/')
+            self.router.route('/shop/items/1/')
+        resolve.assert_called_once_with('/shop/items/1/', None)
+
+    def test_resolved_request(self):
+        req = RequestFactory().get('/about/')
+        req.resolver_match = routing.resolve('/')
+        with patch.object(self.router, 'route') as route:
+            self.assertTrue(self.router.route_request(req).rendered)
+        route.assert_not_called()
+
+    def test_settings(self):
+        with self.settings(DJANGO_SSR_RENDER_VIEWS={'about'}):
+            self.assertTrue(routing.view_router.route('/about/').rendered)
+            self.assertFalse(routing.view_router.route('/').rendered)
+        self.assertIsNone(routing.view_router)
+
+
+@override_settings(ROOT_URLCONF='tests.test_routing', DJANGO_SSR_USER_AGENTS=USER_AGENTS)
+class RoutingMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.get_response = MagicMock()
+        self.router = routing.ViewRouter({'home', 'shop:*'}, {'shop:cart'})
+        self.middleware = middleware.UserAgentMiddleware(
+            self.get_response, backend=CachingBackend, view_router=self.router,
+        )
+        self.middleware.backend.cache.clear()
+
+    def test_routed(self):
+        # Ignore rules are not checked while views are routed
+        with self.settings(DJANGO_SSR_IGNORE_PATH={'/shop/'}):
+            res = self.middleware(RequestFactory().get('/shop/', HTTP_USER_AGENT='Crawler'))
+        self.assertEqual(b'<h1>Hello there!</h1>', res.content)
+
+        res = self.middleware(RequestFactory().get('/about/', HTTP_USER_AGENT='Crawler'))
+        self.assertEqual(self.get_response.return_value, res)
+        res = self.middleware(RequestFactory().get('/shop/', HTTP_USER_AGENT='Firefox'))
+        self.assertEqual(self.get_response.return_value, res)
+
+    def test_uncached(self):
+        backend = self.middleware.backend
+        self.middleware(RequestFactory().get('/shop/cart/', HTTP_USER_AGENT='Crawler'))
+        self.middleware(RequestFactory().get('/shop/', HTTP_USER_AGENT='Crawler'))
+        self.assertIsNone(backend.cache_retrieve('http://testserver/shop/cart/'))
+        self.assertIsNotNone(backend.cache_retrieve('http://testserver/shop/'))
+
+    def test_decorator(self):
+        res = self.client.get('/decorated/1/', HTTP_USER_AGENT='Crawler')
+        self.assertEqual(b'<h1>Hello there!</h1>', res.content)
+        res = self.client.get('/decorated/1/', HTTP_USER_AGENT='Firefox')
+        self.assertEqual(b'<h1>Origin 1</h1>', res.content)
+
+        with self.settings(DJANGO_SSR_RENDER_VIEWS=()):
+            res = self.client.get('/decorated/1/', HTTP_USER_AGENT='Crawler')
+        self.assertEqual(b'<h1>Hello there!</h1>', res.content)
@@ -0,0 +1,38 @@
+import re
+
+from django.test import TestCase, override_settings
+
+from django_ssr import rules
+from django_ssr.rules import CachePolicy, CacheRules
+
+
+class CacheRulesTestCase(TestCase):
+    def test_first_match_wins(self):
+        r = CacheRules([
+            (r'/$', {'timeout': 60}),
+            (re.compile(r'/articles/', re.I), {'timeout': 3600, 'soft_timeout': 600}),
+            (r'/', {'cacheable': False}),
+        ])
+        self.assertEqual(CachePolicy(timeout=60), r.match('http://example.com'))
+        self.assertEqual(CachePolicy(timeout=3600, soft_timeout=600), r.match('http://example.com/ARTICLES/1?x=/'))
+        self.assertEqual(CachePolicy(cacheable=False), r.match('http://example.com/search/'))
+
+    def test_no_match(self):
+        self.assertIsNone(CacheRules([(r'/articles/', {'timeout': 60})]).match('http://example.com/'))
+        self.assertIsNone(CacheRules().match('http://example.com/'))
+        self.assertFalse(CacheRules())
+
+    def test_unknown_option(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown cache rule options: ttl'):
+            CacheRules([(r'/', {'ttl': 60})])
+
+    def test_cache(self):
+        r = CacheRules([(r'/', {'timeout': 60})], cache_size=10)
+        r.match('http://example.com/')
+        r.match('http://example.com/')
+        self.assertEqual(1, r.match.cache_info().hits)
+
+    def test_reload(self):
+        with override_settings(DJANGO_SSR_CACHE_RULES=[(r'/', {'timeout': 60})]):
+            self.assertEqual(CachePolicy(timeout=60), rules.cache_rules.match('http://example.com/'))
+        self.assertIsNone(rules.cache_rules.match('http://example.com/'))
@@ -0,0 +1,81 @@
+import pickle
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase
+
+from django_ssr import compression, snapshot
+
+
+class SnapshotTestCase(TestCase):
+    def test_round_trip(self):
+        resp = HttpResponse('<h1>Привет!</h1>', status=404)
+        resp['X-Title'] = 'Привет'
+        resp['Connection'] = 'keep-alive'
+
+        s = snapshot.Snapshot.loads(snapshot.Snapshot.from_response(resp).dumps())
+        self.assertEqual(404, s.status)
+        self.assertEqual(resp.content, s.body)
+
+        r = s.to_response()
+        self.assertEqual(404, r.status_code)
+        self.assertEqual(resp.content, r.content)
+        self.assertEqual(resp['X-Title'], r['X-Title'])
+        self.assertEqual(resp['Content-Type'], r['Content-Type'])
+        self.assertEqual(str(len(resp.content)), r['Content-Length'])
+        self.assertNotIn('Connection', r)
+
+    def test_other_version(self):
+        data = bytearray(snapshot.Snapshot(200, [], b'').dumps())
+        data[len(snapshot.MAGIC)] = snapshot.FORMAT_VERSION + 1
+        with self.assertRaises(snapshot.SnapshotVersionError):
+            snapshot.Snapshot.loads(bytes(data))
+
+    def test_pickled_response(self):
+        with self.assertRaises(snapshot.SnapshotVersionError):
+            snapshot.Snapshot.loads(pickle.dumps(HttpResponse(b'')))
+
+    def test_truncated(self):
+        data = snapshot.Snapshot(200, [('X-Test', 'test')], b'body').dumps()
+        for size in (5, 10, len(data) - 1):
+            with self.assertRaises(snapshot.SnapshotError):
+                snapshot.Snapshot.loads(data[:size])
+
+    def test_header_with_newline(self):
+        with self.assertRaises(ValueError):
+            snapshot.Snapshot(200, [('X-Test', 'a\nb')], b'body').dumps()
+
+    def test_validators(self):
+        s = snapshot.Snapshot(200, [('ETag', '"upstream"'), ('Cache-Control', 'max-age=60')], b'body', created=0)
+        s = s.with_validators()
+        etag = 'W/"841a2d689ad86bd1611447453c22c6fc"'
+        self.assertEqual(
+            [('Cache-Control', 'max-age=60'), ('ETag', etag), ('Last-Modified', 'Thu, 01 Jan 1970 00:00:00 GMT')],
+            s.headers,
+        )
+        with self.assertRaises(ValueError):
+            s.compress(compression.get_codec('gzip')).with_validators()
+
+    def test_meta_round_trip(self):
+        s = snapshot.Snapshot(404, [('Content-Type', 'text/html'), ('X-Title', 'Привет')], b'body').with_validators()
+        meta = snapshot.SnapshotMeta.loads(s.meta().dumps())
+        self.assertEqual(404, meta.status)
+        self.assertEqual(s.created, meta.created)
+        self.assertEqual(s.headers[-2:], meta.headers)
+        self.assertEqual(s.headers[-2][1], meta.etag)
+
+        with self.assertRaises(snapshot.SnapshotVersionError):
+            snapshot.SnapshotMeta.loads(s.dumps())
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.SnapshotMeta.loads(s.meta().dumps()[:-1])
+
+
+class ClosingIteratorTestCase(TestCase):
+    def test_closed_with_response(self):
+        closed = []
+        content = (chunk for chunk in [b'a', b'b'])
+        r = StreamingHttpResponse(iter([]))
+        r.streaming_content = snapshot.ClosingIterator(content, lambda: closed.append(True))
+        r.close()
+        r.close()
+        self.assertEqual([True], closed)
+        self.assertEqual([], list(content))
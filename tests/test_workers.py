@@ -0,0 +1,100 @@
+import threading
+import time
+
+from django.test import TestCase
+
+from django_ssr.workers import BackgroundPool, RateLimiter, SingleFlight
+
+
+class BackgroundPoolTestCase(TestCase):
+    def test_tasks_are_run(self):
+        pool = BackgroundPool(max_workers=2, max_queue=10)
+        done = []
+        for i in range(5):
+            self.assertTrue(pool.submit(i, done.append, i))
+        pool.join()
+        self.assertEqual([0, 1, 2, 3, 4], sorted(done))
+        self.assertLessEqual(len(pool._threads), 2)
+
+    def test_queue_is_bounded_and_deduplicated(self):
+        pool = BackgroundPool(max_workers=1, max_queue=1)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        self.assertTrue(pool.submit('block', block))
+        started.wait()
+        self.assertTrue(pool.submit('a', lambda: None))
+        self.assertFalse(pool.submit('a', lambda: None))
+        self.assertFalse(pool.submit('b', lambda: None))
+        release.set()
+        pool.join()
+        self.assertFalse(pool.is_pending('a'))
+
+    def test_failed_task_is_released(self):
+        pool = BackgroundPool(max_workers=1, max_queue=1)
+        with self.assertLogs('django_ssr.workers', 'ERROR'):
+            pool.submit('a', lambda: 1 / 0)
+            pool.join()
+        self.assertTrue(pool.submit('a', lambda: None))
+        pool.join()
+
+
+class SingleFlightTestCase(TestCase):
+    def test_concurrent_calls_are_shared(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def render():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'result'
+
+        leader = threading.Thread(target=lambda: results.append(flights.do('key', render)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flights.do('key', render))) for _ in range(3)]
+        for t in followers:
+            t.start()
+        while flights.waiters('key') < 3:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual([('result', False)] + [('result', True)] * 3, sorted(results, key=lambda r: r[1]))
+
+    def test_error_is_shared(self):
+        flights = SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flights.do('key', lambda: 1 / 0)
+        self.assertEqual(('ok', False), flights.do('key', lambda: 'ok'))
+
+    def test_timeout(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        leader = threading.Thread(target=flights.do, args=('key', lambda: started.set() or release.wait()))
+        leader.start()
+        started.wait()
+        with self.assertRaises(TimeoutError):
+            flights.do('key', lambda: None, timeout=0.01)
+        release.set()
+        leader.join()
+
+
+class RateLimiterTestCase(TestCase):
+    def test_rate(self):
+        limiter = RateLimiter(100, burst=2)
+        started = time.monotonic()
+        for _ in range(7):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.045)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(0)